@@ -8,7 +8,8 @@ from django.utils import timezone
 from openai import OpenAI
 
 from foods.models import FoodItem, Recipe, Meal
-from foods.serializers import FoodItemSerializer, RecipeSerializer, MealSerializer
+from foods.nutrient_matrix import recipe_totals
+from foods.serializers import FoodItemSerializer, MealSerializer
 from profiles.models import MealLog
 
 
@@ -75,8 +76,17 @@ def generate_daily_plan(user, day):
     if recipes_qs.count() < 4:
         raise ValueError("Not enough public recipes to generate a plan")
 
-    # 2 Send serialized recipes to AI (source of truth)
-    recipes_data = RecipeSerializer(recipes_qs, many=True).data
+    # 2 Send recipe totals to AI (source of truth), computed in one pass
+    recipe_ids = list(recipes_qs.values_list("id", flat=True))
+    totals = recipe_totals(recipe_ids)
+    recipes_data = [
+        {
+            "id": rid,
+            "calories": round(totals.get(rid, {}).get("calories", 0), 1),
+            "protein_g": round(totals.get(rid, {}).get("protein", 0), 1),
+        }
+        for rid in recipe_ids
+    ]
 
     # 3 PROMPTS (AI ONLY RETURNS IDS)
     system_prompt = """
@@ -109,7 +119,7 @@ Medical conditions:
 {json.dumps(health.medical_conditions)}
 
 Available recipes (USE ONLY THESE IDS):
-{json.dumps([{"id": r["id"], "calories": r["calories"], "protein_g": r["protein_g"]} for r in recipes_data])}
+{json.dumps(recipes_data)}
 
 Return JSON EXACTLY like:
 {{
@@ -0,0 +1,111 @@
+import hashlib
+
+from django.db.models import BooleanField, ExpressionWrapper, F
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalRetrieveMixin:
+    """
+    ETag / Last-Modified support for RetrieveAPIView.
+
+    The validators come from version_fields, timestamps read for the looked
+    up row in one small query (no select/prefetch, nothing serialized), so
+    If-None-Match / If-Modified-Since are answered with a 304 before the
+    serializer runs. version_fields entries are field paths or expressions
+    such as Max("children__updated_at") for nested rows.
+
+    Anonymous reads of rows matching shared_filter (every row when None)
+    may be stored by a CDN; everything else must revalidate.
+    """
+
+    version_fields = ("updated_at",)
+    shared_filter = None
+
+    public_cache_control = {"public": True, "max_age": 60, "s_maxage": 300}
+    private_cache_control = {"private": True, "no_cache": True}
+
+    def get_versions(self):
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .select_related(None)
+            .prefetch_related(None)
+            .order_by()
+        )
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        versions = {
+            f"_version_{i}": F(field) if isinstance(field, str) else field
+            for i, field in enumerate(self.version_fields)
+        }
+        if self.shared_filter is not None:
+            versions["_shared"] = ExpressionWrapper(
+                self.shared_filter, output_field=BooleanField()
+            )
+        return (
+            queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .annotate(**versions)
+            .values_list(*versions)
+            .first()
+        )
+
+    def get_etag_extra(self):
+        """Anything besides the row versions the payload depends on."""
+        return ()
+
+    def get_validators(self):
+        """
+        (etag, last modified timestamp, shared), or (None, None, False) for
+        a miss.
+        """
+        versions = self.get_versions()
+        if versions is None:
+            return None, None, False  # let retrieve() answer with a 404
+        shared = True
+        if self.shared_filter is not None:
+            versions, shared = versions[:-1], versions[-1]
+
+        stamps = [v for v in versions if v is not None]
+        # The query string may select a different representation (?fields=)
+        key = repr(
+            (
+                self.kwargs,
+                self.request.query_params.urlencode(),
+                versions,
+                self.get_etag_extra(),
+            )
+        )
+        etag = f'W/{quote_etag(hashlib.md5(key.encode()).hexdigest())}'
+        # HTTP dates have second precision
+        last_modified = int(max(stamps).timestamp()) if stamps else None
+        return etag, last_modified, shared
+
+    def set_validator_headers(self, response, etag, last_modified, shared):
+        response.headers["ETag"] = etag
+        if last_modified is not None:
+            response.headers["Last-Modified"] = http_date(last_modified)
+        if shared and not self.request.user.is_authenticated:
+            patch_cache_control(response, **self.public_cache_control)
+        else:
+            patch_cache_control(response, **self.private_cache_control)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified, shared = self.get_validators()
+        if etag is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return self.set_validator_headers(
+                not_modified, etag, last_modified, shared
+            )
+
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_validator_headers(response, etag, last_modified, shared)
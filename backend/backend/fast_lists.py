@@ -0,0 +1,100 @@
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+# to_representation() of these fields returns database values unchanged
+IDENTITY_REPRESENTATIONS = {
+    serializers.CharField.to_representation,
+    serializers.IntegerField.to_representation,
+    serializers.FloatField.to_representation,
+    serializers.BooleanField.to_representation,
+    serializers.ChoiceField.to_representation,
+}
+
+
+def _converter(field):
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return None  # .values() already yields the primary key
+    if type(field).to_representation in IDENTITY_REPRESENTATIONS:
+        return None
+    return field.to_representation
+
+
+class ValuesRow:
+    """
+    Rebuilds a ModelSerializer's read representation from a .values() row.
+
+    Plain fields are read from the row (their values() key is prefix +
+    source) and converted with the field's own to_representation(), so
+    dates and decimals come out exactly as the serializer renders them.
+    Fields listed in nested are left to the caller and passed to
+    __call__() by name; keys keep the serializer's field order.
+    """
+
+    def __init__(self, serializer, prefix="", nested=()):
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in nested:
+                self.fields.append((name, None, None))
+            else:
+                self.fields.append((name, prefix + field.source, _converter(field)))
+
+    @property
+    def columns(self):
+        """Keys to pass to .values()."""
+        return [key for _, key, _ in self.fields if key is not None]
+
+    def __call__(self, row, **nested):
+        data = {}
+        for name, key, convert in self.fields:
+            if key is None:
+                data[name] = nested[name]
+                continue
+            value = row[key]
+            data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+
+class ValuesListMixin:
+    """
+    Read-only fast path for ListAPIViews.
+
+    The page is read with .values() and build_rows(rows) turns it into the
+    serializer's output as plain dicts, without model instances, field
+    lookups or SerializerMethodField calls. Views implement values_columns
+    (the .values() keys) and build_rows(); use_values_path() lets them fall
+    back to the serializer for representations the fast path does not
+    cover. values_path = False turns it off (see benchmark_lists).
+    """
+
+    values_path = True
+    values_columns = ()
+
+    def use_values_path(self):
+        return self.values_path
+
+    def build_rows(self, rows):
+        raise NotImplementedError
+
+    def get_values_queryset(self, queryset):
+        # Keyset pagination reads its position from ordering keys
+        ordering = ()
+        if hasattr(self.paginator, "get_ordering"):
+            ordering = self.paginator.get_ordering(self.request, queryset, self)
+        columns = list(self.values_columns)
+        for key in ordering:
+            if key.lstrip("-") not in columns:
+                columns.append(key.lstrip("-"))
+        return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_path():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_values_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.build_rows(list(page)))
+        return Response(self.build_rows(list(queryset)))
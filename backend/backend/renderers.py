@@ -0,0 +1,75 @@
+import csv
+import io
+
+import orjson
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, for high-throughput list endpoints.
+
+    The output matches JSONRenderer's compact UTF-8 form: types orjson does
+    not handle natively (Decimal, lazy strings, querysets) and datetimes go
+    through DRF's own encoder, so they render exactly as before. Indented
+    output (?format=json with indent, the browsable API) and the ASCII /
+    non-compact settings keep using the stdlib encoder.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        )
+        # Same strict javascript subset as JSONRenderer
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON, negotiated by ?format=ndjson or Accept. Export
+    views stream their rows themselves (StreamingHttpResponse), so render()
+    only serves the error responses, as a single line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return FastJSONRenderer().render(data) + b"\n"
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV counterpart of NDJSONRenderer: a header and one row per item."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        header = list(dict.fromkeys(key for row in rows for key in row))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        writer.writerows([row.get(key, "") for key in header] for row in rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+# renderer_classes for views opting in
+FAST_RENDERER_CLASSES = [FastJSONRenderer, BrowsableAPIRenderer]
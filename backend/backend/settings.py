@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Apps
     "accounts",
     "profiles",
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
     "ai_services",
     "marketplace",
     "coaching",
+    "sync",
     # Third party
     "rest_framework",
     "rest_framework.authtoken",
@@ -164,6 +166,12 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {
         "anon": "20/minute",
         "user": "50/minute",
+        "autocomplete": "300/minute",
+        "barcode": "300/minute",
+        "diet_optimizer": "30/minute",
+        "food_bulk": "30/minute",
+        "export": "10/minute",
+        "sync": "60/minute",
     },
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -196,6 +204,24 @@ DJOSER = {
 }
 
 
+# Shared cache (response, barcode and autocomplete caches). Without
+# REDIS_CACHE_URL, e.g. in tests, each process gets its own locmem cache.
+REDIS_CACHE_URL = os.environ.get("REDIS_CACHE_URL")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+            "KEY_PREFIX": "alimento",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                # A cache outage degrades to database reads instead of 500s
+                "IGNORE_EXCEPTIONS": True,
+            },
+        }
+    }
+
+
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
@@ -204,6 +230,22 @@ CELERY_RESULT_BACKEND = "redis://redis:6379/0"
 CELERY_TIMEZONE = "UTC"
 CELERY_ENABLE_UTC = True
 
+CELERY_BEAT_SCHEDULE = {
+    "refresh-recipe-similarity": {
+        "task": "foods.tasks.refresh_recipe_similarity",
+        "schedule": 60.0,
+    },
+    "rebuild-recipe-similarity": {
+        "task": "foods.tasks.refresh_recipe_similarity",
+        "schedule": 60.0 * 60 * 24,
+        "kwargs": {"full": True},
+    },
+    "purge-sync-tombstones": {
+        "task": "sync.tasks.purge_tombstones",
+        "schedule": 60.0 * 60 * 24,
+    },
+}
+
 
 if DEBUG:
     EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
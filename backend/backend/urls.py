@@ -18,6 +18,7 @@ urlpatterns = [
     path("api/ai/", include("ai_services.urls")),
     path("api/coaches/", include("coaching.urls")),
     path("api/marketplace/", include("marketplace.urls")),
+    path("api/sync/", include("sync.urls")),
     # OpenAPI schema
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     # Swagger UI
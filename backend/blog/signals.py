@@ -1,10 +1,20 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from .tasks import send_new_post_email
-from .models import BlogPost
+from .models import BlogPost, PostLike, PostComment
 
 
 @receiver(post_save, sender=BlogPost)
 def notify_subscribers_new_post(sender, instance, created, **kwargs):
     if created:
         send_new_post_email.delay(instance.id)
+
+
+@receiver(post_save, sender=PostLike)
+@receiver(post_delete, sender=PostLike)
+@receiver(post_save, sender=PostComment)
+@receiver(post_delete, sender=PostComment)
+def post_engagement_changed(sender, instance, **kwargs):
+    # Likes and comments are part of the post payload, see PostDetailView
+    BlogPost.objects.filter(pk=instance.post_id).update(updated_at=timezone.now())
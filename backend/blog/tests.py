@@ -1,3 +1,5 @@
+from unittest import mock
+
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
@@ -9,6 +11,11 @@ User = get_user_model()
 
 class BlogViewTests(APITestCase):
     def setUp(self):
+        # New posts notify subscribers through Celery; no broker in tests
+        patcher = mock.patch("blog.signals.send_new_post_email.delay")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         self.admin = User.objects.create_superuser(
             email="admin@test.com",
             password="adminpass",
@@ -43,6 +50,25 @@ class BlogViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["title"], self.post.title)
 
+    def test_post_detail_conditional_get(self):
+        url = reverse("post-detail", kwargs={"slug": self.post.slug})
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("public", response["Cache-Control"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A like changes the payload, so the post's version moves on
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse("post-like-toggle", kwargs={"pk": self.post.pk}))
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["likes"]), 1)
+        self.assertNotEqual(response["ETag"], etag)
+
     # -------------------------
     # Post create/update/delete (admin only)
     # -------------------------
@@ -3,6 +3,7 @@ from rest_framework.filters import SearchFilter
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
+from backend.conditional import ConditionalRetrieveMixin
 from .models import BlogPost, PostLike, PostComment, Subscriber
 from .serializers import (
     BlogPostSerializer,
@@ -28,11 +29,16 @@ class PostListView(generics.ListAPIView):
     search_fields = ["title", "category", "excerpt"]
 
 
-class PostDetailView(generics.RetrieveAPIView):
+class PostDetailView(ConditionalRetrieveMixin, generics.RetrieveAPIView):
     queryset = BlogPost.objects.all()
     serializer_class = BlogPostSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = "slug"
+    # Likes and comments bump BlogPost.updated_at, see blog.signals
+
+    def get_etag_extra(self):
+        # is_liked differs per user
+        return (self.request.user.pk,)
 
 
 class PostCreateView(generics.CreateAPIView):
@@ -1,10 +1,14 @@
+from unittest import mock
+
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Post, PostComment, PostVote
+from foods.models import Recipe
+from .models import Post, PostComment, PostVote, Tag
+from .views import PostListView
 
 User = get_user_model()
 
@@ -135,3 +139,28 @@ class PostCommentTests(APITestCase):
 
         res = self.client.delete(url, **auth_headers(self.user))
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class PostFeedFastPathTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="feed@test.com", password="testpass123"
+        )
+        for i, name in enumerate(["Koshari", "Ful", "Taameya"]):
+            recipe = Recipe.objects.create(name=name, user=self.user, is_public=True)
+            post = Post.objects.create(
+                user=self.user, recipe=recipe, title=name, upvotes_count=i
+            )
+            tags = [Tag.objects.get_or_create(name=f"tag{j}")[0] for j in range(i)]
+            post.tags.set(tags)
+        PostComment.objects.create(post=post, user=self.user, content="Tasty")
+
+    def test_feed_matches_serializer(self):
+        url = reverse("post-list")
+        fast = self.client.get(url)
+        with mock.patch.object(PostListView, "values_path", False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(fast.data["results"][0]["comments_count"], 1)
+        self.assertEqual(fast.data["results"][0]["score"], 2)
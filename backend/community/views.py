@@ -4,11 +4,21 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.pagination import PageNumberPagination
 
+from collections import defaultdict
+from functools import cache
+
 from django.shortcuts import get_object_or_404
 from django.db.models import Count
 
+from backend.fast_lists import ValuesListMixin, ValuesRow
+from backend.renderers import FAST_RENDERER_CLASSES
 from .models import Post, PostVote, PostComment
-from .serializers import PostReadSerializer, PostWriteSerializer, PostCommentSerializer
+from .serializers import (
+    PostReadSerializer,
+    PostWriteSerializer,
+    PostCommentSerializer,
+    TagSerializer,
+)
 from .permissions import IsOwnerOrReadOnly
 
 
@@ -24,7 +34,15 @@ class CommentPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class PostListView(generics.ListAPIView):
+@cache
+def _feed_rows():
+    return (
+        ValuesRow(PostReadSerializer(), nested=("user_email", "tags", "score")),
+        ValuesRow(TagSerializer(), prefix="tag__"),
+    )
+
+
+class PostListView(ValuesListMixin, generics.ListAPIView):
     queryset = (
         Post.objects.all()
         .select_related("user", "recipe")
@@ -35,6 +53,29 @@ class PostListView(generics.ListAPIView):
     serializer_class = PostReadSerializer
     pagination_class = PostPagination
     permission_classes = [AllowAny]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    @property
+    def values_columns(self):
+        return [*_feed_rows()[0].columns, "user__email"]
+
+    def build_rows(self, rows):
+        post, tag = _feed_rows()
+        tags = defaultdict(list)
+        links = Post.tags.through.objects.filter(
+            post_id__in=[row["id"] for row in rows]
+        ).values("post_id", *tag.columns)
+        for link in links:
+            tags[link["post_id"]].append(tag(link))
+        return [
+            post(
+                row,
+                user_email=row["user__email"],
+                tags=tags.get(row["id"], []),
+                score=int(row["upvotes_count"]) - int(row["downvotes_count"]),
+            )
+            for row in rows
+        ]
 
 
 class PostDetailView(generics.RetrieveAPIView):
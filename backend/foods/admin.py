@@ -1,6 +1,8 @@
 from django.contrib import admin
+from .dedupe import find_clusters, merge_clusters
 from .models import (
     FoodItem,
+    FoodUnitConversion,
     ServingSize,
     NutritionProfile,
     Recipe,
@@ -24,6 +26,12 @@ class NutritionProfileInline(admin.StackedInline):
     max_num = 1
 
 
+# Inline for FoodUnitConversion
+class FoodUnitConversionInline(admin.TabularInline):
+    model = FoodUnitConversion
+    extra = 0
+
+
 @admin.register(FoodItem)
 class FoodItemAdmin(admin.ModelAdmin):
     list_display = (
@@ -35,13 +43,25 @@ class FoodItemAdmin(admin.ModelAdmin):
         "price_unit",
     )
     search_fields = ("name",)
-    inlines = [ServingSizeInline, NutritionProfileInline]
+    inlines = [ServingSizeInline, NutritionProfileInline, FoodUnitConversionInline]
     readonly_fields = ("price_per_gram_protein",)
+    actions = ["merge_near_duplicates"]
 
-    @admin.display(description="Price per Gram Protein")
+    @admin.action(description="Merge near-duplicates among selected foods")
+    def merge_near_duplicates(self, request, queryset):
+        stats = merge_clusters(find_clusters(queryset))
+        self.message_user(
+            request,
+            f"Merged {stats['merged']} foods into {stats['clusters']} kept ones, "
+            f"{stats['ingredients']} ingredients repointed.",
+        )
+
+    @admin.display(
+        description="Price per Gram Protein", ordering="price_per_gram_protein"
+    )
     def price_per_gram_protein(self, obj):
-        val = obj.price_per_gram_protein()
-        return round(float(val), 4) if val is not None else None
+        val = obj.price_per_gram_protein
+        return round(val, 4) if val is not None else None
 
 
 # Inline for RecipeIngredient
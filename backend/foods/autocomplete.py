@@ -0,0 +1,236 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import FoodItem
+from .normalization import normalize_arabic, strip_accents
+
+
+# ==============================
+# CONFIG
+# ==============================
+REFRESH_INTERVAL = 30  # seconds between checks for new / changed foods
+VERSION_CACHE_KEY = "foods:autocomplete:version"
+SNAPSHOT_CACHE_KEY = "foods:autocomplete:snapshot:{version}"
+SNAPSHOT_CHUNK_KEY = "foods:autocomplete:snapshot:{version}:{chunk}"
+SNAPSHOT_CHUNK_ROWS = 5000  # ~400 KB pickled, under memcached's 1 MB items
+SNAPSHOT_TTL = 60 * 60
+MAX_LIMIT = 20
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def autocomplete_key(text):
+    """Case-folded, accent/tashkeel-free text used for prefix comparisons."""
+    text = strip_accents(normalize_arabic(text or "")).casefold()
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _word_keys(name):
+    """'Foul Medames' is reachable from 'fo...' and from 'me...'."""
+    key = autocomplete_key(name)
+    words = key.split(" ")
+    return {" ".join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+def bump_version():
+    """Invalidate every process' index after a shared food changed or was removed."""
+    cache.add(VERSION_CACHE_KEY, 0, None)
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+
+
+# ==============================
+# INDEX
+# ==============================
+class AutocompleteIndex:
+    """
+    Per-process sorted array of (key, food id) over the shared catalog
+    (user IS NULL). New rows are merged in incrementally by primary key;
+    updates and deletes bump a cache version that triggers a rebuild in a
+    background thread while the old index keeps serving, and rebuilt
+    snapshots are shared between processes through the cache in chunks of
+    SNAPSHOT_CHUNK_ROWS rows.
+
+    Readers never lock: every change builds new structures and swaps the
+    references in.
+    """
+
+    def __init__(self, background=True):
+        self.background = background
+        self.version = None
+        self.max_id = 0
+        self.entries = []
+        self.foods = {}
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.rebuilding = None
+
+    def _rows(self, min_id=0):
+        return list(
+            FoodItem.objects.filter(user__isnull=True, id__gt=min_id)
+            .order_by("id")
+            .values_list("id", "name", "nutrition__calories")
+        )
+
+    def _entries(self, rows, foods):
+        """Add rows to foods; their sorted entries and highest id."""
+        entries = []
+        max_id = 0
+        for food_id, name, kcal in rows:
+            foods[food_id] = (name, kcal)
+            entries.extend((key, food_id) for key in _word_keys(name))
+            max_id = max(max_id, food_id)
+        entries.sort()
+        return entries, max_id
+
+    def _swap(self, foods, entries, max_id):
+        # Foods first: a reader holding the old entries still finds its ids
+        self.foods = foods
+        self.entries = entries
+        self.max_id = max_id
+
+    def _add(self, rows):
+        """Merge new rows into copies of the live structures."""
+        foods = dict(self.foods)
+        entries, max_id = self._entries(rows, foods)
+        self._swap(
+            foods, list(heapq.merge(self.entries, entries)), max(self.max_id, max_id)
+        )
+
+    def _load_snapshot(self, version):
+        """Rows of a shared snapshot, None unless every chunk is cached."""
+        count = cache.get(SNAPSHOT_CACHE_KEY.format(version=version))
+        if count is None:
+            return None
+        keys = [
+            SNAPSHOT_CHUNK_KEY.format(version=version, chunk=chunk)
+            for chunk in range(count)
+        ]
+        chunks = cache.get_many(keys)
+        if len(chunks) < count:
+            return None
+        return [row for key in keys for row in chunks[key]]
+
+    def _store_snapshot(self, version, rows):
+        chunks = {
+            SNAPSHOT_CHUNK_KEY.format(version=version, chunk=i): rows[
+                start : start + SNAPSHOT_CHUNK_ROWS
+            ]
+            for i, start in enumerate(range(0, len(rows), SNAPSHOT_CHUNK_ROWS))
+        }
+        cache.set_many(chunks, SNAPSHOT_TTL)
+        # Written last: readers never see a count without its chunks
+        cache.set(SNAPSHOT_CACHE_KEY.format(version=version), len(chunks), SNAPSHOT_TTL)
+
+    def _build(self, version):
+        """(foods, entries, max_id) of a version, built off to the side."""
+        rows = self._load_snapshot(version)
+        if rows is None:
+            rows = self._rows()
+            self._store_snapshot(version, rows)
+
+        foods = {}
+        entries, max_id = self._entries(rows, foods)
+        return foods, entries, max_id
+
+    def _rebuild(self, version):
+        self._swap(*self._build(version))
+        self.version = version
+
+    def _rebuild_in_background(self, version):
+        try:
+            index = self._build(version)
+            with self.lock:
+                self._swap(*index)
+                self.version = version
+        finally:
+            # The thread's own connection: don't leave it open
+            connection.close()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < REFRESH_INTERVAL:
+            return
+
+        # Only the first build blocks; otherwise a busy refresh is skipped
+        if not self.lock.acquire(blocking=self.version is None):
+            return
+        try:
+            version = cache.get(VERSION_CACHE_KEY, 0)
+            if version == self.version:
+                rows = self._rows(min_id=self.max_id)
+                if rows:
+                    self._add(rows)
+            elif self.version is None or not self.background:
+                self._rebuild(version)
+            elif self.rebuilding is None or not self.rebuilding.is_alive():
+                # Keep serving the old index until the new one is swapped in
+                self.rebuilding = threading.Thread(
+                    target=self._rebuild_in_background, args=(version,), daemon=True
+                )
+                self.rebuilding.start()
+            self.checked_at = now
+        finally:
+            self.lock.release()
+
+    def search(self, prefix, limit=10):
+        key = autocomplete_key(prefix)
+        if not key:
+            return []
+        self.refresh()
+
+        entries, foods = self.entries, self.foods
+        results, seen = [], set()
+        for i in range(bisect.bisect_left(entries, (key,)), len(entries)):
+            entry_key, food_id = entries[i]
+            if len(results) >= limit or not entry_key.startswith(key):
+                break
+            if food_id in seen or food_id not in foods:
+                continue
+            seen.add(food_id)
+            name, kcal = foods[food_id]
+            results.append({"id": food_id, "name": name, "kcal": kcal})
+        return results
+
+
+_index = AutocompleteIndex()
+
+
+def get_autocomplete_index():
+    return _index
+
+
+def autocomplete(user, prefix, limit=10):
+    """
+    Top prefix matches visible to the user: their own foods first, then the
+    shared catalog from the in-memory index. Both match any word prefix of
+    the autocomplete_key; a user's own foods are few, so they are matched
+    here rather than indexed.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    key = autocomplete_key(prefix)
+    if not key:
+        return []
+
+    own = []
+    for food_id, name, kcal in FoodItem.objects.filter(user=user).values_list(
+        "id", "name", "nutrition__calories"
+    ):
+        matches = [word for word in _word_keys(name) if word.startswith(key)]
+        if matches:
+            own.append((min(matches), food_id, name, kcal))
+    own = [
+        {"id": food_id, "name": name, "kcal": kcal}
+        for _, food_id, name, kcal in sorted(own)[:limit]
+    ]
+    if len(own) >= limit:
+        return own
+    return own + _index.search(prefix, limit - len(own))
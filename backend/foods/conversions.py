@@ -0,0 +1,184 @@
+import re
+import threading
+
+from django.core.cache import cache
+
+from .models import FoodUnitConversion, ServingSize
+from .servings import METRIC_UNITS
+
+
+# ==============================
+# CONFIG
+# ==============================
+BASIS_GRAMS = 100.0  # NutritionProfile values are per 100 g
+DEFAULT_DENSITY = 1.0  # g per ml for foods without a density
+VERSION_CACHE_KEY = "foods:conversions:version"
+
+# Household volumes in ml, used when the food has no own figure for them
+HOUSEHOLD_VOLUMES = {"cup": 240.0, "tbsp": 15.0, "tsp": 5.0}
+
+# Spelling -> canonical unit. Metric spellings are listed in METRIC_UNITS.
+UNIT_ALIASES = {
+    "cup": "cup",
+    "كوب": "cup",
+    "tbsp": "tbsp",
+    "tbs": "tbsp",
+    "tablespoon": "tbsp",
+    "ملعقة كبيرة": "tbsp",
+    "tsp": "tsp",
+    "teaspoon": "tsp",
+    "ملعقة صغيرة": "tsp",
+    "piece": "piece",
+    "pc": "piece",
+    "pcs": "piece",
+    "unit": "piece",
+    "whole": "piece",
+    "حبة": "piece",
+    "قطعة": "piece",
+    "serving": "serving",
+    "portion": "serving",
+    "حصة": "serving",
+}
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_unit(unit):
+    """
+    Free-text unit -> canonical spelling: "Grams" -> "g", "Cups" -> "cup",
+    "pcs" -> "piece". Unknown units come back lowercased and singular so
+    they can still match a food's own serving units ("slices" -> "slice").
+    """
+    text = WHITESPACE_RE.sub(" ", (unit or "").strip().lower()).rstrip(".")
+    for candidate in (text, text[:-1] if len(text) > 2 and text.endswith("s") else text):
+        if candidate in METRIC_UNITS:
+            base, factor = METRIC_UNITS[candidate]
+            return base if factor == 1.0 else candidate
+        if candidate in UNIT_ALIASES:
+            return UNIT_ALIASES[candidate]
+    return text[:-1] if len(text) > 2 and text.endswith("s") else text
+
+
+def bump_version():
+    """Drop every process' table after conversion data changed."""
+    cache.add(VERSION_CACHE_KEY, 0, None)
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, None)
+    _table.clear()
+
+
+# ==============================
+# TABLE
+# ==============================
+class ConversionTable:
+    """
+    Per-process { food_id: { unit: grams in one unit } } compiled from
+    FoodUnitConversion rows and the gram/ml equivalents of ServingSizes.
+    Foods are compiled on first use (two queries per batch of unseen
+    foods) and the table is dropped when the cache version changes.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.foods = {}
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.foods = {}
+            self.version = None
+
+    def _compile(self, food_ids):
+        units = {food_id: {} for food_id in food_ids}
+
+        servings = (
+            ServingSize.objects.filter(food_id__in=food_ids, quantity__gt=0)
+            .exclude(metric_quantity__isnull=True)
+            .order_by("food_id", "pk")
+            .values_list("food_id", "quantity", "unit", "metric_quantity", "metric_unit")
+        )
+        for food_id, quantity, unit, metric, metric_unit in servings:
+            food = units[food_id]
+            food.setdefault("serving", (metric, metric_unit))  # first serving
+            food.setdefault(normalize_unit(unit), (metric / quantity, metric_unit))
+
+        conversions = FoodUnitConversion.objects.filter(
+            food_id__in=food_ids
+        ).values_list("food_id", "unit", "grams")
+        for food_id, unit, grams in conversions:
+            units[food_id][normalize_unit(unit)] = (grams, "g")
+
+        compiled = {}
+        for food_id, food in units.items():
+            density = food["ml"][0] if food.get("ml", (0, ""))[1] == "g" else None
+            density = density or DEFAULT_DENSITY
+            compiled[food_id] = {
+                unit: amount * density if base == "ml" else amount
+                for unit, (amount, base) in food.items()
+            }
+            compiled[food_id].setdefault("ml", density)
+        return compiled
+
+    def lookup(self, food_ids):
+        """{ food_id: { unit: grams } } for the given foods."""
+        version = cache.get(VERSION_CACHE_KEY, 0)
+        with self.lock:
+            if version != self.version:
+                self.foods, self.version = {}, version
+            foods = self.foods
+
+        missing = {food_id for food_id in food_ids if food_id not in foods}
+        if missing:
+            compiled = self._compile(missing)
+            with self.lock:
+                if self.version == version:
+                    self.foods = foods = {**self.foods, **compiled}
+                else:
+                    foods = {**foods, **compiled}
+        return foods
+
+
+_table = ConversionTable()
+
+
+def get_conversion_table():
+    return _table
+
+
+# ==============================
+# PUBLIC API
+# ==============================
+def unit_grams(units, unit):
+    """Grams in one unit, given a food's compiled units."""
+    unit = normalize_unit(unit)
+    density = units.get("ml", DEFAULT_DENSITY)
+
+    if unit in METRIC_UNITS:
+        base, factor = METRIC_UNITS[unit]
+        return factor * density if base == "ml" else factor
+    if unit in units:
+        return units[unit]
+    if unit in HOUSEHOLD_VOLUMES:
+        return HOUSEHOLD_VOLUMES[unit] * density
+    # A unit nothing is known about ("piece" without a piece weight, a
+    # serving when the food has none) counts as one nutrition basis.
+    return BASIS_GRAMS
+
+
+def to_grams(ingredients, fresh=False):
+    """
+    Batch conversion of (food_id, quantity, unit) rows to grams, in input
+    order. All foods are resolved against the in-memory table at once, or
+    with fresh=True compiled from the rows this transaction sees, without
+    storing them in the table (it may still roll back).
+    """
+    ingredients = list(ingredients)
+    food_ids = {food_id for food_id, _, _ in ingredients}
+    foods = _table._compile(food_ids) if fresh else _table.lookup(food_ids)
+
+    return [
+        (quantity or 0.0) * unit_grams(foods.get(food_id, {}), unit)
+        for food_id, quantity, unit in ingredients
+    ]
@@ -0,0 +1,306 @@
+import itertools
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, CharField, F, Func, IntegerField, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .autocomplete import bump_version as bump_autocomplete_version
+from .conversions import bump_version as bump_conversions_version
+from sync.models import Tombstone
+from .models import (
+    FoodItem,
+    FoodUnitConversion,
+    Meal,
+    MealIngredient,
+    NutritionProfile,
+    Recipe,
+    RecipeIngredient,
+    ServingSize,
+)
+from .response_cache import bump_catalog_version
+from .services import (
+    _raw_delete,
+    invalidate_barcode,
+    refresh_ingredient_grams,
+    schedule_recipe_nutrition_rebuild,
+)
+
+
+# ==============================
+# CONFIG
+# ==============================
+NUM_PERM = 32  # MinHash permutations per name
+BANDS = 8  # LSH bands of NUM_PERM // BANDS rows: candidates from ~0.6 up
+
+NAME_THRESHOLD = 0.6  # trigram Jaccard of search_key, nutrients agreeing
+NAME_ONLY_THRESHOLD = 0.9  # when a food has no nutrition profile
+NUTRIENT_TOLERANCE = 0.05  # relative difference allowed per macro
+NUTRIENT_SLACK = 1.0  # absolute difference (g / kcal) always allowed
+MACROS = ("calories", "protein", "carbohydrates", "fats")
+
+SMALL_BLOCK = 64  # compared pairwise, larger blocks through LSH buckets
+MAX_BLOCK = 5000  # rows of one block held in memory at once
+CHUNK_SIZE = 2000  # rows per fetch of the server-side cursor
+MERGE_BATCH = 500  # clusters merged per transaction
+
+# (a * x + b) mod p over 32-bit shingle hashes, without uint64 overflow
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(7)
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+
+# ==============================
+# MINHASH
+# ==============================
+def shingles(key):
+    """crc32 of the character trigrams of a search key."""
+    text = f" {key} "
+    return {zlib.crc32(text[i : i + 3].encode()) for i in range(len(text) - 2)}
+
+
+def minhash(keys):
+    """(len(keys), NUM_PERM) MinHash signatures of the keys' trigram sets."""
+    signatures = np.empty((len(keys), NUM_PERM), dtype=np.uint64)
+    for i, key in enumerate(keys):
+        hashes = np.fromiter(shingles(key) or {0}, dtype=np.uint64)
+        signatures[i] = ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+    return signatures
+
+
+def _candidate_pairs(signatures):
+    """(i, j) row pairs worth comparing within one block."""
+    n = len(signatures)
+    if n <= SMALL_BLOCK:
+        return np.triu_indices(n, 1)
+
+    rows = NUM_PERM // BANDS
+    pairs = set()
+    for band in range(BANDS):
+        buckets = {}
+        for i, sig in enumerate(signatures[:, band * rows : (band + 1) * rows]):
+            buckets.setdefault(sig.tobytes(), []).append(i)
+        for members in buckets.values():
+            pairs.update(itertools.combinations(members, 2))
+    if not pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    i, j = np.asarray(sorted(pairs), dtype=np.int64).T
+    return i, j
+
+
+def _duplicate_pairs(block, name_threshold):
+    """Pairs of food ids of one block judged to be the same product."""
+    ids = np.asarray([row[0] for row in block], dtype=np.int64)
+    signatures = minhash([row[1] for row in block])
+    macros = np.asarray(
+        [[np.nan if v is None else v for v in row[2:]] for row in block],
+        dtype=np.float64,
+    )
+    i, j = _candidate_pairs(signatures)
+    if not len(i):
+        return []
+
+    name = (signatures[i] == signatures[j]).mean(axis=1)
+    profiled = ~np.isnan(macros[:, 0])
+    both = profiled[i] & profiled[j]
+    diff = np.abs(macros[i] - macros[j])
+    allowed = np.maximum(
+        NUTRIENT_SLACK, NUTRIENT_TOLERANCE * np.fmax(macros[i], macros[j])
+    )
+    close = np.all(diff <= allowed, axis=1)
+
+    same = (both & close & (name >= name_threshold)) | (
+        ~both & (name >= NAME_ONLY_THRESHOLD)
+    )
+    return list(zip(ids[i[same]].tolist(), ids[j[same]].tolist()))
+
+
+# ==============================
+# CLUSTERING
+# ==============================
+class _DisjointSet:
+    """Union-find over the ids that matched something (not every row)."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        root = x
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent.get(x, x)
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+            self.parent.setdefault(min(a, b), min(a, b))
+
+    def groups(self):
+        groups = {}
+        for x in self.parent:
+            groups.setdefault(self.find(x), []).append(x)
+        return [sorted(g) for g in groups.values() if len(g) > 1]
+
+
+# Blocking keys: a pair is only compared when it shares one of them.
+# Rows never block across owners, see find_clusters().
+def _name_block():
+    return {
+        "block_0": Func(
+            F("search_key"),
+            Value(" "),
+            Value(1),
+            function="split_part",
+            output_field=CharField(),
+        )
+    }
+
+
+def _nutrient_block():
+    return {
+        "block_0": Round(F("nutrition__calories") / 25),
+        "block_1": Round(F("nutrition__protein") / 2),
+    }
+
+
+def _blocks(queryset, keys):
+    """Rows of each block, streamed in block order with a server-side cursor."""
+    rows = (
+        queryset.annotate(**keys)
+        .order_by(F("user_id").asc(nulls_first=True), *keys, "pk")
+        .values_list(
+            "user_id",
+            *keys,
+            "pk",
+            "search_key",
+            *(f"nutrition__{field}" for field in MACROS),
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    width = 1 + len(keys)
+    for block_key, group in itertools.groupby(rows, key=lambda row: row[:width]):
+        if any(part in (None, "") for part in block_key[1:]):
+            continue
+        while chunk := [row[width:] for row in itertools.islice(group, MAX_BLOCK)]:
+            if len(chunk) > 1:
+                yield chunk
+
+
+def find_clusters(queryset=None, name_threshold=NAME_THRESHOLD):
+    """
+    Near-duplicate foods as sorted lists of ids, in two blocking passes:
+    by the first search_key token (spellings and scripts are already
+    unified there, see foods.normalization), then by rounded calories and
+    protein for renamed copies. Within a block, candidates come from MinHash
+    LSH over search_key trigrams and are kept when their names are similar
+    and their macros agree. Catalog rows and each user's private rows are
+    clustered separately: merging a private copy into the catalog would
+    drop the user's own price.
+    """
+    if queryset is None:
+        queryset = FoodItem.objects.all()
+
+    matches = _DisjointSet()
+    for rows, keys in (
+        (queryset, _name_block()),
+        (queryset.filter(nutrition__isnull=False), _nutrient_block()),
+    ):
+        for block in _blocks(rows, keys):
+            for a, b in _duplicate_pairs(block, name_threshold):
+                matches.union(a, b)
+    return sorted(matches.groups())
+
+
+# ==============================
+# MERGES
+# ==============================
+def _canonical(members, info):
+    """Keep the row with a nutrition profile, then an off_code, then the oldest."""
+    return max(
+        members,
+        key=lambda pk: (info[pk][1] is not None, info[pk][0] is not None, -pk),
+    )
+
+
+def merge_clusters(clusters, batch=MERGE_BATCH):
+    """
+    Merge every cluster into one kept food: recipe and meal ingredients are
+    repointed in bulk (one UPDATE per table and batch), their grams and the
+    affected recipes' totals recomputed, and the duplicates deleted with
+    their servings, profiles and conversions. Returns counts.
+    """
+    stats = {"clusters": 0, "merged": 0, "ingredients": 0}
+    for start in range(0, len(clusters), batch):
+        with transaction.atomic():
+            _merge_batch(clusters[start : start + batch], stats)
+    return stats
+
+
+def _merge_batch(clusters, stats):
+    info = {
+        pk: (off_code, calories, user_id)
+        for pk, off_code, calories, user_id in FoodItem.objects.filter(
+            pk__in=[pk for cluster in clusters for pk in cluster]
+        ).values_list("pk", "off_code", "nutrition__calories", "user_id")
+    }
+    target = {}
+    for cluster in clusters:
+        members = [pk for pk in cluster if pk in info]  # gone since clustering
+        if len(members) < 2:
+            continue
+        keep = _canonical(members, info)
+        target.update({pk: keep for pk in members if pk != keep})
+        stats["clusters"] += 1
+    if not target:
+        return
+
+    duplicates = list(target)
+    repoint = Case(
+        *(When(food_item_id=dup, then=Value(keep)) for dup, keep in target.items()),
+        output_field=IntegerField(),
+    )
+    recipe_ids = set(
+        RecipeIngredient.objects.filter(food_item_id__in=duplicates).values_list(
+            "recipe_id", flat=True
+        )
+    )
+    meal_ids = set(
+        MealIngredient.objects.filter(food_item_id__in=duplicates).values_list(
+            "meal_id", flat=True
+        )
+    )
+    for model in (RecipeIngredient, MealIngredient):
+        stats["ingredients"] += model.objects.filter(
+            food_item_id__in=duplicates
+        ).update(food_item=repoint)
+
+    # The kept food's servings and conversions now apply
+    refresh_ingredient_grams(set(target.values()))
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    Meal.objects.filter(pk__in=meal_ids).update(updated_at=timezone.now())
+    schedule_recipe_nutrition_rebuild(recipe_ids)
+
+    for model, field in (
+        (ServingSize, "food_id"),
+        (FoodUnitConversion, "food_id"),
+        (NutritionProfile, "food_item_id"),
+    ):
+        _raw_delete(model.objects.filter(**{f"{field}__in": duplicates}))
+    _raw_delete(FoodItem.objects.filter(pk__in=duplicates))
+    Tombstone.objects.record(
+        Tombstone.Kind.FOOD, [(pk, info[pk][2]) for pk in duplicates]
+    )
+    stats["merged"] += len(duplicates)
+
+    # What the per-row signals would have done, once per batch
+    bump_catalog_version()
+    bump_autocomplete_version()
+    transaction.on_commit(bump_conversions_version)
+    for pk in duplicates:
+        invalidate_barcode(info[pk][0])
@@ -0,0 +1,247 @@
+import hashlib
+import json
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Q
+from scipy.optimize import linprog
+
+from .conversions import get_conversion_table, normalize_unit, to_grams
+from .models import FoodItem
+
+
+# ==============================
+# CONFIG
+# ==============================
+# target_macros key -> NutritionProfile field (values are per 100 g)
+TARGET_NUTRIENTS = {
+    "calories": "calories",
+    "protein_g": "protein",
+    "carbs_g": "carbohydrates",
+    "fats_g": "fats",
+}
+LOWER_BOUND_ONLY = {"protein"}  # going over the protein target is fine
+TOLERANCE = 0.1  # accepted deviation from each target
+
+MAX_GRAMS_PER_FOOD = 500
+MAX_CANDIDATES = 2000
+MAX_SYNC_CANDIDATES = 300  # larger problems are solved by a Celery worker
+TIME_BUDGET = 2.0  # seconds given to the solver
+
+RESULT_TTL = 60 * 60
+PENDING_TTL = 10 * 60
+RESULT_CACHE_KEY = "foods:diet:{digest}"
+PENDING_CACHE_KEY = "foods:diet:pending:{digest}"
+
+CANDIDATE_FIELDS = (
+    "id",
+    "name",
+    "price",
+    "price_quantity",
+    "price_unit",
+    *(f"nutrition__{field}" for field in TARGET_NUTRIENTS.values()),
+)
+
+
+class DietOptimizerError(ValueError):
+    pass
+
+
+# ==============================
+# INPUTS
+# ==============================
+def parse_targets(target_macros):
+    """UserHealthData.target_macros -> { nutrient field: daily target }."""
+    targets = {}
+    for key, field in TARGET_NUTRIENTS.items():
+        try:
+            value = float((target_macros or {}).get(key) or 0)
+        except (TypeError, ValueError):
+            raise DietOptimizerError(f"target_macros.{key} must be a number.")
+        if value > 0:
+            targets[field] = value
+
+    if not targets:
+        raise DietOptimizerError("Set target_macros in your health data first.")
+    return targets
+
+
+def _priced_grams(rows):
+    """
+    Grams in each row's priced quantity, None when the food is sold by a
+    unit (piece, serving) whose weight foods.conversions does not know.
+    """
+    units = get_conversion_table().lookup({row[0] for row in rows})
+    grams = to_grams((row[0], row[3], row[4]) for row in rows)
+    return [
+        value
+        if row[4] in (FoodItem.PriceUnit.G, FoodItem.PriceUnit.ML)
+        or normalize_unit(row[4]) in units.get(row[0], {})
+        else None
+        for row, value in zip(rows, grams)
+    ]
+
+
+def load_candidates(user, targets, limit=MAX_CANDIDATES):
+    """
+    Priced foods visible to the user as (id, name, price, grams priced,
+    *nutrients). Each target gets an equal share of limit: the foods with
+    the lowest price per gram of that macro (per kcal for calories), so
+    carb and fat sources make it in next to the protein ones.
+    """
+    rows = list(
+        FoodItem.objects.filter(Q(user=user) | Q(user__isnull=True))
+        .filter(price__gt=0, price_quantity__gt=0, nutrition__isnull=False)
+        .order_by("id")
+        .values_list(*CANDIDATE_FIELDS)
+    )
+    rows = [
+        (row[0], row[1], float(row[2]), grams, *row[5:])
+        for row, grams in zip(rows, _priced_grams(rows))
+        if grams
+    ]
+    if not rows:
+        return []
+
+    table = np.asarray([row[2:] for row in rows], dtype=np.float64)
+    price_per_gram = table[:, 0] / table[:, 1]
+    nutrients = np.nan_to_num(table[:, 2:])
+    fields = list(TARGET_NUTRIENTS.values())
+
+    share = max(1, limit // len(targets))
+    chosen = set()
+    for field in targets:
+        amount = nutrients[:, fields.index(field)]
+        (useful,) = np.nonzero(amount > 0)
+        value = price_per_gram[useful] / amount[useful]
+        chosen.update(useful[np.argsort(value, kind="stable")[:share]].tolist())
+    return [rows[i] for i in sorted(chosen)]
+
+
+class DietProblem:
+    """Everything the solver needs, plus a digest identifying that input."""
+
+    def __init__(self, targets, budget, currency, candidates):
+        self.targets = targets
+        self.budget = float(budget)
+        self.currency = currency
+        self.candidates = candidates
+
+        payload = json.dumps(
+            [self.targets, self.budget, self.currency, self.candidates],
+            sort_keys=True,
+            default=str,
+        )
+        self.digest = hashlib.sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    def for_user(cls, user, budget):
+        health = getattr(user, "health_data", None)
+        if health is None:
+            raise DietOptimizerError("Set target_macros in your health data first.")
+        profile = getattr(user, "userprofile", None)
+        currency = profile.preferred_currency if profile else "EGP"
+
+        targets = parse_targets(health.target_macros)
+        return cls(
+            targets,
+            budget,
+            currency,
+            load_candidates(user, targets),
+        )
+
+    @property
+    def is_large(self):
+        return len(self.candidates) > MAX_SYNC_CANDIDATES
+
+    @property
+    def cache_key(self):
+        return RESULT_CACHE_KEY.format(digest=self.digest)
+
+    @property
+    def pending_cache_key(self):
+        return PENDING_CACHE_KEY.format(digest=self.digest)
+
+
+# ==============================
+# SOLVER
+# ==============================
+def solve(problem, time_budget=TIME_BUDGET):
+    """
+    Cheapest grams of each candidate meeting every target within TOLERANCE
+    and costing at most the budget, as a linear program:
+
+        minimize   cost . x
+        subject to (1 - tol) * target <= nutrients . x <= (1 + tol) * target
+                   cost . x <= budget
+                   0 <= x <= MAX_GRAMS_PER_FOOD
+    """
+    result = {
+        "status": "infeasible",
+        "currency": problem.currency,
+        "budget": problem.budget,
+        "cost": None,
+        "items": [],
+        "totals": {},
+    }
+    if not problem.candidates:
+        return result
+
+    table = np.asarray(
+        [row[2:] for row in problem.candidates], dtype=np.float64
+    )
+    cost = table[:, 0] / table[:, 1]  # per gram of the priced quantity
+    nutrients = np.nan_to_num(table[:, 2:]) / 100.0  # per gram
+    fields = list(TARGET_NUTRIENTS.values())
+
+    rows, bounds = [cost], [problem.budget]
+    for field, target in problem.targets.items():
+        column = nutrients[:, fields.index(field)]
+        rows.append(-column)
+        bounds.append(-(1 - TOLERANCE) * target)
+        if field not in LOWER_BOUND_ONLY:
+            rows.append(column)
+            bounds.append((1 + TOLERANCE) * target)
+
+    solution = linprog(
+        cost,
+        A_ub=np.vstack(rows),
+        b_ub=np.asarray(bounds),
+        bounds=(0, MAX_GRAMS_PER_FOOD),
+        method="highs",
+        options={"time_limit": time_budget},
+    )
+    if solution.status == 1:
+        result["status"] = "timeout"
+        return result
+    if solution.status != 0:
+        return result
+
+    grams = np.where(solution.x >= 0.5, solution.x, 0.0)
+    chosen = np.flatnonzero(grams)
+    result.update(
+        status="optimal",
+        cost=round(float(cost @ grams), 2),
+        items=[
+            {
+                "id": problem.candidates[i][0],
+                "name": problem.candidates[i][1],
+                "grams": round(float(grams[i]), 1),
+                "cost": round(float(cost[i] * grams[i]), 2),
+            }
+            for i in chosen.tolist()
+        ],
+        totals={
+            field: round(float(nutrients[:, col] @ grams), 1)
+            for col, field in enumerate(fields)
+        },
+    )
+    return result
+
+
+def solve_cached(problem):
+    result = cache.get(problem.cache_key)
+    if result is None:
+        result = solve(problem)
+        cache.set(problem.cache_key, result, RESULT_TTL)
+    return result
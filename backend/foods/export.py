@@ -0,0 +1,125 @@
+import csv
+import io
+import itertools
+from datetime import datetime, time, timezone as dt_timezone
+
+import orjson
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fast_lists import build_foods, food_columns
+from .models import FoodItem
+from .serializers import FoodItemSerializer, NutritionProfileSerializer
+
+
+# ==============================
+# CONFIG
+# ==============================
+CHUNK_SIZE = 2000  # rows per fetch of the server-side cursor
+FORMATS = ("ndjson", "csv")
+
+# Nested in the JSON payload, flattened or encoded in CSV
+NESTED_FIELDS = ("serving_size", "nutrition")
+
+_default = JSONEncoder().default
+
+
+# ==============================
+# ROWS
+# ==============================
+def parse_since(value):
+    """?since= as an aware datetime (a bare date means its midnight, UTC)."""
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None and (day := parse_date(value)) is not None:
+        since = datetime.combine(day, time.min)
+    if since is None:
+        raise ValidationError({"since": "Use an ISO 8601 date or datetime."})
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    return since
+
+
+def export_queryset(user=None, since=None):
+    """Catalog foods, plus the user's private ones, changed since `since`."""
+    visible = Q(user__isnull=True)
+    if user is not None:
+        visible |= Q(user=user)
+    queryset = FoodItem.objects.filter(visible)
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    return queryset.order_by("pk")
+
+
+def iter_food_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """
+    FoodItemSerializer output in lists of chunk_size, read through a
+    server-side cursor: memory stays at one chunk whatever the table size.
+    """
+    rows = queryset.values(*food_columns()).iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield build_foods(chunk)
+
+
+# ==============================
+# FORMATS
+# ==============================
+def ndjson_stream(chunks):
+    """One JSON object per line, one bytes block per chunk."""
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE
+    for foods in chunks:
+        yield b"".join(
+            orjson.dumps(food, default=_default, option=options) for food in foods
+        )
+
+
+def csv_header():
+    food_fields = [
+        name
+        for name, field in FoodItemSerializer().fields.items()
+        if not field.write_only and name not in NESTED_FIELDS
+    ]
+    nutrition_fields = [
+        f"nutrition_{name}"
+        for name, field in NutritionProfileSerializer().fields.items()
+        if not field.write_only
+    ]
+    return [*food_fields, *nutrition_fields, "serving_size"]
+
+
+def _csv_row(food, header):
+    row = {key: value for key, value in food.items() if key not in NESTED_FIELDS}
+    for name, value in (food["nutrition"] or {}).items():
+        row[f"nutrition_{name}"] = value
+    # Several per food: kept as the JSON list
+    row["serving_size"] = orjson.dumps(
+        food["serving_size"], default=_default
+    ).decode()
+    return [row.get(key, "") for key in header]
+
+
+def csv_stream(chunks):
+    """A header line, then one flat row per food, one str block per chunk."""
+    header = csv_header()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for foods in chunks:
+        writer.writerows(_csv_row(food, header) for food in foods)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # no rows at all
+        yield buffer.getvalue()
+
+
+STREAMS = {"ndjson": ndjson_stream, "csv": csv_stream}
+
+
+def export_foods(queryset, format="ndjson", chunk_size=CHUNK_SIZE):
+    """Blocks of the export in the given format, for streaming."""
+    return STREAMS[format](iter_food_chunks(queryset, chunk_size))
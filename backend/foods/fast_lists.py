@@ -0,0 +1,251 @@
+from collections import defaultdict
+from functools import cache
+
+from backend.fast_lists import ValuesRow
+from .models import (
+    NUTRIENT_FIELDS,
+    FoodItem,
+    Meal,
+    MealIngredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeInstruction,
+    ServingSize,
+)
+from .serializers import (
+    FoodItemSerializer,
+    MealIngredientSerializer,
+    MealSerializer,
+    NutritionProfileSerializer,
+    RecipeIngredientSerializer,
+    RecipeInstructionSerializer,
+    RecipeNutritionSerializer,
+    RecipeSerializer,
+    ServingSizeSerializer,
+)
+
+
+# Plain-dict builders reproducing the default (no ?fields= / ?expand=)
+# output of the read serializers from .values() rows, see
+# backend.fast_lists. Every builder costs a fixed number of queries.
+
+# Method fields of RecipeSerializer / MealSerializer -> nutrient
+TOTAL_FIELDS = {
+    "calories": "calories",
+    "protein_g": "protein",
+    "carbs_g": "carbohydrates",
+    "fats_g": "fats",
+}
+
+
+@cache
+def _rows():
+    return {
+        "food": ValuesRow(
+            FoodItemSerializer(), nested=("serving_size", "nutrition")
+        ),
+        "food_nutrition": ValuesRow(
+            NutritionProfileSerializer(), prefix="nutrition__"
+        ),
+        "serving": ValuesRow(ServingSizeSerializer()),
+        "recipe": ValuesRow(
+            RecipeSerializer(),
+            nested=("ingredients", "instructions", "nutrition", *TOTAL_FIELDS),
+        ),
+        "recipe_nutrition": ValuesRow(
+            RecipeNutritionSerializer(), prefix="nutrition__"
+        ),
+        "recipe_ingredient": ValuesRow(
+            RecipeIngredientSerializer(), nested=("food_item",)
+        ),
+        "instruction": ValuesRow(RecipeInstructionSerializer()),
+        "meal": ValuesRow(
+            MealSerializer(),
+            nested=("ingredients", "recipes", "nutrition", *TOTAL_FIELDS),
+        ),
+        "meal_ingredient": ValuesRow(
+            MealIngredientSerializer(), nested=("food_item",)
+        ),
+    }
+
+
+def _group(rows, key, build):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row[key]].append(build(row))
+    return grouped
+
+
+# ==============================
+# FOODS
+# ==============================
+def food_columns():
+    """.values() keys build_foods() reads (nutrition joined in)."""
+    rows = _rows()
+    return [*rows["food"].columns, *rows["food_nutrition"].columns]
+
+
+def build_foods(rows):
+    """FoodItemSerializer output for .values(*food_columns()) rows."""
+    if not rows:
+        return []
+    builders = _rows()
+    nutrition = builders["food_nutrition"]
+
+    servings = _group(
+        ServingSize.objects.filter(food_id__in=[row["id"] for row in rows])
+        .order_by("pk")
+        .values("food_id", *builders["serving"].columns),
+        "food_id",
+        builders["serving"],
+    )
+    return [
+        builders["food"](
+            row,
+            serving_size=servings.get(row["id"], []),
+            # calories is NOT NULL, so NULL means the food has no profile
+            nutrition=(
+                None if row["nutrition__calories"] is None else nutrition(row)
+            ),
+        )
+        for row in rows
+    ]
+
+
+def foods_by_id(ids):
+    if not ids:
+        return {}
+    rows = FoodItem.objects.filter(pk__in=ids).values(*food_columns())
+    return {food["id"]: food for food in build_foods(list(rows))}
+
+
+# ==============================
+# RECIPES
+# ==============================
+def recipe_columns():
+    rows = _rows()
+    return [*rows["recipe"].columns, *rows["recipe_nutrition"].columns]
+
+
+def _totals(nutrition):
+    """calories / protein_g / carbs_g / fats_g as RecipeSerializer rounds them."""
+    nutrition = nutrition or {}
+    return {
+        name: round(nutrition.get(field) or 0, 1)
+        for name, field in TOTAL_FIELDS.items()
+    }
+
+
+def _food_refs(ingredient_rows, compact):
+    """food_item of each ingredient row: the food, or its id when compact."""
+    if compact:
+        return {row["food_item_id"]: row["food_item_id"] for row in ingredient_rows}
+    return foods_by_id({row["food_item_id"] for row in ingredient_rows})
+
+
+def build_recipes(rows, compact=False):
+    """
+    RecipeSerializer output for .values(*recipe_columns()) rows. compact
+    leaves ingredient foods as ids, for clients that hold the foods already.
+    """
+    if not rows:
+        return []
+    builders = _rows()
+    ids = [row["id"] for row in rows]
+
+    ingredient_rows = list(
+        RecipeIngredient.objects.filter(recipe_id__in=ids)
+        .order_by("pk")
+        .values("recipe_id", "food_item_id", *builders["recipe_ingredient"].columns)
+    )
+    foods = _food_refs(ingredient_rows, compact)
+    ingredients = defaultdict(list)
+    for row in ingredient_rows:
+        ingredients[row["recipe_id"]].append(
+            builders["recipe_ingredient"](row, food_item=foods[row["food_item_id"]])
+        )
+
+    instructions = _group(
+        RecipeInstruction.objects.filter(recipe_id__in=ids).values(
+            "recipe_id", *builders["instruction"].columns
+        ),
+        "recipe_id",
+        builders["instruction"],
+    )
+
+    data = []
+    for row in rows:
+        nutrition = None
+        if row["nutrition__calories"] is not None:  # totals built
+            nutrition = builders["recipe_nutrition"](row)
+        data.append(
+            builders["recipe"](
+                row,
+                ingredients=ingredients.get(row["id"], []),
+                instructions=instructions.get(row["id"], []),
+                nutrition=nutrition,
+                **_totals(nutrition),
+            )
+        )
+    return data
+
+
+# ==============================
+# MEALS
+# ==============================
+def meals_by_id(ids, compact=False):
+    """
+    MealSerializer output of the given meals, nutrition totals included.
+    compact leaves ingredient foods and recipes as ids.
+    """
+    if not ids:
+        return {}
+    builders = _rows()
+    totals = [f"total_{field}" for field in NUTRIENT_FIELDS]
+    rows = list(
+        Meal.objects.filter(pk__in=ids)
+        .with_nutrition()
+        .values(*builders["meal"].columns, *totals)
+    )
+
+    ingredient_rows = list(
+        MealIngredient.objects.filter(meal_id__in=ids)
+        .order_by("pk")
+        .values("meal_id", "food_item_id", *builders["meal_ingredient"].columns)
+    )
+    foods = _food_refs(ingredient_rows, compact)
+    ingredients = defaultdict(list)
+    for row in ingredient_rows:
+        ingredients[row["meal_id"]].append(
+            builders["meal_ingredient"](row, food_item=foods[row["food_item_id"]])
+        )
+
+    links = list(
+        Meal.recipes.through.objects.filter(meal_id__in=ids)
+        .order_by("recipe_id")  # as the with_details() prefetch
+        .values_list("meal_id", "recipe_id")
+    )
+    if compact:
+        recipes = {recipe_id: recipe_id for _, recipe_id in links}
+    else:
+        recipe_rows = Recipe.objects.filter(
+            pk__in={recipe_id for _, recipe_id in links}
+        ).values(*recipe_columns())
+        recipes = {
+            recipe["id"]: recipe for recipe in build_recipes(list(recipe_rows))
+        }
+    meal_recipes = defaultdict(list)
+    for meal_id, recipe_id in links:
+        meal_recipes[meal_id].append(recipes[recipe_id])
+
+    meals = {}
+    for row in rows:
+        nutrition = {field: row[f"total_{field}"] or 0 for field in NUTRIENT_FIELDS}
+        meals[row["id"]] = builders["meal"](
+            row,
+            ingredients=ingredients.get(row["id"], []),
+            recipes=meal_recipes.get(row["id"], []),
+            nutrition={field: round(value, 1) for field, value in nutrition.items()},
+            **_totals(nutrition),
+        )
+    return meals
@@ -0,0 +1,110 @@
+import math
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import NUTRIENT_FIELDS
+from .normalization import search_tokens
+
+
+# Must match the expressions of the GIN indexes on FoodItem
+FOOD_NAME_VECTOR = SearchVector("name", config="simple")
+FOOD_SEARCH_KEY_VECTOR = SearchVector("search_key", config="simple")
+
+
+def search_key_query(term):
+    """
+    tsquery over FoodItem.search_key: every normalized token must match,
+    the last one as a prefix (when long enough to be selective) since it may
+    still be being typed.
+    """
+    tokens = search_tokens(term)
+    if not tokens:
+        return None
+    if len(tokens[-1]) >= 3:
+        tokens[-1] = f"{tokens[-1]}:*"
+    return SearchQuery(" & ".join(tokens), config="simple", search_type="raw")
+
+
+class FoodSearchFilter(BaseFilterBackend):
+    """
+    Relevance-ranked, typo-tolerant food search.
+
+    ?search= matches full-text words (tsvector), similar words (pg_trgm) or
+    the Arabic/English normalized search_key, all served by GIN indexes on
+    FoodItem, and annotates search_rank.
+    ?protein_type= filters nutrition.protein_type exactly.
+    """
+
+    search_param = "search"
+    protein_type_param = "protein_type"
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        protein_type = request.query_params.get(self.protein_type_param)
+        if protein_type:
+            queryset = queryset.filter(nutrition__protein_type=protein_type)
+
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+
+        query = SearchQuery(term, config="simple", search_type="websearch")
+        matches = Q(search_vector=query) | Q(name__trigram_word_similar=term)
+        rank = SearchRank(FOOD_NAME_VECTOR, query) + TrigramWordSimilarity(term, "name")
+        queryset = queryset.annotate(search_vector=FOOD_NAME_VECTOR)
+
+        key_query = search_key_query(term)
+        if key_query is not None:
+            queryset = queryset.annotate(search_key_vector=FOOD_SEARCH_KEY_VECTOR)
+            matches |= Q(search_key_vector=key_query)
+            rank += SearchRank(FOOD_SEARCH_KEY_VECTOR, key_query)
+
+        return queryset.filter(matches).annotate(search_rank=rank)
+
+
+class NutrientRangeFilter(BaseFilterBackend):
+    """
+    Inclusive nutrient ranges on the view's "nutrition" relation:
+    ?protein_min=20&calories_max=200. Foods are filtered on their
+    NutritionProfile (per 100 g), recipes on their stored RecipeNutrition
+    totals; rows without one never match a range. Every nutrient column has
+    its own B-tree index, see NutritionProfile.Meta.
+    """
+
+    relation = "nutrition"
+    bounds = {"min": "gte", "max": "lte"}
+
+    def get_ranges(self, request):
+        """{ "nutrition__<nutrient>__<lookup>": value } from the query string."""
+        ranges, errors = {}, {}
+        for field in NUTRIENT_FIELDS:
+            for suffix, lookup in self.bounds.items():
+                param = f"{field}_{suffix}"
+                value = request.query_params.get(param)
+                if value is None:
+                    continue
+                try:
+                    number = float(value)
+                except ValueError:
+                    number = math.nan
+                if not math.isfinite(number):
+                    errors[param] = "A number is required."
+                    continue
+                ranges[f"{self.relation}__{field}__{lookup}"] = number
+        if errors:
+            raise ValidationError(errors)
+        return ranges
+
+    def filter_queryset(self, request, queryset, view):
+        ranges = self.get_ranges(request)
+        return queryset.filter(**ranges) if ranges else queryset
@@ -0,0 +1,186 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from community.models import Post, Tag
+from community.views import PostListView
+from foods.models import (
+    FoodItem,
+    Meal,
+    MealIngredient,
+    NutritionProfile,
+    Recipe,
+    RecipeIngredient,
+    RecipeInstruction,
+    ServingSize,
+)
+from foods.services import rebuild_recipe_nutrition
+from foods.views import FoodItemListView, RecipeListView
+from profiles.models import MealLog
+from profiles.views import UserMealLogListView
+
+User = get_user_model()
+
+ENDPOINTS = (
+    ("food list", FoodItemListView, "/api/foods/"),
+    ("recipe list", RecipeListView, "/api/foods/recipes/"),
+    ("meal log list", UserMealLogListView, "/api/profiles/logs/"),
+    ("community feed", PostListView, "/api/community/posts/"),
+)
+
+# The response cache would answer every repeated request
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot list endpoints (requests/sec) with the serializers "
+        "and JSONRenderer against the .values() fast path and FastJSONRenderer, "
+        "on synthetic rows created in a rolled-back transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--foods", type=int, default=500)
+        parser.add_argument("--recipes", type=int, default=200)
+        parser.add_argument("--meals", type=int, default=30)
+        parser.add_argument("--logs", type=int, default=100)
+        parser.add_argument("--posts", type=int, default=100)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        with transaction.atomic(), override_settings(
+            CACHES=NO_CACHE, ALLOWED_HOSTS=["*"]
+        ):
+            user = self._seed(random.Random(opts["seed"]), opts)
+            factory = APIRequestFactory()
+
+            self.stdout.write(
+                f"Foods={opts['foods']} Recipes={opts['recipes']} "
+                f"Meals={opts['meals']} Logs={opts['logs']} Posts={opts['posts']} "
+                f"page_size={opts['page_size']}"
+            )
+            for label, view, path in ENDPOINTS:
+                before = view.as_view(
+                    values_path=False,
+                    renderer_classes=[JSONRenderer],
+                    throttle_classes=[],
+                )
+                after = view.as_view(throttle_classes=[])
+
+                def run(handler):
+                    request = factory.get(path, {"page_size": opts["page_size"]})
+                    force_authenticate(request, user=user)
+                    response = handler(request).render()
+                    assert response.status_code == 200, response.content[:200]
+                    return response.content
+
+                slow, fast = run(before), run(after)
+                before_rps = opts["requests"] / self._total(run, before, opts)
+                after_rps = opts["requests"] / self._total(run, after, opts)
+                self.stdout.write(
+                    f"{label:<15} {before_rps:8.1f} -> {after_rps:8.1f} req/s  "
+                    + self.style.SUCCESS(f"x{after_rps / before_rps:.1f}")
+                    + ("" if slow == fast else self.style.ERROR("  (output differs)"))
+                )
+
+            transaction.set_rollback(True)
+
+    def _total(self, run, handler, opts):
+        start = time.perf_counter()
+        for _ in range(opts["requests"]):
+            run(handler)
+        return time.perf_counter() - start
+
+    def _seed(self, rng, opts):
+        user = User.objects.create_user(
+            email=f"bench-{rng.random()}@example.com", password=None
+        )
+
+        foods = FoodItem.objects.bulk_create(
+            FoodItem(name=f"Bench food {i}", price=rng.randint(1, 500))
+            for i in range(opts["foods"])
+        )
+        NutritionProfile.objects.bulk_create(
+            NutritionProfile(
+                food_item=food,
+                calories=rng.uniform(0, 900),
+                protein=rng.uniform(0, 40),
+                carbohydrates=rng.uniform(0, 80),
+                fats=rng.uniform(0, 60),
+            )
+            for food in foods
+        )
+        ServingSize.objects.bulk_create(
+            ServingSize(
+                food=food,
+                description=description,
+                quantity=quantity,
+                unit=unit,
+                metric_quantity=metric,
+                metric_unit="g",
+            )
+            for food in foods
+            for description, quantity, unit, metric in (
+                ("1 cup", 1, "cup", 240.0),
+                ("100 g", 100, "g", 100.0),
+            )
+        )
+
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                name=f"Bench recipe {i} {rng.random()}",
+                slug=f"bench-recipe-{i}-{rng.randrange(10**9)}",
+                user=user,
+                is_public=True,
+            )
+            for i in range(opts["recipes"])
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                food_item=rng.choice(foods),
+                quantity=rng.uniform(10, 300),
+                unit="g",
+            )
+            for recipe in recipes
+            for _ in range(5)
+        )
+        RecipeInstruction.objects.bulk_create(
+            RecipeInstruction(recipe=recipe, step_number=step, text=f"Step {step}")
+            for recipe in recipes
+            for step in range(1, 4)
+        )
+        rebuild_recipe_nutrition([recipe.pk for recipe in recipes])
+
+        meals = Meal.objects.bulk_create(
+            Meal(user=user, name=f"Bench meal {i}", meal_type="lunch")
+            for i in range(opts["meals"])
+        )
+        for meal in meals:
+            meal.recipes.set(rng.sample(recipes, min(2, len(recipes))))
+        MealIngredient.objects.bulk_create(
+            MealIngredient(
+                meal=meal, food_item=rng.choice(foods), quantity=1, unit="cup"
+            )
+            for meal in meals
+            for _ in range(2)
+        )
+        MealLog.objects.bulk_create(
+            MealLog(user=user, meal=rng.choice(meals)) for _ in range(opts["logs"])
+        )
+
+        tags = [Tag.objects.create(name=f"bench-{i}-{rng.random()}") for i in range(5)]
+        for recipe in recipes[: opts["posts"]]:
+            post = Post.objects.create(
+                user=user, recipe=recipe, title=recipe.name, body="Bench post"
+            )
+            post.tags.set(rng.sample(tags, 2))
+        return user
@@ -0,0 +1,249 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+
+from foods.conversions import BASIS_GRAMS
+from foods.models import (
+    FoodItem,
+    FoodUnitConversion,
+    Meal,
+    MealIngredient,
+    NutritionProfile,
+    Recipe,
+    RecipeIngredient,
+    ServingSize,
+)
+from foods.nutrient_matrix import NutrientMatrix, meal_totals, recipe_totals
+from foods.serializers import MealSerializer, RecipeSerializer
+from foods.services import rebuild_recipe_nutrition, refresh_ingredient_grams
+
+User = get_user_model()
+
+# Serializer totals are rounded to one decimal
+MACROS = {
+    "calories": "calories",
+    "protein_g": "protein",
+    "carbs_g": "carbohydrates",
+    "fats_g": "fats",
+}
+UNITS = ("g", "g", "ml", "cup", "tbsp", "piece", "serving")
+
+# No response or version caches between repeats
+NO_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark NutrientMatrix totals against RecipeSerializer / "
+        "MealSerializer and the per-instance ingredient loop, on synthetic "
+        "recipes and meals created in a rolled-back transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--meals", type=int, default=2000)
+        parser.add_argument("--foods", type=int, default=5000)
+        parser.add_argument("--ingredients", type=int, default=8)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        with transaction.atomic(), override_settings(CACHES=NO_CACHE):
+            recipe_ids, meal_ids = self._seed(random.Random(opts["seed"]), opts)
+            self.stdout.write(
+                f"Recipes={len(recipe_ids)} Meals={len(meal_ids)} "
+                f"Foods={opts['foods']} Ingredients/recipe={opts['ingredients']}"
+            )
+            self._recipes(recipe_ids, opts["repeat"])
+            self._meals(meal_ids, opts["repeat"])
+            transaction.set_rollback(True)
+
+    # ==============================
+    # RECIPES
+    # ==============================
+    def _recipes(self, recipe_ids, repeat):
+        def serializer():
+            recipes = (
+                Recipe.objects.filter(pk__in=recipe_ids)
+                .select_related("nutrition")
+                .prefetch_related(
+                    "instructions",
+                    "recipeingredient_set__food_item__nutrition",
+                    "recipeingredient_set__food_item__serving_size",
+                )
+            )
+            return {row["id"]: row for row in RecipeSerializer(recipes, many=True).data}
+
+        def instance_loop():
+            """What RecipeSerializer did per recipe before totals were stored."""
+            recipes = Recipe.objects.filter(pk__in=recipe_ids).prefetch_related(
+                "recipeingredient_set__food_item__nutrition"
+            )
+            totals = {}
+            for recipe in recipes:
+                recipe_total = totals[recipe.pk] = dict.fromkeys(MACROS.values(), 0.0)
+                for ingredient in recipe.recipeingredient_set.all():
+                    nutrition = getattr(ingredient.food_item, "nutrition", None)
+                    if nutrition is None:
+                        continue
+                    ratio = (ingredient.grams or 0.0) / BASIS_GRAMS
+                    for field in recipe_total:
+                        recipe_total[field] += getattr(nutrition, field) * ratio
+            return totals
+
+        timings = {
+            "RecipeSerializer (stored totals)": self._best_of(serializer, repeat),
+            "rebuild_recipe_nutrition (SQL)": self._best_of(
+                lambda: rebuild_recipe_nutrition(recipe_ids), repeat
+            ),
+            "Per-instance loop": self._best_of(instance_loop, repeat),
+        }
+        matrix_time = self._best_of(lambda: recipe_totals(recipe_ids), repeat)
+        error = self._max_error(serializer(), recipe_totals(recipe_ids))
+        self._report("Recipe totals", timings, matrix_time, error)
+
+    # ==============================
+    # MEALS
+    # ==============================
+    def _meals(self, meal_ids, repeat):
+        def serializer():
+            meals = Meal.objects.filter(pk__in=meal_ids).with_nutrition().with_details()
+            return {row["id"]: row for row in MealSerializer(meals, many=True).data}
+
+        def totals_only():
+            meals = Meal.objects.filter(pk__in=meal_ids).with_nutrition()
+            return list(meals.values_list("pk", "total_calories"))
+
+        timings = {
+            "MealSerializer (with_nutrition)": self._best_of(serializer, repeat),
+            "with_nutrition() totals only": self._best_of(totals_only, repeat),
+        }
+        matrix = NutrientMatrix.load()
+        matrix_time = self._best_of(lambda: meal_totals(meal_ids, matrix), repeat)
+        error = self._max_error(serializer(), meal_totals(meal_ids))
+        self._report("Meal totals", timings, matrix_time, error)
+
+    # ==============================
+    # HELPERS
+    # ==============================
+    def _max_error(self, serialized, totals):
+        """Largest difference beyond the serializer's rounding, per macro."""
+        worst = 0.0
+        for pk, row in serialized.items():
+            for key, field in MACROS.items():
+                expected = totals.get(pk, {}).get(field, 0.0)
+                diff = abs(row[key] - expected) - 0.05
+                worst = max(worst, diff / max(1.0, abs(expected)))
+        return worst
+
+    def _report(self, label, timings, matrix_time, error):
+        self.stdout.write(f"\n{label}")
+        for name, seconds in timings.items():
+            self.stdout.write(
+                f"  {name:<34} {seconds * 1000:9.1f} ms  "
+                + self.style.SUCCESS(f"x{seconds / matrix_time:.1f}")
+            )
+        self.stdout.write(f"  {'NutrientMatrix':<34} {matrix_time * 1000:9.1f} ms")
+        style = self.style.SUCCESS if error < 1e-4 else self.style.ERROR
+        self.stdout.write(style(f"  max rel. error vs serializer {error:.2e}"))
+
+    def _best_of(self, fn, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def _seed(self, rng, opts):
+        user = User.objects.create_user(
+            email=f"bench-{rng.random()}@example.com", password=None
+        )
+
+        foods = FoodItem.objects.bulk_create(
+            FoodItem(name=f"Bench food {i}", price=rng.randint(1, 500))
+            for i in range(opts["foods"])
+        )
+        NutritionProfile.objects.bulk_create(
+            NutritionProfile(
+                food_item=food,
+                calories=rng.uniform(0, 900),
+                protein=rng.uniform(0, 40),
+                carbohydrates=rng.uniform(0, 80),
+                fats=rng.uniform(0, 60),
+            )
+            for food in foods[: len(foods) * 9 // 10]  # some have no profile
+        )
+        # Every unit path of foods.conversions: servings, densities, pieces
+        ServingSize.objects.bulk_create(
+            ServingSize(
+                food=food,
+                description="1 cup",
+                quantity=1,
+                unit="cup",
+                metric_quantity=rng.choice([200.0, 240.0]),
+                metric_unit=rng.choice(["g", "ml"]),
+            )
+            for food in foods[::2]
+        )
+        FoodUnitConversion.objects.bulk_create(
+            FoodUnitConversion(food=food, unit=unit, grams=grams)
+            for food in foods[::3]
+            for unit, grams in (("ml", rng.uniform(0.5, 1.5)), ("piece", 60.0))
+        )
+
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                name=f"Bench recipe {i} {rng.random()}",
+                slug=f"bench-recipe-{i}-{rng.randrange(10**9)}",
+                user=user,
+            )
+            for i in range(opts["recipes"])
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe=recipe,
+                    food_item=rng.choice(foods),
+                    quantity=rng.uniform(0.5, 300),
+                    unit=rng.choice(UNITS),
+                )
+                for recipe in recipes
+                for _ in range(opts["ingredients"])
+            ),
+            batch_size=5000,
+        )
+
+        meals = Meal.objects.bulk_create(
+            Meal(user=user, name=f"Bench meal {i}", meal_type="lunch")
+            for i in range(opts["meals"])
+        )
+        Meal.recipes.through.objects.bulk_create(
+            Meal.recipes.through(meal_id=meal.pk, recipe_id=recipe.pk)
+            for meal in meals
+            for recipe in rng.sample(recipes, min(3, len(recipes)))
+        )
+        MealIngredient.objects.bulk_create(
+            MealIngredient(
+                meal=meal,
+                food_item=rng.choice(foods),
+                quantity=rng.uniform(0.5, 3),
+                unit=rng.choice(UNITS),
+            )
+            for meal in meals
+            for _ in range(2)
+        )
+
+        # bulk_create skips save(): convert to grams and store totals once
+        refresh_ingredient_grams([food.pk for food in foods])
+        recipe_ids = [recipe.pk for recipe in recipes]
+        rebuild_recipe_nutrition(recipe_ids)
+
+        # Autovacuum never sees uncommitted rows: plan with real row counts
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return recipe_ids, [meal.pk for meal in meals]
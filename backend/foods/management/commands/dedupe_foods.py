@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from foods.dedupe import MERGE_BATCH, NAME_THRESHOLD, find_clusters, merge_clusters
+from foods.models import FoodItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Find near-duplicate foods (similar names, matching macros) and merge "
+        "each group into one, repointing recipe and meal ingredients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=MERGE_BATCH)
+        parser.add_argument("--threshold", type=float, default=NAME_THRESHOLD)
+        parser.add_argument(
+            "--catalog-only",
+            action="store_true",
+            help="Leave users' private foods alone",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the groups that would be merged without changing anything",
+        )
+
+    def handle(self, *args, **opts):
+        queryset = FoodItem.objects.all()
+        if opts["catalog_only"]:
+            queryset = queryset.filter(user__isnull=True)
+
+        clusters = find_clusters(queryset, name_threshold=opts["threshold"])
+        duplicates = sum(len(cluster) - 1 for cluster in clusters)
+        self.stdout.write(f"Groups={len(clusters)} Duplicates={duplicates}")
+
+        if opts["dry_run"]:
+            for start in range(0, len(clusters), opts["batch"]):
+                batch = clusters[start : start + opts["batch"]]
+                names = dict(
+                    FoodItem.objects.filter(
+                        pk__in=[pk for cluster in batch for pk in cluster]
+                    ).values_list("pk", "name")
+                )
+                for cluster in batch:
+                    self.stdout.write(
+                        " | ".join(f"{pk}: {names.get(pk)}" for pk in cluster)
+                    )
+            return
+
+        stats = {"clusters": 0, "merged": 0, "ingredients": 0}
+        for start in range(0, len(clusters), opts["batch"]):
+            done = merge_clusters(clusters[start : start + opts["batch"]])
+            for key, value in done.items():
+                stats[key] += value
+            self.stdout.write(f"Merged={stats['merged']}/{duplicates}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Groups={stats['clusters']} Merged={stats['merged']} "
+                f"Ingredients repointed={stats['ingredients']}"
+            )
+        )
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from foods.export import (
+    CHUNK_SIZE,
+    FORMATS,
+    export_foods,
+    export_queryset,
+    parse_since,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the food catalog (with nutrition and serving sizes) as NDJSON "
+        "or CSV to a file or stdout, optionally only foods updated since a date"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="ndjson")
+        parser.add_argument("--since", help="ISO 8601 date or datetime")
+        parser.add_argument("--user", help="Also export this user's (email) foods")
+        parser.add_argument("--output", "-o", help="File to write, stdout if omitted")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **opts):
+        try:
+            since = parse_since(opts["since"])
+        except ValidationError as exc:
+            raise CommandError(exc.detail["since"])
+
+        user = None
+        if opts["user"]:
+            user = User.objects.filter(email=opts["user"]).first()
+            if user is None:
+                raise CommandError(f"No user with email {opts['user']}")
+
+        watermark = timezone.now()
+        blocks = export_foods(
+            export_queryset(user, since), opts["format"], opts["chunk_size"]
+        )
+        if opts["format"] == "ndjson":
+            blocks = (block.decode() for block in blocks)
+
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8", newline="") as out:
+                out.writelines(blocks)
+        else:
+            for block in blocks:
+                self.stdout.write(block, ending="")
+
+        # Progress on stderr: stdout may be the export itself
+        self.stderr.write(
+            self.style.SUCCESS(f"Done. Watermark={watermark.isoformat()}")
+        )
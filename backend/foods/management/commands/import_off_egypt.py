@@ -1,34 +1,96 @@
-from decimal import Decimal
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
-
-from foods.models import FoodItem, NutritionProfile, ServingSize
-
-
-import sys, csv
-
-csv.field_size_limit(sys.maxsize)
-
-
-def fnum(v):
-    try:
-        s = str(v).strip()
-        if not s or s.lower() in {"nan", "none"}:
-            return 0.0
-        return float(s)
-    except Exception:
-        return 0.0
+from django.db import connection, transaction
+
+from foods.autocomplete import bump_version as bump_autocomplete_version
+from foods.conversions import bump_version as bump_conversions_version
+from foods.models import (
+    FoodItem,
+    NutritionProfile,
+    OffImportCheckpoint,
+    RecipeIngredient,
+    ServingSize,
+)
+from foods.off_parser import (
+    CHUNK_SIZE,
+    NUTRIENT_COLUMNS,
+    RECORD_FIELDS,
+    iter_chunks,
+    open_dump,
+    parse_chunk,
+    read_header,
+)
+from foods.response_cache import bump_catalog_version
+from foods.services import (
+    invalidate_barcodes,
+    refresh_ingredient_grams,
+    schedule_recipe_nutrition_rebuild,
+)
+
+
+STAGING_TABLE = "off_import_staging"
+
+
+def _copy_value(value):
+    """Encode one value for COPY ... FROM STDIN (text format)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return (
+            value.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return repr(value)
 
 
 class Command(BaseCommand):
-    help = "Import OpenFoodFacts TSV (Egypt only) into FoodItem + NutritionProfile"
+    help = (
+        "Import an OpenFoodFacts TSV dump (plain or .gz, Egypt/MENA products "
+        "only) into FoodItem + NutritionProfile"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("--path", required=True)
         parser.add_argument("--limit", type=int, default=0, help="0 = no limit")
-        parser.add_argument("--batch", type=int, default=2000)
-        parser.add_argument("--create-serving", action="store_true")
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=20000,
+            help="Kept rows staged and merged per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Parser processes (1 = parse in this process).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Bytes of TSV handed to a parser process at a time.",
+        )
+        parser.add_argument(
+            "--create-serving",
+            action="store_true",
+            help="Add a per 100 g ServingSize and the one parsed from serving_size.",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Also update existing products whose imported content changed.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of an interrupted run and start at row 0.",
+        )
         parser.add_argument(
             "--require-nutrition",
             action="store_true",
@@ -36,210 +98,290 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **opts):
-        path = opts["path"]
+        path = os.path.abspath(opts["path"])
         limit = opts["limit"]
         batch = opts["batch"]
-        create_serving = opts["create_serving"]
-        require_nutrition = opts["require_nutrition"]
 
-        processed = 0
+        checkpoint = self._checkpoint(path, opts["restart"])
+        processed = checkpoint.processed
         kept = 0
+        buf = []
 
-        foods_buf = []
+        self._create_staging_table()
 
-        with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
-            reader = csv.DictReader(f, delimiter="\t")
-
-            for row in reader:
-                processed += 1
-                if limit and processed > limit:
-                    break
-
-                # --- Egypt filter ---
-                countries_tags = (row.get("countries_tags") or "").lower()
-                countries_en = (row.get("countries_en") or "").lower()
-
-                MENA_TAGS = {
-                    "en:egypt",
-                    "en:saudi-arabia",
-                    "en:united-arab-emirates",
-                    "en:kuwait",
-                    "en:qatar",
-                    "en:bahrain",
-                    "en:oman",
-                    "en:jordan",
-                    "en:lebanon",
-                    "en:morocco",
-                    "en:tunisia",
-                    "en:algeria",
-                }
-                if not (
-                    any(tag in countries_tags for tag in MENA_TAGS)
-                    or "egypt" in countries_en
-                ):
-                    continue
-
-                code = (row.get("code") or "").strip()
-                name = (
-                    row.get("product_name")
-                    or row.get("generic_name")
-                    or row.get("abbreviated_product_name")
-                    or ""
-                ).strip()
-
-                if not code or not name:
-                    continue
-
-                raw_kcal = (row.get("energy-kcal_100g") or "").strip()
-                raw_protein = (row.get("proteins_100g") or "").strip()
-                raw_carbs = (row.get("carbohydrates_100g") or "").strip()
-                raw_fat = (row.get("fat_100g") or "").strip()
-
-                if require_nutrition:
-                    if not (raw_kcal or raw_protein or raw_carbs or raw_fat):
-                        continue
-
-                kcal = fnum(raw_kcal)
-                protein = fnum(raw_protein)
-                carbs = fnum(raw_carbs)
-                fat = fnum(raw_fat)
-
-                food = FoodItem(
-                    off_code=code[:32],
-                    name=name[:255],
-                    price=Decimal("0.00"),
-                    price_quantity=100,
-                    price_unit="g",
+        with open_dump(path) as stream:
+            columns = read_header(stream)
+            if checkpoint.offset:
+                stream.seek(checkpoint.offset)
+                self.stdout.write(
+                    f"Resuming at byte {checkpoint.offset} (row {processed})"
                 )
 
-                # stash nutrient info for flush()
-                food._np = {
-                    "calories": kcal,
-                    "protein": protein,
-                    "carbohydrates": carbs,
-                    "fats": fat,
-                    "fiber": fnum(row.get("fiber_100g")),
-                    "sugar": fnum(row.get("sugars_100g")),
-                    "sodium": fnum(row.get("sodium_100g")),
-                    "iron": fnum(row.get("iron_100g")),
-                    "calcium": fnum(row.get("calcium_100g")),
-                    "potassium": fnum(row.get("potassium_100g")),
-                    "zinc": fnum(row.get("zinc_100g")),
-                    "magnesium": fnum(row.get("magnesium_100g")),
-                    "vitamin_a": fnum(row.get("vitamin-a_100g")),
-                    "vitamin_c": fnum(row.get("vitamin-c_100g")),
-                }
-
-                foods_buf.append(food)
-                kept += 1
-
-                if len(foods_buf) >= batch:
-                    self._flush(foods_buf, create_serving)
-                    foods_buf = []
+            chunks = iter_chunks(stream, opts["chunk_size"])
+            results = self._parse(
+                chunks, columns, opts["require_nutrition"], opts["workers"]
+            )
+            for end, (n_lines, records) in results:
+                if limit and processed + n_lines > limit:
+                    records = [r for r in records if r[0] < limit - processed]
+                    n_lines = limit - processed
+
+                processed += n_lines
+                kept += len(records)
+                buf.extend(record for _, record in records)
+
+                if len(buf) >= batch:
+                    checkpoint.offset, checkpoint.processed = end, processed
+                    self._flush(buf, opts, checkpoint)
+                    buf = []
                     self.stdout.write(f"Processed={processed} Kept(Egypt)={kept}")
 
-            if foods_buf:
-                self._flush(foods_buf, create_serving)
+                if limit and processed >= limit:
+                    break
+
+        if buf:
+            self._flush(buf, opts)
+        checkpoint.delete()
 
         self.stdout.write(
             self.style.SUCCESS(f"Done. Processed={processed} Kept={kept}")
         )
 
-    def _flush(self, foods, create_serving: bool):
+    def _checkpoint(self, path, restart):
+        """The checkpoint left by an interrupted run over this same file."""
+        stat = os.stat(path)
+        fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
 
-        if not foods:
+        checkpoint, _ = OffImportCheckpoint.objects.get_or_create(
+            path=path, defaults={"fingerprint": fingerprint}
+        )
+        if restart or checkpoint.fingerprint != fingerprint:
+            checkpoint.fingerprint = fingerprint
+            checkpoint.offset = checkpoint.processed = 0
+            checkpoint.save()
+        return checkpoint
+
+    def _parse(self, chunks, columns, require_nutrition, workers):
+        """
+        Yields (end byte offset, parse_chunk() result) in file order. At most
+        two chunks per worker are in flight, so memory stays flat on
+        multi-GB dumps.
+        """
+        tasks = (
+            (offset + len(block), (block, columns, require_nutrition))
+            for offset, block in chunks
+        )
+        if workers <= 1:
+            for end, task in tasks:
+                yield end, parse_chunk(task)
             return
 
-        # Deduplicate batch by off_code (OFF can repeat codes)
-        foods_by_code = {}
-        for f in foods:
-            code = getattr(f, "off_code", None)
-            if not code:
-                continue
-            if code not in foods_by_code:
-                foods_by_code[code] = f
-
-        uniq_foods = list(foods_by_code.values())
-        codes = list(foods_by_code.keys())
-
-        with transaction.atomic():
-            # 1) Insert FoodItems (skip if off_code already exists)
-            FoodItem.objects.bulk_create(
-                uniq_foods,
-                ignore_conflicts=True,
-                batch_size=2000,
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for end, task in tasks:
+                pending.append((end, pool.submit(parse_chunk, task)))
+                if len(pending) >= workers * 2:
+                    end, future = pending.popleft()
+                    yield end, future.result()
+            while pending:
+                end, future = pending.popleft()
+                yield end, future.result()
+
+    # ==============================
+    # DATABASE
+    # ==============================
+    def _create_staging_table(self):
+        nutrient_columns = ", ".join(
+            f"{field} double precision" for field in NUTRIENT_COLUMNS
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            cursor.execute(
+                f"""
+                CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                    seq bigserial,
+                    off_code varchar(32) NOT NULL,
+                    name varchar(255) NOT NULL,
+                    search_key varchar(255) NOT NULL,
+                    off_hash varchar(32) NOT NULL,
+                    {nutrient_columns},
+                    serving_description varchar(255),
+                    serving_quantity double precision,
+                    serving_unit varchar(50),
+                    serving_metric_quantity double precision,
+                    serving_metric_unit varchar(2)
+                )
+                """
             )
 
-            # 2) Fetch saved FoodItems for these codes
-            saved_qs = FoodItem.objects.filter(off_code__in=codes).only(
-                "id", "off_code"
-            )
-            saved_by_code = {fi.off_code: fi for fi in saved_qs}
+    def _copy(self, cursor, records):
+        data = io.StringIO()
+        for record in records:
+            data.write("\t".join(_copy_value(v) for v in record))
+            data.write("\n")
+        data.seek(0)
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(RECORD_FIELDS)}) FROM STDIN", data
+        )
+
+    def _flush(self, records, opts, checkpoint=None):
+        """
+        COPY the batch into the staging table and merge it with set-based SQL:
+        new off_codes become FoodItems (first occurrence wins) and foods
+        without a NutritionProfile / ServingSize get one. Existing products
+        are left alone unless --delta is set, in which case those whose
+        off_hash changed get their name and nutrition upserted.
+
+        The checkpoint is saved in the same transaction as the merge.
+        """
+        food = FoodItem._meta.db_table
+        nutrition = NutritionProfile._meta.db_table
+        nutrients = ", ".join(NUTRIENT_COLUMNS)
+        staged_nutrients = ", ".join(f"s.{field}" for field in NUTRIENT_COLUMNS)
+        staged = (
+            f"(SELECT DISTINCT ON (off_code) * FROM {STAGING_TABLE} "
+            f"ORDER BY off_code, seq) AS s"
+        )
 
-            # 3) Which already have NutritionProfile
-            existing_np_food_ids = set(
-                NutritionProfile.objects.filter(food_item__in=saved_qs).values_list(
-                    "food_item_id", flat=True
+        if opts["delta"]:
+            on_food_conflict = """
+                DO UPDATE SET name = EXCLUDED.name,
+                              search_key = EXCLUDED.search_key,
+                              off_hash = EXCLUDED.off_hash,
+                              updated_at = EXCLUDED.updated_at
+                WHERE f.off_hash IS DISTINCT FROM EXCLUDED.off_hash
+            """
+        else:
+            on_food_conflict = "DO NOTHING"
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+            self._copy(cursor, records)
+
+            # 1) Inserted (and, with --delta, changed) FoodItems together with
+            #    their NutritionProfile. xmax = 0 only for freshly inserted rows.
+            cursor.execute(
+                f"""
+                WITH changed AS (
+                    INSERT INTO {food} AS f
+                        (off_code, name, search_key, off_hash, price,
+                         price_quantity, price_unit, created_at, updated_at)
+                    SELECT s.off_code, s.name, s.search_key, s.off_hash, 0, 100,
+                           %s, now(), now()
+                    FROM {staged}
+                    ON CONFLICT (off_code) {on_food_conflict}
+                    RETURNING f.id, f.off_code, (f.xmax = 0) AS inserted
+                ), profiles AS (
+                    INSERT INTO {nutrition}
+                        (food_item_id, nutrition_basis, protein_type, {nutrients})
+                    SELECT c.id, 'per_100g', 'other', {staged_nutrients}
+                    FROM changed c
+                    JOIN {staged} ON s.off_code = c.off_code
+                    ON CONFLICT (food_item_id) DO UPDATE SET
+                        {", ".join(f"{n} = EXCLUDED.{n}" for n in NUTRIENT_COLUMNS)}
                 )
+                SELECT id, off_code FROM changed WHERE NOT inserted
+                """,
+                [FoodItem.PriceUnit.G],
             )
+            updated = cursor.fetchall()
+
+            # 2) NutritionProfiles for existing foods that have none yet
+            cursor.execute(
+                f"""
+                INSERT INTO {nutrition}
+                    (food_item_id, nutrition_basis, protein_type, {nutrients})
+                SELECT f.id, 'per_100g', 'other', {staged_nutrients}
+                FROM {staged}
+                JOIN {food} f ON f.off_code = s.off_code
+                ON CONFLICT (food_item_id) DO NOTHING
+                RETURNING food_item_id
+                """
+            )
+            touched = {row[0] for row in cursor.fetchall()}
 
-            # 4) Which already have any ServingSize (if enabled)
-            existing_serving_food_ids = set()
-            if create_serving:
-                existing_serving_food_ids = set(
-                    ServingSize.objects.filter(food__in=saved_qs).values_list(
-                        "food_id", flat=True
-                    )
+            # 3) ServingSizes for foods that have none (if enabled)
+            if opts["create_serving"]:
+                touched.update(
+                    self._merge_servings(cursor, staged, [i for i, _ in updated])
                 )
 
-            nps_to_create = []
-            servings_to_create = []
-
-            # Avoid duplicates inside THIS flush
-            np_added_food_ids = set(existing_np_food_ids)
-            serving_added_food_ids = set(existing_serving_food_ids)
-
-            for code, f in foods_by_code.items():
-                fi = saved_by_code.get(code)
-                if not fi:
-                    continue
-
-                if fi.id not in np_added_food_ids:
-                    npd = getattr(f, "_np", {}) or {}
-                    nps_to_create.append(
-                        NutritionProfile(
-                            food_item=fi,
-                            calories=npd.get("calories", 0),
-                            protein=npd.get("protein", 0),
-                            carbohydrates=npd.get("carbohydrates", 0),
-                            fats=npd.get("fats", 0),
-                            fiber=npd.get("fiber", 0),
-                            sugar=npd.get("sugar", 0),
-                            sodium=npd.get("sodium", 0),
-                            iron=npd.get("iron", 0),
-                            calcium=npd.get("calcium", 0),
-                            potassium=npd.get("potassium", 0),
-                            zinc=npd.get("zinc", 0),
-                            magnesium=npd.get("magnesium", 0),
-                            vitamin_a=npd.get("vitamin_a", 0),
-                            vitamin_c=npd.get("vitamin_c", 0),
-                        )
-                    )
-                    np_added_food_ids.add(fi.id)
-
-                if create_serving and fi.id not in serving_added_food_ids:
-                    servings_to_create.append(
-                        ServingSize(
-                            food=fi,
-                            description="Per 100 g",
-                            quantity=100,
-                            unit="g",
-                        )
-                    )
-                    serving_added_food_ids.add(fi.id)
-
-            if nps_to_create:
-                NutritionProfile.objects.bulk_create(nps_to_create, batch_size=2000)
-
-            if create_serving and servings_to_create:
-                ServingSize.objects.bulk_create(servings_to_create, batch_size=2000)
+            # Existing foods that just got a profile or servings changed shape
+            if touched:
+                FoodItem.objects.filter(pk__in=touched).touch()
+
+            # Raw SQL skips the signals, so do their work here. New rows are
+            # priced 0 (value NULL); only existing foods whose protein just
+            # changed or appeared can have a value to refresh.
+            refreshed = touched.union(food_id for food_id, _ in updated)
+            if refreshed:
+                FoodItem.objects.filter(pk__in=refreshed).refresh_price_per_gram_protein()
+            bump_catalog_version()
+            if updated:
+                self._changed(updated)
+
+            if checkpoint is not None:
+                checkpoint.save()
+
+    def _merge_servings(self, cursor, staged, updated_ids):
+        """
+        The "Per 100 g" basis row first (nutrition is per 100 g and the
+        first serving is the divisor of the ratio rule), then the serving
+        parsed from the dump unless it is the same 100 g.
+        Servings of products updated by --delta are rebuilt.
+        Returns the ids of the foods that got servings.
+        """
+        food = FoodItem._meta.db_table
+        serving = ServingSize._meta.db_table
+
+        if updated_ids:
+            cursor.execute(
+                f"DELETE FROM {serving} WHERE food_id = ANY(%s)", [updated_ids]
+            )
+
+        cursor.execute(
+            f"""
+            INSERT INTO {serving}
+                (food_id, description, quantity, unit, metric_quantity, metric_unit)
+            SELECT f.id, 'Per 100 g', 100, 'g', 100, 'g'
+            FROM {staged}
+            JOIN {food} f ON f.off_code = s.off_code
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {serving} ss WHERE ss.food_id = f.id
+            )
+            RETURNING food_id
+            """
+        )
+        new_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(
+            f"""
+            INSERT INTO {serving}
+                (food_id, description, quantity, unit, metric_quantity, metric_unit)
+            SELECT f.id, s.serving_description, s.serving_quantity,
+                   s.serving_unit, s.serving_metric_quantity,
+                   coalesce(s.serving_metric_unit, '')
+            FROM {staged}
+            JOIN {food} f ON f.off_code = s.off_code
+            WHERE f.id = ANY(%s)
+              AND s.serving_description IS NOT NULL
+              AND (s.serving_metric_unit, s.serving_metric_quantity)
+                  IS DISTINCT FROM ('g', 100::double precision)
+            """,
+            [new_ids],
+        )
+        return new_ids
+
+    def _changed(self, updated):
+        """Invalidate what depends on catalog foods updated by --delta."""
+        food_ids = [food_id for food_id, _ in updated]
+        # Their servings may have been rebuilt
+        transaction.on_commit(bump_conversions_version)
+        refresh_ingredient_grams(food_ids)
+        schedule_recipe_nutrition_rebuild(
+            RecipeIngredient.objects.filter(food_item_id__in=food_ids)
+            .values_list("recipe_id", flat=True)
+            .distinct()
+        )
+        invalidate_barcodes([code for _, code in updated])
+        transaction.on_commit(bump_autocomplete_version)
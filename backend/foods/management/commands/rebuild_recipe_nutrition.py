@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from foods.models import Recipe
+from foods.services import rebuild_recipe_nutrition
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored RecipeNutrition totals for every recipe"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        batch = opts["batch"]
+
+        recipe_ids = list(Recipe.objects.order_by("pk").values_list("pk", flat=True))
+        rebuilt = 0
+
+        for start in range(0, len(recipe_ids), batch):
+            rebuilt += rebuild_recipe_nutrition(recipe_ids[start : start + batch])
+            self.stdout.write(f"Rebuilt={rebuilt}/{len(recipe_ids)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Rebuilt={rebuilt}"))
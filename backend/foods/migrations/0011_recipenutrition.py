@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0010_alter_meal_name_alter_meal_slug_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='foods.recipe')),
+                ('calories', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('carbohydrates', models.FloatField(default=0)),
+                ('fats', models.FloatField(default=0)),
+                ('fiber', models.FloatField(default=0)),
+                ('sugar', models.FloatField(default=0)),
+                ('sodium', models.FloatField(default=0)),
+                ('iron', models.FloatField(default=0)),
+                ('calcium', models.FloatField(default=0)),
+                ('potassium', models.FloatField(default=0)),
+                ('zinc', models.FloatField(default=0)),
+                ('magnesium', models.FloatField(default=0)),
+                ('vitamin_a', models.FloatField(default=0)),
+                ('vitamin_c', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
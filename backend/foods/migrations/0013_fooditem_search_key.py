@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+from foods.normalization import build_search_key
+
+
+def backfill_search_keys(apps, schema_editor):
+    FoodItem = apps.get_model("foods", "FoodItem")
+
+    batch = []
+    for food in FoodItem.objects.only("id", "name").iterator(chunk_size=2000):
+        food.search_key = build_search_key(food.name)
+        batch.append(food)
+        if len(batch) >= 2000:
+            FoodItem.objects.bulk_update(batch, ["search_key"])
+            batch = []
+    if batch:
+        FoodItem.objects.bulk_update(batch, ["search_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0012_fooditem_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='search_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Script-independent tokens of name, see foods.normalization', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('search_key', config='simple'), name='food_search_key_search'),
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:36
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+
+
+def backfill_price_per_gram_protein(apps, schema_editor):
+    # Frozen copy of foods.models.price_per_gram_protein_expression()
+    FoodItem = apps.get_model("foods", "FoodItem")
+    NutritionProfile = apps.get_model("foods", "NutritionProfile")
+    protein = models.Subquery(
+        NutritionProfile.objects.filter(food_item=models.OuterRef("pk")).values(
+            "protein"
+        )[:1],
+        output_field=models.FloatField(),
+    )
+    FoodItem.objects.update(
+        price_per_gram_protein=models.Case(
+            models.When(
+                models.Q(price__gt=0, price_quantity__gt=0, price_unit__in=["g", "ml"])
+                & models.Q(GreaterThan(protein, 0)),
+                then=Cast("price", models.FloatField())
+                / (protein * models.F("price_quantity") / 100.0),
+            ),
+            default=None,
+            output_field=models.FloatField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0013_fooditem_search_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='price_per_gram_protein',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(condition=models.Q(('price_per_gram_protein__isnull', False)), fields=['price_per_gram_protein', 'id'], name='food_protein_value'),
+        ),
+        migrations.RunPython(backfill_price_per_gram_protein, migrations.RunPython.noop),
+    ]
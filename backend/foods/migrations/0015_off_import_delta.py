@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0014_fooditem_price_per_gram_protein'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OffImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('fingerprint', models.CharField(help_text='Size and mtime of the dump when it was started', max_length=100)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('processed', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='off_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the imported OpenFoodFacts row, see foods.off_parser', max_length=32, null=True),
+        ),
+    ]
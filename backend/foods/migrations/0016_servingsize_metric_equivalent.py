@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:50
+
+from django.db import migrations, models
+
+from foods.servings import METRIC_UNITS
+
+
+def backfill_metric_equivalents(apps, schema_editor):
+    ServingSize = apps.get_model("foods", "ServingSize")
+    for unit, (base, factor) in METRIC_UNITS.items():
+        ServingSize.objects.filter(unit__iexact=unit, quantity__gt=0).update(
+            metric_quantity=models.F("quantity") * factor, metric_unit=base
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0015_off_import_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servingsize',
+            name='metric_quantity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servingsize',
+            name='metric_unit',
+            field=models.CharField(blank=True, default='', max_length=2),
+        ),
+        migrations.RunPython(backfill_metric_equivalents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,176 @@
+# Generated by Django 5.2.9 on 2026-10-18 01:54
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Coalesce
+
+
+# Frozen copy of foods.conversions / foods.servings as of this migration:
+# later changes to the live modules must not change what it computes.
+BASIS_GRAMS = 100.0
+DEFAULT_DENSITY = 1.0
+HOUSEHOLD_VOLUMES = {"cup": 240.0, "tbsp": 15.0, "tsp": 5.0}
+METRIC_UNITS = {
+    "g": ("g", 1.0), "gr": ("g", 1.0), "grs": ("g", 1.0), "gram": ("g", 1.0),
+    "grams": ("g", 1.0), "gramm": ("g", 1.0), "kg": ("g", 1000.0),
+    "mg": ("g", 0.001), "oz": ("g", 28.3495), "lb": ("g", 453.592),
+    "ml": ("ml", 1.0), "cl": ("ml", 10.0), "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0), "liter": ("ml", 1000.0), "litre": ("ml", 1000.0),
+    "fl oz": ("ml", 29.5735), "جم": ("g", 1.0), "جرام": ("g", 1.0),
+    "غ": ("g", 1.0), "غرام": ("g", 1.0), "مل": ("ml", 1.0),
+}
+UNIT_ALIASES = {
+    "cup": "cup", "كوب": "cup", "tbsp": "tbsp", "tbs": "tbsp",
+    "tablespoon": "tbsp", "ملعقة كبيرة": "tbsp", "tsp": "tsp",
+    "teaspoon": "tsp", "ملعقة صغيرة": "tsp", "piece": "piece", "pc": "piece",
+    "pcs": "piece", "unit": "piece", "whole": "piece", "حبة": "piece",
+    "قطعة": "piece", "serving": "serving", "portion": "serving",
+    "حصة": "serving",
+}
+NUTRIENT_FIELDS = (
+    "calories", "protein", "carbohydrates", "fats", "fiber", "sugar",
+    "sodium", "iron", "calcium", "potassium", "zinc", "magnesium",
+    "vitamin_a", "vitamin_c",
+)
+
+
+def normalize_unit(unit):
+    text = re.sub(r"\s+", " ", (unit or "").strip().lower()).rstrip(".")
+    singular = text[:-1] if len(text) > 2 and text.endswith("s") else text
+    for candidate in (text, singular):
+        if candidate in METRIC_UNITS:
+            base, factor = METRIC_UNITS[candidate]
+            return base if factor == 1.0 else candidate
+        if candidate in UNIT_ALIASES:
+            return UNIT_ALIASES[candidate]
+    return singular
+
+
+def compile_units(apps, food_ids):
+    """{ food_id: { unit: grams in one unit } } from the historical models."""
+    ServingSize = apps.get_model("foods", "ServingSize")
+    FoodUnitConversion = apps.get_model("foods", "FoodUnitConversion")
+    units = {food_id: {} for food_id in food_ids}
+
+    servings = (
+        ServingSize.objects.filter(food_id__in=food_ids, quantity__gt=0)
+        .exclude(metric_quantity__isnull=True)
+        .order_by("food_id", "pk")
+        .values_list("food_id", "quantity", "unit", "metric_quantity", "metric_unit")
+    )
+    for food_id, quantity, unit, metric, metric_unit in servings:
+        food = units[food_id]
+        food.setdefault("serving", (metric, metric_unit))
+        food.setdefault(normalize_unit(unit), (metric / quantity, metric_unit))
+    conversions = FoodUnitConversion.objects.filter(food_id__in=food_ids)
+    for food_id, unit, grams in conversions.values_list("food_id", "unit", "grams"):
+        units[food_id][normalize_unit(unit)] = (grams, "g")
+
+    compiled = {}
+    for food_id, food in units.items():
+        density = food["ml"][0] if food.get("ml", (0, ""))[1] == "g" else None
+        density = density or DEFAULT_DENSITY
+        compiled[food_id] = {
+            unit: amount * density if base == "ml" else amount
+            for unit, (amount, base) in food.items()
+        }
+        compiled[food_id].setdefault("ml", density)
+    return compiled
+
+
+def unit_grams(units, unit):
+    unit = normalize_unit(unit)
+    density = units.get("ml", DEFAULT_DENSITY)
+    if unit in METRIC_UNITS:
+        base, factor = METRIC_UNITS[unit]
+        return factor * density if base == "ml" else factor
+    if unit in units:
+        return units[unit]
+    if unit in HOUSEHOLD_VOLUMES:
+        return HOUSEHOLD_VOLUMES[unit] * density
+    return BASIS_GRAMS
+
+
+def backfill_ingredient_grams(apps, schema_editor):
+    for model_name in ("RecipeIngredient", "MealIngredient"):
+        model = apps.get_model("foods", model_name)
+        rows = list(model.objects.only("id", "food_item_id", "quantity", "unit"))
+        units = compile_units(apps, {row.food_item_id for row in rows})
+        for row in rows:
+            row.grams = (row.quantity or 0.0) * unit_grams(
+                units.get(row.food_item_id, {}), row.unit
+            )
+        model.objects.bulk_update(rows, ["grams"], batch_size=2000)
+
+
+def rebuild_recipe_nutrition(apps, schema_editor):
+    """Stored totals were computed with the serving ratio; redo them in grams."""
+    Recipe = apps.get_model("foods", "Recipe")
+    RecipeIngredient = apps.get_model("foods", "RecipeIngredient")
+    RecipeNutrition = apps.get_model("foods", "RecipeNutrition")
+
+    rows = (
+        RecipeIngredient.objects.filter(food_item__nutrition__isnull=False)
+        .values("recipe_id")
+        .annotate(
+            **{
+                field: Coalesce(
+                    Sum(
+                        F(f"food_item__nutrition__{field}") * F("grams") / BASIS_GRAMS
+                    ),
+                    0.0,
+                    output_field=FloatField(),
+                )
+                for field in NUTRIENT_FIELDS
+            }
+        )
+    )
+    totals = {row.pop("recipe_id"): row for row in rows}
+    empty = dict.fromkeys(NUTRIENT_FIELDS, 0.0)
+    RecipeNutrition.objects.bulk_create(
+        [
+            RecipeNutrition(recipe_id=recipe_id, **totals.get(recipe_id, empty))
+            for recipe_id in Recipe.objects.values_list("pk", flat=True)
+        ],
+        update_conflicts=True,
+        unique_fields=["recipe"],
+        update_fields=[*NUTRIENT_FIELDS, "updated_at"],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0016_servingsize_metric_equivalent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mealingredient',
+            name='grams',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='grams',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='FoodUnitConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=50)),
+                ('grams', models.FloatField(help_text='Grams in one unit')),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unit_conversions', to='foods.fooditem')),
+            ],
+            options={
+                'unique_together': {('food', 'unit')},
+            },
+        ),
+        migrations.RunPython(backfill_ingredient_grams, migrations.RunPython.noop),
+        migrations.RunPython(rebuild_recipe_nutrition, migrations.RunPython.noop),
+    ]
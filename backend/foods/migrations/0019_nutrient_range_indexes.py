@@ -0,0 +1,125 @@
+# Generated by Django 5.2.9 on 2026-10-18 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0018_row_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['calories'], name='nutrition_calories'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['protein'], name='nutrition_protein'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['carbohydrates'], name='nutrition_carbohydrates'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['fats'], name='nutrition_fats'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['fiber'], name='nutrition_fiber'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['sugar'], name='nutrition_sugar'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['sodium'], name='nutrition_sodium'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['iron'], name='nutrition_iron'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['calcium'], name='nutrition_calcium'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['potassium'], name='nutrition_potassium'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['zinc'], name='nutrition_zinc'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['magnesium'], name='nutrition_magnesium'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['vitamin_a'], name='nutrition_vitamin_a'),
+        ),
+        migrations.AddIndex(
+            model_name='nutritionprofile',
+            index=models.Index(fields=['vitamin_c'], name='nutrition_vitamin_c'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['calories'], name='recipe_nutrition_calories'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['protein'], name='recipe_nutrition_protein'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['carbohydrates'], name='recipe_nutrition_carbohydrates'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['fats'], name='recipe_nutrition_fats'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['fiber'], name='recipe_nutrition_fiber'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['sugar'], name='recipe_nutrition_sugar'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['sodium'], name='recipe_nutrition_sodium'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['iron'], name='recipe_nutrition_iron'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['calcium'], name='recipe_nutrition_calcium'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['potassium'], name='recipe_nutrition_potassium'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['zinc'], name='recipe_nutrition_zinc'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['magnesium'], name='recipe_nutrition_magnesium'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['vitamin_a'], name='recipe_nutrition_vitamin_a'),
+        ),
+        migrations.AddIndex(
+            model_name='recipenutrition',
+            index=models.Index(fields=['vitamin_c'], name='recipe_nutrition_vitamin_c'),
+        ),
+    ]
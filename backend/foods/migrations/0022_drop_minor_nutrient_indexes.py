@@ -0,0 +1,93 @@
+# Generated by Django 5.2.9 on 2026-10-18 04:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0021_sync_change_tracking'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_fiber',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_sugar',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_sodium',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_iron',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_calcium',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_potassium',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_zinc',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_magnesium',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_vitamin_a',
+        ),
+        migrations.RemoveIndex(
+            model_name='nutritionprofile',
+            name='nutrition_vitamin_c',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_fiber',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_sugar',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_sodium',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_iron',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_calcium',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_potassium',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_zinc',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_magnesium',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_vitamin_a',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipenutrition',
+            name='recipe_nutrition_vitamin_c',
+        ),
+    ]
@@ -1,12 +1,79 @@
 from django.db import models
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from decimal import Decimal
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .normalization import build_search_key
+from .servings import metric_equivalent
+
 
 User = get_user_model()
 
 
+# Nutrient columns shared by NutritionProfile and the stored recipe totals
+NUTRIENT_FIELDS = (
+    "calories",
+    "protein",
+    "carbohydrates",
+    "fats",
+    "fiber",
+    "sugar",
+    "sodium",
+    "iron",
+    "calcium",
+    "potassium",
+    "zinc",
+    "magnesium",
+    "vitamin_a",
+    "vitamin_c",
+)
+# The nutrients range filters are mostly on; each gets a B-tree. Ranges on
+# the rest are applied to the rows those indexes (or a scan) return.
+INDEXED_NUTRIENT_FIELDS = ("calories", "protein", "carbohydrates", "fats")
+
+
+def price_per_gram_protein_expression():
+    """
+    SQL for price / grams of protein in the priced quantity. NULL unless the
+    food has a positive price, a gram/ml price quantity and protein.
+    """
+    protein = models.Subquery(
+        NutritionProfile.objects.filter(food_item=models.OuterRef("pk")).values(
+            "protein"
+        )[:1],
+        output_field=models.FloatField(),
+    )
+    return models.Case(
+        models.When(
+            models.Q(
+                price__gt=0,
+                price_quantity__gt=0,
+                price_unit__in=[FoodItem.PriceUnit.G, FoodItem.PriceUnit.ML],
+            )
+            & models.Q(GreaterThan(protein, 0)),
+            then=Cast("price", models.FloatField())
+            / (protein * models.F("price_quantity") / 100.0),
+        ),
+        default=None,
+        output_field=models.FloatField(),
+    )
+
+
+class FoodItemQuerySet(models.QuerySet):
+    def refresh_price_per_gram_protein(self):
+        """Recompute the stored price_per_gram_protein in one UPDATE."""
+        return self.update(price_per_gram_protein=price_per_gram_protein_expression())
+
+    def touch(self):
+        """Bump updated_at after a change to data nested in the food's payload."""
+        return self.update(updated_at=timezone.now())
+
+
 class FoodItem(models.Model):
     class PriceUnit(models.TextChoices):
         G = "g", "Gram"
@@ -20,7 +87,21 @@ class FoodItem(models.Model):
     off_code = models.CharField(
         max_length=32, unique=True, db_index=True, null=True, blank=True
     )
+    off_hash = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Hash of the imported OpenFoodFacts row, see foods.off_parser",
+    )
     name = models.CharField(max_length=255, db_index=True)
+    search_key = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        editable=False,
+        help_text="Script-independent tokens of name, see foods.normalization",
+    )
     price = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal("0.00"))
 
     price_quantity = models.FloatField(default=100)
@@ -28,38 +109,44 @@ class FoodItem(models.Model):
         max_length=10, choices=PriceUnit.choices, default=PriceUnit.G
     )
 
+    # Maintained in SQL by FoodItemQuerySet.refresh_price_per_gram_protein()
+    price_per_gram_protein = models.FloatField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped when the nutrition profile or serving sizes change
+    updated_at = models.DateTimeField(auto_now=True)
 
-    def price_per_gram_protein(self):
-
-        nut = getattr(self, "nutrition", None)
-        if not nut or not nut.protein or nut.protein <= 0:
-            return None
-
-        price_amount = Decimal(str(self.price or 0))
-        if price_amount <= 0:
-            return None
-        qty = Decimal(str(self.price_quantity or 0))
-        if qty <= 0:
-            return None
-
-        if self.price_unit == self.PriceUnit.G:
-            grams = qty
-        elif self.price_unit == self.PriceUnit.ML:
-            grams = qty
-        else:
-            return None
-        protein_100g = Decimal(str(nut.protein))
-        protein_in_priced_qty = (protein_100g * grams) / Decimal("100")
-        if protein_in_priced_qty <= 0:
-            return None
-        return price_amount / protein_in_priced_qty
+    objects = FoodItemQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_key = build_search_key(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "search_key"}
+        super().save(*args, **kwargs)
+
     class Meta:
         unique_together = ["user", "price"]
+        indexes = [
+            GinIndex(
+                fields=["name"], name="food_name_trgm", opclasses=["gin_trgm_ops"]
+            ),
+            GinIndex(SearchVector("name", config="simple"), name="food_name_search"),
+            GinIndex(
+                SearchVector("search_key", config="simple"),
+                name="food_search_key_search",
+            ),
+            models.Index(
+                fields=["price_per_gram_protein", "id"],
+                name="food_protein_value",
+                condition=models.Q(price_per_gram_protein__isnull=False),
+            ),
+            # Incremental exports (?since=)
+            models.Index(fields=["updated_at"], name="food_updated_at"),
+        ]
 
 
 class ServingSize(models.Model):
@@ -74,9 +161,39 @@ class ServingSize(models.Model):
     quantity = models.FloatField(help_text="Serving quantity")
     unit = models.CharField(max_length=50)
 
+    # Gram / ml equivalent of the whole serving, see foods.servings
+    metric_quantity = models.FloatField(null=True, blank=True)
+    metric_unit = models.CharField(max_length=2, blank=True, default="")
+
     def __str__(self):
         return f"{self.quantity} {self.unit} of {self.food.name} ({self.description})"
 
+    def save(self, *args, **kwargs):
+        if self.metric_quantity is None:
+            self.metric_quantity, self.metric_unit = metric_equivalent(
+                self.quantity, self.unit
+            )
+        super().save(*args, **kwargs)
+
+
+class FoodUnitConversion(models.Model):
+    """
+    Grams in one unit of a food: its density (unit "ml"), the weight of a
+    piece, or any other household unit. See foods.conversions.
+    """
+
+    food = models.ForeignKey(
+        FoodItem, on_delete=models.CASCADE, related_name="unit_conversions"
+    )
+    unit = models.CharField(max_length=50)
+    grams = models.FloatField(help_text="Grams in one unit")
+
+    class Meta:
+        unique_together = ("food", "unit")
+
+    def __str__(self):
+        return f"1 {self.unit} of {self.food.name} = {self.grams} g"
+
 
 class NutritionProfile(models.Model):
     """
@@ -120,6 +237,14 @@ class NutritionProfile(models.Model):
     def __str__(self):
         return f"Nutrition Profile for {self.food_item.name}"
 
+    class Meta:
+        # B-trees for foods.filters.NutrientRangeFilter: ranges on several
+        # macros are combined with a BitmapAnd
+        indexes = [
+            models.Index(fields=[field], name=f"nutrition_{field}")
+            for field in INDEXED_NUTRIENT_FIELDS
+        ]
+
 
 class Recipe(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -133,6 +258,14 @@ class Recipe(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped when the ingredients or instructions change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Delta syncs, see sync.services
+            models.Index(fields=["user", "updated_at"], name="recipe_user_updated"),
+        ]
 
     def __str__(self):
         return self.name
@@ -170,10 +303,84 @@ class RecipeIngredient(models.Model):
     food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE)
     quantity = models.FloatField()
     unit = models.CharField(max_length=50)
+    # quantity + unit converted by foods.conversions.to_grams()
+    grams = models.FloatField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.quantity} {self.unit} of {self.food_item.name} in {self.recipe.name}"
 
+    def save(self, *args, **kwargs):
+        from .conversions import to_grams
+
+        (self.grams,) = to_grams([(self.food_item_id, self.quantity, self.unit)])
+        super().save(*args, **kwargs)
+
+
+class RecipeNutrition(models.Model):
+    """
+    Stored nutrition totals for a recipe, rebuilt whenever its ingredients,
+    their serving sizes or their nutrition profiles change
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name="nutrition", primary_key=True
+    )
+
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbohydrates = models.FloatField(default=0)
+    fats = models.FloatField(default=0)
+
+    fiber = models.FloatField(default=0)
+    sugar = models.FloatField(default=0)
+    sodium = models.FloatField(default=0)
+    iron = models.FloatField(default=0)
+    calcium = models.FloatField(default=0)
+    potassium = models.FloatField(default=0)
+    zinc = models.FloatField(default=0)
+    magnesium = models.FloatField(default=0)
+    vitamin_a = models.FloatField(default=0)
+    vitamin_c = models.FloatField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Nutrition totals for {self.recipe.name}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=[field], name=f"recipe_nutrition_{field}")
+            for field in INDEXED_NUTRIENT_FIELDS
+        ]
+
+
+class MealQuerySet(models.QuerySet):
+    def with_nutrition(self, fields=NUTRIENT_FIELDS):
+        """
+        Annotate total_<nutrient> (direct ingredients + stored recipe totals)
+        onto every meal in the same SQL statement.
+        """
+        from .services import meal_nutrition_annotations
+
+        return self.annotate(**meal_nutrition_annotations(fields))
+
+    def with_details(self):
+        """Prefetch everything MealSerializer renders."""
+        return self.prefetch_related(
+            "mealingredient_set__food_item__nutrition",
+            "mealingredient_set__food_item__serving_size",
+            models.Prefetch(
+                "recipes",
+                queryset=Recipe.objects.select_related("nutrition")
+                .prefetch_related(
+                    "instructions",
+                    "recipeingredient_set__food_item__nutrition",
+                    "recipeingredient_set__food_item__serving_size",
+                )
+                .order_by("pk"),
+            ),
+        )
+
 
 class Meal(models.Model):
 
@@ -194,10 +401,17 @@ class Meal(models.Model):
     recipes = models.ManyToManyField(Recipe, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped when the ingredients or recipes change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MealQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
         unique_together = ("user", "name", "meal_type")
+        indexes = [
+            models.Index(fields=["user", "updated_at"], name="meal_user_updated"),
+        ]
 
     def __str__(self):
         return f"{self.meal_type.title()} meal for {self.user}"
@@ -213,6 +427,32 @@ class MealIngredient(models.Model):
     food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE)
     quantity = models.FloatField()
     unit = models.CharField(max_length=50)
+    # quantity + unit converted by foods.conversions.to_grams()
+    grams = models.FloatField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.quantity} {self.unit} of {self.food_item.name}"
+
+    def save(self, *args, **kwargs):
+        from .conversions import to_grams
+
+        (self.grams,) = to_grams([(self.food_item_id, self.quantity, self.unit)])
+        super().save(*args, **kwargs)
+
+
+class OffImportCheckpoint(models.Model):
+    """
+    Last committed position of an OpenFoodFacts import, so an interrupted
+    run of import_off_egypt resumes there instead of at row 0.
+    """
+
+    path = models.CharField(max_length=500, unique=True)
+    fingerprint = models.CharField(
+        max_length=100, help_text="Size and mtime of the dump when it was started"
+    )
+    offset = models.BigIntegerField(default=0)
+    processed = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.path} @ {self.offset}"
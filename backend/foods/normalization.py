@@ -0,0 +1,141 @@
+import re
+import unicodedata
+
+
+# ==============================
+# ARABIC
+# ==============================
+# Tashkeel (harakat, tanween, shadda, sukun, dagger alef) and tatweel
+TASHKEEL_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+
+ARABIC_LETTER_VARIANTS = str.maketrans(
+    {
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ى": "ي",
+        "ی": "ي",
+        "ئ": "ي",
+        "ؤ": "و",
+        "ة": "ه",
+        "ک": "ك",
+    }
+)
+
+# Arabic letters to the Latin spelling used by Egyptian / Gulf product names.
+# Long vowels and glottal letters map to vowels so they drop out of the key.
+ARABIC_TO_LATIN = str.maketrans(
+    {
+        "ا": "a",
+        "ء": "a",
+        "ع": "a",
+        "و": "w",
+        "ي": "y",
+        "ب": "b",
+        "ت": "t",
+        "ث": "t",
+        "ج": "g",
+        "ح": "h",
+        "خ": "k",
+        "د": "d",
+        "ذ": "z",
+        "ر": "r",
+        "ز": "z",
+        "س": "s",
+        "ش": "sh",
+        "ص": "s",
+        "ض": "d",
+        "ط": "t",
+        "ظ": "z",
+        "غ": "g",
+        "ف": "f",
+        "ق": "k",
+        "ك": "k",
+        "ل": "l",
+        "م": "m",
+        "ن": "n",
+        "ه": "h",
+        "٠": "0",
+        "١": "1",
+        "٢": "2",
+        "٣": "3",
+        "٤": "4",
+        "٥": "5",
+        "٦": "6",
+        "٧": "7",
+        "٨": "8",
+        "٩": "9",
+    }
+)
+
+# Final heh is almost always a normalized ta-marbuta, which is not pronounced
+FINAL_HEH_RE = re.compile("ه\\b")
+
+
+def normalize_arabic(text):
+    """Strip tashkeel/tatweel and unify alef, ya, ta-marbuta variants."""
+    return TASHKEEL_RE.sub("", text).translate(ARABIC_LETTER_VARIANTS)
+
+
+# ==============================
+# LATIN
+# ==============================
+# Transliteration spellings collapsed to one consonant each. Order matters.
+LATIN_DIGRAPHS = (
+    ("sch", "sh"),
+    ("ch", "sh"),
+    ("kh", "k"),
+    ("gh", "g"),
+    ("th", "t"),
+    ("dh", "z"),
+    ("ph", "f"),
+    ("ck", "k"),
+    ("x", "ks"),
+    ("q", "k"),
+    ("c", "k"),
+    ("j", "g"),
+    ("p", "b"),
+    ("v", "f"),
+)
+
+VOWELS_RE = re.compile("[aeiouwy]")
+REPEATED_RE = re.compile(r"(.)\1+")
+TOKEN_RE = re.compile(r"[0-9]+|[a-z]+")
+
+
+def strip_accents(text):
+    return "".join(
+        ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch)
+    )
+
+
+def _consonant_skeleton(token):
+    """'foul', 'ful' and 'fwl' (from فول) all become 'fl'."""
+    if token.isdigit():
+        return token
+    for src, dst in LATIN_DIGRAPHS:
+        token = token.replace(src, dst)
+    skeleton = REPEATED_RE.sub(r"\1", VOWELS_RE.sub("", token))
+    return skeleton or token
+
+
+# ==============================
+# PUBLIC API
+# ==============================
+def search_tokens(text):
+    """Script-independent tokens for a product name or a search query."""
+    if not text:
+        return []
+
+    text = unicodedata.normalize("NFKC", text)
+    text = normalize_arabic(text)
+    text = FINAL_HEH_RE.sub("a", text)
+    text = strip_accents(text.translate(ARABIC_TO_LATIN)).casefold()
+
+    return [_consonant_skeleton(token) for token in TOKEN_RE.findall(text)]
+
+
+def build_search_key(text, max_length=255):
+    """Space-joined search tokens, as stored in FoodItem.search_key."""
+    return " ".join(search_tokens(text))[:max_length].strip()
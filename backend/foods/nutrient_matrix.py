@@ -0,0 +1,182 @@
+import numpy as np
+
+from .conversions import BASIS_GRAMS, to_grams
+from .models import (
+    NUTRIENT_FIELDS,
+    NutritionProfile,
+    RecipeIngredient,
+    Meal,
+    MealIngredient,
+)
+
+
+# ==============================
+# MATRIX
+# ==============================
+class NutrientMatrix:
+    """
+    NutritionProfile rows as a float32 matrix with one row per FoodItem id
+    (sorted) and one column per entry of NUTRIENT_FIELDS, in that order.
+    """
+
+    def __init__(self, food_ids, values):
+        food_ids = np.asarray(food_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32).reshape(
+            len(food_ids), len(NUTRIENT_FIELDS)
+        )
+        order = np.argsort(food_ids)
+        self.food_ids = food_ids[order]
+        self.values = values[order]
+
+    @classmethod
+    def load(cls, food_ids=None):
+        """Load every profile, or only those of the given foods."""
+        profiles = NutritionProfile.objects.all()
+        if food_ids is not None:
+            profiles = profiles.filter(food_item_id__in=_unique_ids(food_ids))
+
+        rows = list(profiles.values_list("food_item_id", *NUTRIENT_FIELDS))
+        if not rows:
+            return cls([], [])
+
+        table = np.asarray(rows, dtype=np.float64)
+        return cls(table[:, 0], table[:, 1:])
+
+    def __len__(self):
+        return len(self.food_ids)
+
+    def lookup(self, food_ids):
+        """Returns (row index, found mask) for each food id."""
+        food_ids = np.asarray(food_ids, dtype=np.int64)
+        if not len(self.food_ids):
+            return np.zeros(len(food_ids), dtype=np.int64), np.zeros(
+                len(food_ids), dtype=bool
+            )
+        idx = np.searchsorted(self.food_ids, food_ids)
+        idx = np.minimum(idx, len(self.food_ids) - 1)
+        return idx, self.food_ids[idx] == food_ids
+
+    def totals(self, owner_ids, food_ids, ratios):
+        """
+        Sum ratio * nutrients per owner: the sparse product of the
+        (owner x food) ratio matrix with this matrix.
+
+        Returns (unique owner ids, float64 array of shape owners x nutrients).
+        Foods without a profile contribute nothing.
+        """
+        owner_ids = np.asarray(owner_ids, dtype=np.int64)
+        ratios = np.asarray(ratios, dtype=np.float64)
+        owners, inverse = np.unique(owner_ids, return_inverse=True)
+
+        idx, found = self.lookup(food_ids)
+        weights = np.where(found, ratios, 0.0)
+        contributions = self.values[idx].astype(np.float64) * weights[:, None]
+
+        out = np.empty((len(owners), len(NUTRIENT_FIELDS)), dtype=np.float64)
+        for col in range(len(NUTRIENT_FIELDS)):
+            out[:, col] = np.bincount(
+                inverse, weights=contributions[:, col], minlength=len(owners)
+            )
+        return owners, out
+
+
+# ==============================
+# HELPERS
+# ==============================
+def _unique_ids(ids):
+    return np.unique(np.asarray(list(ids), dtype=np.int64)).tolist()
+
+
+def ingredient_ratios(rows):
+    """
+    Multiples of the per-100 g nutrition basis for (owner_id, food_id,
+    quantity, unit) rows, converted in one to_grams() batch.
+    """
+    grams = to_grams((food_id, quantity, unit) for _, food_id, quantity, unit in rows)
+    return np.asarray(grams, dtype=np.float64) / BASIS_GRAMS
+
+
+def totals_as_dicts(owners, totals):
+    """Turn (ids, matrix) into { id: { nutrient: value } }."""
+    return {
+        owner_id: dict(zip(NUTRIENT_FIELDS, row))
+        for owner_id, row in zip(owners.tolist(), totals.tolist())
+    }
+
+
+def _ingredient_totals(rows, matrix=None):
+    """rows: list of (owner_id, food_id, quantity, unit)."""
+    if not rows:
+        empty = np.zeros((0, len(NUTRIENT_FIELDS)), dtype=np.float64)
+        return np.zeros(0, dtype=np.int64), empty
+
+    owner_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    food_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    ratios = ingredient_ratios(rows)
+
+    if matrix is None:
+        matrix = NutrientMatrix.load(food_ids)
+    return matrix.totals(owner_ids, food_ids, ratios)
+
+
+# ==============================
+# PUBLIC API
+# ==============================
+def recipe_totals(recipe_ids, matrix=None):
+    """
+    Nutrient totals for many recipes at once. Returns
+    { recipe_id: { nutrient: total } }; recipes without ingredients are
+    absent from the result.
+    """
+    rows = list(
+        RecipeIngredient.objects.filter(recipe_id__in=_unique_ids(recipe_ids))
+        .values_list("recipe_id", "food_item_id", "quantity", "unit")
+    )
+    return totals_as_dicts(*_ingredient_totals(rows, matrix))
+
+
+def meal_totals(meal_ids, matrix=None):
+    """
+    Nutrient totals for many meals at once (direct ingredients plus their
+    recipes). Returns { meal_id: { nutrient: total } }.
+    """
+    meal_ids = _unique_ids(meal_ids)
+
+    ingredient_rows = list(
+        MealIngredient.objects.filter(meal_id__in=meal_ids).values_list(
+            "meal_id", "food_item_id", "quantity", "unit"
+        )
+    )
+    meal_recipes = list(
+        Meal.recipes.through.objects.filter(meal_id__in=meal_ids).values_list(
+            "meal_id", "recipe_id"
+        )
+    )
+    recipe_rows = list(
+        RecipeIngredient.objects.filter(
+            recipe_id__in={recipe_id for _, recipe_id in meal_recipes}
+        ).values_list("recipe_id", "food_item_id", "quantity", "unit")
+    )
+
+    if matrix is None:
+        food_ids = [row[1] for row in ingredient_rows] + [
+            row[1] for row in recipe_rows
+        ]
+        matrix = NutrientMatrix.load(food_ids)
+
+    owners, totals = _ingredient_totals(ingredient_rows, matrix)
+    recipes, per_recipe = _ingredient_totals(recipe_rows, matrix)
+
+    if meal_recipes and len(recipes):
+        links = np.asarray(meal_recipes, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(recipes, links[:, 1]), len(recipes) - 1)
+        found = recipes[idx] == links[:, 1]
+        links, idx = links[found], idx[found]
+
+        all_owners = np.union1d(owners, links[:, 0])
+        combined = np.zeros((len(all_owners), len(NUTRIENT_FIELDS)))
+        combined[np.searchsorted(all_owners, owners)] += totals
+        np.add.at(combined, np.searchsorted(all_owners, links[:, 0]), per_recipe[idx])
+        owners, totals = all_owners, combined
+
+    return totals_as_dicts(owners, totals)
@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import re
+
+from .normalization import build_search_key
+from .servings import parse_serving
+
+
+# ==============================
+# CONFIG
+# ==============================
+MENA_TAGS = frozenset(
+    {
+        "en:egypt",
+        "en:saudi-arabia",
+        "en:united-arab-emirates",
+        "en:kuwait",
+        "en:qatar",
+        "en:bahrain",
+        "en:oman",
+        "en:jordan",
+        "en:lebanon",
+        "en:morocco",
+        "en:tunisia",
+        "en:algeria",
+    }
+)
+
+# Cheap byte-level check: any line that can pass the country filter matches.
+# Most of the world's products are rejected here without being decoded.
+PREFILTER_RE = re.compile(
+    b"(?i)egypt|" + b"|".join(re.escape(tag.encode()) for tag in sorted(MENA_TAGS))
+)
+
+NAME_COLUMNS = ("product_name", "generic_name", "abbreviated_product_name")
+
+# NutritionProfile field -> OFF column, in NUTRIENT_FIELDS order
+NUTRIENT_COLUMNS = {
+    "calories": "energy-kcal_100g",
+    "protein": "proteins_100g",
+    "carbohydrates": "carbohydrates_100g",
+    "fats": "fat_100g",
+    "fiber": "fiber_100g",
+    "sugar": "sugars_100g",
+    "sodium": "sodium_100g",
+    "iron": "iron_100g",
+    "calcium": "calcium_100g",
+    "potassium": "potassium_100g",
+    "zinc": "zinc_100g",
+    "magnesium": "magnesium_100g",
+    "vitamin_a": "vitamin-a_100g",
+    "vitamin_c": "vitamin-c_100g",
+}
+MACRO_COLUMNS = (
+    "energy-kcal_100g",
+    "proteins_100g",
+    "carbohydrates_100g",
+    "fat_100g",
+)
+
+# ServingSize fields parsed from serving_size / serving_quantity
+SERVING_FIELDS = (
+    "serving_description",
+    "serving_quantity",
+    "serving_unit",
+    "serving_metric_quantity",
+    "serving_metric_unit",
+)
+
+# Parsed record layout, as copied into the staging table
+RECORD_FIELDS = (
+    "off_code",
+    "name",
+    "search_key",
+    "off_hash",
+    *NUTRIENT_COLUMNS,
+    *SERVING_FIELDS,
+)
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def fnum(v):
+    try:
+        s = str(v).strip()
+        if not s or s.lower() in {"nan", "none"}:
+            return 0.0
+        return float(s)
+    except Exception:
+        return 0.0
+
+
+# ==============================
+# READING
+# ==============================
+def open_dump(path):
+    """Binary stream over a plain or gzip-compressed TSV dump."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_header(stream):
+    """Returns { column name: index } from the first line."""
+    header = stream.readline().decode("utf-8", errors="ignore").rstrip("\r\n")
+    return {name: i for i, name in enumerate(header.split("\t"))}
+
+
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    """
+    Yields (byte offset, block) pairs of whole lines, reading the stream
+    sequentially so gzip input never has to be decompressed to disk.
+    """
+    offset = stream.tell()
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            return
+        if not block.endswith(b"\n"):
+            block += stream.readline()
+        yield offset, block
+        offset += len(block)
+
+
+# ==============================
+# PARSING
+# ==============================
+def _field(fields, columns, name):
+    i = columns.get(name)
+    if i is None or i >= len(fields):
+        return ""
+    return fields[i].strip()
+
+
+def content_hash(*values):
+    """Stable hash of the imported content, stored in FoodItem.off_hash."""
+    return hashlib.md5("\x1f".join(map(str, values)).encode()).hexdigest()
+
+
+def parse_line(fields, columns, require_nutrition=False):
+    """One split TSV line -> record tuple (see RECORD_FIELDS), or None."""
+    countries_tags = _field(fields, columns, "countries_tags").lower()
+    countries_en = _field(fields, columns, "countries_en").lower()
+    if not (
+        any(tag in countries_tags for tag in MENA_TAGS) or "egypt" in countries_en
+    ):
+        return None
+
+    code = _field(fields, columns, "code")
+    name = next(
+        (_field(fields, columns, c) for c in NAME_COLUMNS if _field(fields, columns, c)),
+        "",
+    )
+    if not code or not name:
+        return None
+
+    if require_nutrition and not any(
+        _field(fields, columns, c) for c in MACRO_COLUMNS
+    ):
+        return None
+
+    name = name[:255]
+    nutrients = tuple(
+        fnum(_field(fields, columns, c)) for c in NUTRIENT_COLUMNS.values()
+    )
+    serving = parse_serving(
+        _field(fields, columns, "serving_size"),
+        fnum(_field(fields, columns, "serving_quantity")),
+    ) or (None,) * len(SERVING_FIELDS)
+    return (
+        code[:32],
+        name,
+        build_search_key(name),
+        content_hash(name, *nutrients, *serving),
+        *nutrients,
+        *serving,
+    )
+
+
+def parse_chunk(task):
+    """
+    Process-pool entry point (no database access). task is
+    (block, columns, require_nutrition); returns the number of lines in the
+    block and [(line index, record), ...] for the rows that were kept.
+    """
+    block, columns, require_nutrition = task
+    lines = block.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+
+    records = []
+    for i, line in enumerate(lines):
+        if not PREFILTER_RE.search(line):
+            continue
+        fields = line.decode("utf-8", errors="ignore").rstrip("\r").split("\t")
+        record = parse_line(fields, columns, require_nutrition)
+        if record is not None:
+            records.append((i, record))
+    return len(lines), records
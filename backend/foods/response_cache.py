@@ -0,0 +1,125 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+# ==============================
+# CONFIG
+# ==============================
+CATALOG_VERSION_KEY = "foods:catalog:version"  # shared foods (user IS NULL)
+RECIPES_VERSION_KEY = "foods:recipes:version"  # public recipes
+
+PAGE_TTL = 10 * 60
+ROW_TTL = 60 * 60
+PAGE_CACHE_KEY = "foods:list:{namespace}:page:{digest}"
+ROW_CACHE_KEY = "foods:list:{namespace}:row:{variant}:{pk}"
+
+# Query parameters that change the representation of a row
+ROW_VARIANT_PARAMS = ("fields", "expand")
+
+
+# ==============================
+# VERSIONS
+# ==============================
+def _bump(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_catalog_version():
+    """
+    Retire every cached catalog page and row once the transaction commits:
+    keys embed the version, so nothing is scanned or deleted. Recipe pages
+    embed catalog foods and include this counter in their namespace too.
+    """
+    transaction.on_commit(lambda: _bump(CATALOG_VERSION_KEY))
+
+
+def bump_recipes_version():
+    transaction.on_commit(lambda: _bump(RECIPES_VERSION_KEY))
+
+
+def namespace(version_keys):
+    """Current versions of the given counters, e.g. "catalog-3.recipes-7"."""
+    versions = cache.get_many(version_keys)
+    return ".".join(
+        f"{key.split(':')[1]}-{versions.get(key, 0)}" for key in version_keys
+    )
+
+
+# ==============================
+# VIEWS
+# ==============================
+class SharedListCacheMixin:
+    """
+    Response cache for ListAPIViews over shared rows plus the user's own.
+
+    Users without private rows see exactly the shared listing, so the whole
+    paginated response is cached per query string. Otherwise the page is
+    still chosen by the database, but the representations of its shared
+    rows come from a per-row cache and only the private ones are serialized.
+    Private rows never enter the cache.
+
+    Views set cache_versions (the counters their payload depends on) and
+    implement is_shared(obj) and has_private_rows().
+    """
+
+    cache_versions = ()
+
+    def is_shared(self, obj):
+        raise NotImplementedError
+
+    def has_private_rows(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        version = namespace(self.cache_versions)
+
+        if not self.has_private_rows():
+            query = request.query_params.urlencode()
+            key = PAGE_CACHE_KEY.format(
+                namespace=version,
+                digest=hashlib.md5(f"{request.path}?{query}".encode()).hexdigest(),
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+            response = super().list(request, *args, **kwargs)
+            cache.set(key, response.data, PAGE_TTL)
+            return response
+
+        # The page is picked on bare rows, without select/prefetch work
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(
+            queryset.select_related(None).prefetch_related(None)
+        )
+        if page is None:
+            return super().list(request, *args, **kwargs)
+
+        variant = hashlib.md5(
+            repr([request.query_params.get(p) for p in ROW_VARIANT_PARAMS]).encode()
+        ).hexdigest()
+        keys = {
+            obj.pk: ROW_CACHE_KEY.format(namespace=version, variant=variant, pk=obj.pk)
+            for obj in page
+            if self.is_shared(obj)
+        }
+        cached = cache.get_many(list(keys.values()))
+        rows = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+        missing = [obj.pk for obj in page if obj.pk not in rows]
+        if missing:
+            objects = list(self.get_queryset().filter(pk__in=missing))
+            serialized = self.get_serializer(objects, many=True).data
+            fresh = dict(zip([obj.pk for obj in objects], serialized))
+            cache.set_many(
+                {keys[pk]: row for pk, row in fresh.items() if pk in keys}, ROW_TTL
+            )
+            rows.update(fresh)
+
+        return self.get_paginated_response([rows[obj.pk] for obj in page])
@@ -1,36 +1,43 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.db import transaction
 from django.db.models import Q
 from .models import (
+    NUTRIENT_FIELDS,
     FoodItem,
     ServingSize,
     NutritionProfile,
     Recipe,
     RecipeInstruction,
     RecipeIngredient,
+    RecipeNutrition,
     Meal,
     MealIngredient,
 )
+from .normalization import build_search_key
+from .servings import metric_equivalent
+from .sparse import SparseFieldsMixin
 
 
-class ServingSizeSerializer(serializers.ModelSerializer):
+class ServingSizeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ServingSize
-        fields = ["description", "quantity", "unit"]
+        fields = ["description", "quantity", "unit", "metric_quantity", "metric_unit"]
+        read_only_fields = ["metric_quantity", "metric_unit"]
 
 
-class NutritionProfileSerializer(serializers.ModelSerializer):
+class NutritionProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = NutritionProfile
         exclude = ("food_item",)
 
 
-class FoodItemSerializer(serializers.ModelSerializer):
+class FoodItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     serving_size = ServingSizeSerializer(
         many=True,
     )
     nutrition = NutritionProfileSerializer()
-    price_per_gram_protein = serializers.SerializerMethodField()
 
     class Meta:
         model = FoodItem
@@ -52,10 +59,6 @@ class FoodItemSerializer(serializers.ModelSerializer):
             "created_at",
         ]
 
-    def get_price_per_gram_protein(self, obj):
-        val = obj.price_per_gram_protein()
-        return float(val) if val is not None else None
-
     def create(self, validated_data):
         serving_sizes_data = validated_data.pop("serving_size", [])
         nutrition_data = validated_data.pop("nutrition", None)
@@ -79,10 +82,94 @@ class FoodItemSerializer(serializers.ModelSerializer):
         for serving in serving_sizes_data:
             ServingSize.objects.create(food=food_item, **serving)
 
+        # Stored by the post_save signals once nutrition exists
+        food_item.refresh_from_db(fields=["price_per_gram_protein"])
         return food_item
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class FoodItemBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates every item in one pass and writes the whole batch with
+    bulk_create in one transaction. Errors are reported per item, in input
+    order ({} for valid items), and nothing is written unless all are valid.
+    """
+
+    def to_internal_value(self, data):
+        # unique_together (user, price), prefetched for the batch in one query
+        prices = set()
+        for item in data if isinstance(data, list) else []:
+            try:
+                prices.add(Decimal(str(item["price"])))
+            except (TypeError, KeyError, ArithmeticError):
+                continue  # reported by the item's own validation
+        self._taken_prices = set(
+            FoodItem.objects.filter(
+                user=self.context["request"].user, price__in=prices
+            ).values_list("price", flat=True)
+        )
+        self._batch_prices = set()
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        value = super().run_child_validation(data)
+        price = value["price"]
+        if price in self._taken_prices:
+            raise serializers.ValidationError(
+                {"price": ["You had already added this price before."]}
+            )
+        if price in self._batch_prices:
+            raise serializers.ValidationError(
+                {"price": ["This price appears twice in the batch."]}
+            )
+        self._batch_prices.add(price)
+        return value
+
+    def create(self, validated_data):
+        foods, nutrition, servings = [], [], []
+        for item in validated_data:
+            item = dict(item)
+            nutrition.append(item.pop("nutrition", None))
+            servings.append(item.pop("serving_size", []))
+            food = FoodItem(**item)
+            food.search_key = build_search_key(food.name)  # FoodItem.save() is skipped
+            foods.append(food)
+
+        with transaction.atomic():
+            FoodItem.objects.bulk_create(foods)
+            NutritionProfile.objects.bulk_create(
+                NutritionProfile(food_item=food, **data)
+                for food, data in zip(foods, nutrition)
+                if data
+            )
+            serving_rows = []
+            for food, rows in zip(foods, servings):
+                for data in rows:
+                    serving = ServingSize(food=food, **data)
+                    serving.metric_quantity, serving.metric_unit = metric_equivalent(
+                        serving.quantity, serving.unit
+                    )
+                    serving_rows.append(serving)
+            ServingSize.objects.bulk_create(serving_rows)
+
+            # What the post_save signals would have done
+            ids = [food.pk for food in foods]
+            FoodItem.objects.filter(pk__in=ids).refresh_price_per_gram_protein()
+
+        created = (
+            FoodItem.objects.filter(pk__in=ids)
+            .select_related("nutrition")
+            .prefetch_related("serving_size")
+            .in_bulk()
+        )
+        return [created[pk] for pk in ids]
+
+
+class FoodItemBulkSerializer(FoodItemSerializer):
+    class Meta(FoodItemSerializer.Meta):
+        list_serializer_class = FoodItemBulkListSerializer
+
+
+class RecipeIngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     food_item = FoodItemSerializer(read_only=True)
     food_item_id = serializers.PrimaryKeyRelatedField(
         queryset=FoodItem.objects.all(), source="food_item", write_only=True
@@ -97,21 +184,31 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
             "quantity",
             "unit",
         ]
+        expandable_fields = ["food_item"]
 
 
-class RecipeInstructionSerializer(serializers.ModelSerializer):
+class RecipeInstructionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = RecipeInstruction
         fields = ("step_number", "text")
+        # Numbered from the list order when left out, see number_steps()
+        extra_kwargs = {"step_number": {"required": False}}
+
+
+class RecipeNutritionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = RecipeNutrition
+        exclude = ("recipe", "updated_at")
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source="recipeingredient_set",
         many=True,
         read_only=True,
     )
     instructions = RecipeInstructionSerializer(many=True)
+    nutrition = RecipeNutritionSerializer(read_only=True)
 
     calories = serializers.SerializerMethodField()
     protein_g = serializers.SerializerMethodField()
@@ -128,6 +225,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_public",
             "ingredients",
             "instructions",
+            "nutrition",
             "calories",
             "protein_g",
             "carbs_g",
@@ -150,47 +248,22 @@ class RecipeSerializer(serializers.ModelSerializer):
                 f"An error occurred while creating the recipe: {e}"
             )
 
-    def _calculate_recipe_nutrition(self, obj):
-        """Calculate total nutrition for all ingredients in the recipe."""
-        totals = {
-            "calories": 0,
-            "protein_g": 0,
-            "carbs_g": 0,
-            "fats_g": 0,
-        }
-
-        for recipe_ingredient in obj.recipeingredient_set.select_related(
-            "food_item__nutrition"
-        ).all():
-            nutrition = getattr(recipe_ingredient.food_item, "nutrition", None)
-            if nutrition:
-                # Get the base serving size for the food item
-                serving = recipe_ingredient.food_item.serving_size.first()
-                if serving and serving.quantity > 0:
-                    # Calculate ratio based on quantity used vs serving size
-                    ratio = recipe_ingredient.quantity / serving.quantity
-                else:
-                    # Default to 1:1 ratio if no serving size defined
-                    ratio = recipe_ingredient.quantity
-
-                totals["calories"] += nutrition.calories * ratio
-                totals["protein_g"] += nutrition.protein * ratio
-                totals["carbs_g"] += nutrition.carbohydrates * ratio
-                totals["fats_g"] += nutrition.fats * ratio
-
-        return totals
+    def _stored_nutrition_value(self, obj, field):
+        """Read a total from the stored RecipeNutrition row (0 if not built yet)."""
+        nutrition = getattr(obj, "nutrition", None)
+        return round(getattr(nutrition, field, 0) or 0, 1)
 
     def get_calories(self, obj):
-        return round(self._calculate_recipe_nutrition(obj)["calories"], 1)
+        return self._stored_nutrition_value(obj, "calories")
 
     def get_protein_g(self, obj):
-        return round(self._calculate_recipe_nutrition(obj)["protein_g"], 1)
+        return self._stored_nutrition_value(obj, "protein")
 
     def get_carbs_g(self, obj):
-        return round(self._calculate_recipe_nutrition(obj)["carbs_g"], 1)
+        return self._stored_nutrition_value(obj, "carbohydrates")
 
     def get_fats_g(self, obj):
-        return round(self._calculate_recipe_nutrition(obj)["fats_g"], 1)
+        return self._stored_nutrition_value(obj, "fats")
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
@@ -203,22 +276,31 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         fields = ["name", "description", "is_public", "ingredients", "instructions"]
         read_only_fields = ["created_at"]
 
+    def validate_instructions(self, value):
+        from .services import number_steps
+
+        steps = [step for step, _ in number_steps(value)]
+        if len(steps) != len(set(steps)):
+            raise serializers.ValidationError("Step numbers must be unique.")
+        return value
+
     def create(self, validated_data):
+        from .services import write_recipe_ingredients, write_recipe_instructions
+
         ingredients_data = validated_data.pop("recipeingredient_set", [])
         instructions_data = validated_data.pop("instructions", [])
 
         user = self.context["request"].user
-        recipe = Recipe.objects.create(user=user, **validated_data)
-
-        for item in ingredients_data:
-            RecipeIngredient.objects.create(recipe=recipe, **item)
-
-        for instruction in instructions_data:
-            RecipeInstruction.objects.create(recipe=recipe, **instruction)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(user=user, **validated_data)
+            write_recipe_ingredients(recipe, ingredients_data, created=True)
+            write_recipe_instructions(recipe, instructions_data, created=True)
 
         return recipe
 
     def update(self, instance, validated_data):
+        from .services import write_recipe_ingredients, write_recipe_instructions
+
         ingredients_data = validated_data.pop("recipeingredient_set", None)
         instructions_data = validated_data.pop("instructions", None)
 
@@ -227,20 +309,16 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                 setattr(instance, attr, value)
             instance.save()
 
+            # Diffed against the existing rows, see foods.services
             if ingredients_data is not None:
-                RecipeIngredient.objects.filter(recipe=instance).delete()
-                for item in ingredients_data:
-                    RecipeIngredient.objects.create(recipe=instance, **item)
-
+                write_recipe_ingredients(instance, ingredients_data)
             if instructions_data is not None:
-                RecipeInstruction.objects.filter(recipe=instance).delete()
-                for instruction in instructions_data:
-                    RecipeInstruction.objects.create(recipe=instance, **instruction)
+                write_recipe_instructions(instance, instructions_data)
 
         return instance
 
 
-class MealIngredientSerializer(serializers.ModelSerializer):
+class MealIngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     food_item = FoodItemSerializer(read_only=True)
     food_item_id = serializers.PrimaryKeyRelatedField(
         queryset=FoodItem.objects.all(),
@@ -252,9 +330,10 @@ class MealIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = MealIngredient
         fields = ["id", "food_item", "food_item_id", "quantity", "unit"]
+        expandable_fields = ["food_item"]
 
 
-class MealSerializer(serializers.ModelSerializer):
+class MealSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     ingredients = MealIngredientSerializer(
         source="mealingredient_set",
         many=True,
@@ -262,6 +341,7 @@ class MealSerializer(serializers.ModelSerializer):
     )
     recipes = RecipeSerializer(many=True, read_only=True)
 
+    nutrition = serializers.SerializerMethodField()
     calories = serializers.SerializerMethodField()
     protein_g = serializers.SerializerMethodField()
     carbs_g = serializers.SerializerMethodField()
@@ -276,81 +356,46 @@ class MealSerializer(serializers.ModelSerializer):
             "meal_type",
             "ingredients",
             "recipes",
+            "nutrition",
             "calories",
             "protein_g",
             "carbs_g",
             "fats_g",
             "created_at",
         ]
+        expandable_fields = ["recipes"]
 
-    def _calculate_nutrition_totals(self, obj):
+    def _nutrition_totals(self, obj):
         """
-        Calculate total nutrition from both direct ingredients and recipes.
-        Returns dict with calories, protein_g, carbs_g, fats_g.
+        Read the total_<nutrient> annotations from Meal.objects.with_nutrition(),
+        fetching them in one query when the instance was loaded without them.
         """
-        cache_key = f"_nutrition_cache_{obj.id}"
-
-        if not hasattr(self, cache_key):
-            totals = {
-                "calories": 0,
-                "protein_g": 0,
-                "carbs_g": 0,
-                "fats_g": 0,
-            }
-
-            # Calculate from direct meal ingredients
-            for meal_ingredient in obj.mealingredient_set.select_related(
-                "food_item__nutrition"
-            ).all():
-                nutrition = getattr(meal_ingredient.food_item, "nutrition", None)
-                if nutrition:
-                    serving = meal_ingredient.food_item.serving_size.first()
-                    ratio = (
-                        meal_ingredient.quantity / serving.quantity
-                        if serving and serving.quantity > 0
-                        else meal_ingredient.quantity
-                    )
+        if not hasattr(obj, "total_calories"):
+            annotated = Meal.objects.with_nutrition().values(
+                *(f"total_{field}" for field in NUTRIENT_FIELDS)
+            )
+            for key, value in annotated.get(pk=obj.pk).items():
+                setattr(obj, key, value)
 
-                    totals["calories"] += nutrition.calories * ratio
-                    totals["protein_g"] += nutrition.protein * ratio
-                    totals["carbs_g"] += nutrition.carbohydrates * ratio
-                    totals["fats_g"] += nutrition.fats * ratio
-
-            # Calculate from recipes
-            for recipe in obj.recipes.prefetch_related(
-                "recipeingredient_set__food_item__nutrition",
-                "recipeingredient_set__food_item__serving_size",
-            ).all():
-                for recipe_ingredient in recipe.recipeingredient_set.all():
-                    nutrition = getattr(recipe_ingredient.food_item, "nutrition", None)
-                    if nutrition:
-                        serving = recipe_ingredient.food_item.serving_size.first()
-                        ratio = (
-                            recipe_ingredient.quantity / serving.quantity
-                            if serving and serving.quantity > 0
-                            else recipe_ingredient.quantity
-                        )
-
-                        totals["calories"] += nutrition.calories * ratio
-                        totals["protein_g"] += nutrition.protein * ratio
-                        totals["carbs_g"] += nutrition.carbohydrates * ratio
-                        totals["fats_g"] += nutrition.fats * ratio
-
-            setattr(self, cache_key, totals)
-
-        return getattr(self, cache_key)
+        return {field: getattr(obj, f"total_{field}") or 0 for field in NUTRIENT_FIELDS}
+
+    def get_nutrition(self, obj):
+        return {
+            field: round(value, 1)
+            for field, value in self._nutrition_totals(obj).items()
+        }
 
     def get_calories(self, obj):
-        return round(self._calculate_nutrition_totals(obj)["calories"], 1)
+        return round(self._nutrition_totals(obj)["calories"], 1)
 
     def get_protein_g(self, obj):
-        return round(self._calculate_nutrition_totals(obj)["protein_g"], 1)
+        return round(self._nutrition_totals(obj)["protein"], 1)
 
     def get_carbs_g(self, obj):
-        return round(self._calculate_nutrition_totals(obj)["carbs_g"], 1)
+        return round(self._nutrition_totals(obj)["carbohydrates"], 1)
 
     def get_fats_g(self, obj):
-        return round(self._calculate_nutrition_totals(obj)["fats_g"], 1)
+        return round(self._nutrition_totals(obj)["fats"], 1)
 
 
 class MealCreateUpdateSerializer(serializers.ModelSerializer):
@@ -383,21 +428,25 @@ class MealCreateUpdateSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "slug", "created_at"]
 
     def create(self, validated_data):
+        from .services import write_meal_ingredients
+
         user = self.context["request"].user
         ingredients_data = validated_data.pop("mealingredient_set", [])
         recipes = validated_data.pop("recipes", [])
 
-        meal = Meal.objects.create(user=user, **validated_data)
+        with transaction.atomic():
+            meal = Meal.objects.create(user=user, **validated_data)
 
-        if recipes:
-            meal.recipes.set(recipes)
+            if recipes:
+                meal.recipes.set(recipes)
 
-        for item in ingredients_data:
-            MealIngredient.objects.create(meal=meal, **item)
+            write_meal_ingredients(meal, ingredients_data, created=True)
 
         return meal
 
     def update(self, instance, validated_data):
+        from .services import write_meal_ingredients
+
         ingredients_data = validated_data.pop("mealingredient_set", None)
         recipes = validated_data.pop("recipes", None)
 
@@ -410,8 +459,6 @@ class MealCreateUpdateSerializer(serializers.ModelSerializer):
                 instance.recipes.set(recipes)
 
             if ingredients_data is not None:
-                MealIngredient.objects.filter(meal=instance).delete()
-                for item in ingredients_data:
-                    MealIngredient.objects.create(meal=instance, **item)
+                write_meal_ingredients(instance, ingredients_data)
 
         return instance
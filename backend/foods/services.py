@@ -0,0 +1,357 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    ExpressionWrapper,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce
+
+from .conversions import BASIS_GRAMS, to_grams
+from .response_cache import bump_recipes_version
+from .models import (
+    NUTRIENT_FIELDS,
+    FoodItem,
+    Recipe,
+    RecipeIngredient,
+    RecipeInstruction,
+    RecipeNutrition,
+    MealIngredient,
+)
+from .serializers import FoodItemSerializer
+
+
+# ==============================
+# RECIPE NUTRITION
+# ==============================
+def _ingredient_ratio():
+    """
+    Multiple of the per-100 g nutrition basis, from the grams stored on the
+    ingredient by foods.conversions.to_grams().
+    """
+    return ExpressionWrapper(F("grams") / BASIS_GRAMS, output_field=FloatField())
+
+
+def compute_recipe_nutrition(recipe_ids):
+    """
+    Returns { recipe_id: { nutrient: total } } for the given recipes in a
+    single aggregate query.
+    """
+    rows = (
+        RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids, food_item__nutrition__isnull=False
+        )
+        .annotate(ratio=_ingredient_ratio())
+        .values("recipe_id")
+        .annotate(
+            **{
+                field: Coalesce(
+                    Sum(F(f"food_item__nutrition__{field}") * F("ratio")),
+                    0.0,
+                    output_field=FloatField(),
+                )
+                for field in NUTRIENT_FIELDS
+            }
+        )
+    )
+
+    return {
+        row["recipe_id"]: {field: row[field] for field in NUTRIENT_FIELDS}
+        for row in rows
+    }
+
+
+def rebuild_recipe_nutrition(recipe_ids=None):
+    """
+    Recompute and store the nutrition totals of the given recipes (or of
+    every recipe when recipe_ids is None). Returns the number of rows written.
+    """
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=list(recipe_ids))
+    existing_ids = list(recipes.values_list("pk", flat=True))
+
+    if not existing_ids:
+        return 0
+
+    totals = compute_recipe_nutrition(existing_ids)
+    empty = {field: 0.0 for field in NUTRIENT_FIELDS}
+
+    summaries = [
+        RecipeNutrition(recipe_id=recipe_id, **totals.get(recipe_id, empty))
+        for recipe_id in existing_ids
+    ]
+
+    RecipeNutrition.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=["recipe"],
+        update_fields=[*NUTRIENT_FIELDS, "updated_at"],
+        batch_size=2000,
+    )
+    if recipes.filter(is_public=True).exists():
+        bump_recipes_version()
+    return len(summaries)
+
+
+def schedule_recipe_nutrition_rebuild(recipe_ids):
+    """
+    Rebuild the stored totals once the current transaction commits, so
+    cascading deletes and multi-row writes see their final state.
+    """
+    recipe_ids = {rid for rid in recipe_ids if rid is not None}
+    if not recipe_ids:
+        return
+    transaction.on_commit(lambda: rebuild_recipe_nutrition(recipe_ids))
+
+
+def recipe_ids_using_food(food_id):
+    return RecipeIngredient.objects.filter(food_item_id=food_id).values_list(
+        "recipe_id", flat=True
+    )
+
+
+def refresh_ingredient_grams(food_ids):
+    """
+    Re-run to_grams() for every recipe / meal ingredient of these foods,
+    after their servings or unit conversions changed. Their conversions are
+    compiled fresh: the shared table is only bumped once the change commits.
+    """
+    for model in (RecipeIngredient, MealIngredient):
+        rows = list(
+            model.objects.filter(food_item_id__in=food_ids).only(
+                "id", "food_item_id", "quantity", "unit"
+            )
+        )
+        grams = to_grams(
+            ((row.food_item_id, row.quantity, row.unit) for row in rows), fresh=True
+        )
+        for row, value in zip(rows, grams):
+            row.grams = value
+        model.objects.bulk_update(rows, ["grams"], batch_size=2000)
+
+
+# ==============================
+# BULK CHILD WRITES
+# ==============================
+def _raw_delete(queryset):
+    """
+    DELETE without fetching rows or sending per-row signals; the writers
+    below do the signals' work once per owner instead.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def _write_ingredients(model, owner_field, owner, items, created=False):
+    """
+    Diff the wanted [{food_item, quantity, unit}, ...] against the owner's
+    existing rows and apply it as one DELETE, one bulk_update and one
+    bulk_create. Rows of the same food are kept (and updated in place) so
+    their ids survive an edit. Returns True when anything changed.
+    """
+    existing = (
+        [] if created else list(model.objects.filter(**{owner_field: owner}).order_by("pk"))
+    )
+    wanted = [
+        (item["food_item"].pk, float(item["quantity"]), item["unit"]) for item in items
+    ]
+
+    # 1) identical rows stay untouched, 2) rows of the same food are updated,
+    # 3) any other leftover row is reused, 4) the rest is inserted
+    pending = list(range(len(wanted)))
+    rows = {}
+    for match in (
+        lambda row, want: (row.food_item_id, row.quantity, row.unit) == want,
+        lambda row, want: row.food_item_id == want[0],
+        lambda row, want: True,
+    ):
+        for i in list(pending):
+            row = next((r for r in existing if match(r, wanted[i])), None)
+            if row is not None:
+                existing.remove(row)
+                pending.remove(i)
+                rows[i] = row
+
+    changed = [
+        row
+        for i, row in rows.items()
+        if (row.food_item_id, row.quantity, row.unit) != wanted[i]
+    ]
+    for i, row in rows.items():
+        row.food_item_id, row.quantity, row.unit = wanted[i]
+    new = [
+        model(**{owner_field: owner}, food_item_id=food_id, quantity=quantity, unit=unit)
+        for food_id, quantity, unit in (wanted[i] for i in pending)
+    ]
+
+    # bulk writes skip Model.save(), which fills in grams
+    grams = to_grams(
+        (row.food_item_id, row.quantity, row.unit) for row in [*changed, *new]
+    )
+    for row, value in zip([*changed, *new], grams):
+        row.grams = value
+
+    if existing:
+        _raw_delete(model.objects.filter(pk__in=[row.pk for row in existing]))
+    if changed:
+        model.objects.bulk_update(changed, ["food_item", "quantity", "unit", "grams"])
+    if new:
+        model.objects.bulk_create(new)
+    return bool(existing or changed or new)
+
+
+def number_steps(items):
+    """
+    Step numbers assigned in memory: the given ones are kept, missing ones
+    continue after the highest number seen so far.
+    """
+    steps, last = [], 0
+    for item in items:
+        step = item.get("step_number") or last + 1
+        steps.append((step, item["text"]))
+        last = max(last, step)
+    return steps
+
+
+def write_recipe_ingredients(recipe, items, created=False):
+    if _write_ingredients(RecipeIngredient, "recipe", recipe, items, created):
+        schedule_recipe_nutrition_rebuild([recipe.pk])
+        return True
+    return False
+
+
+def write_recipe_instructions(recipe, items, created=False):
+    """
+    Same diff for the instructions, keyed by step number: texts of existing
+    steps are updated, other steps inserted or deleted.
+    """
+    wanted = dict(number_steps(items))
+    existing = (
+        {} if created else {row.step_number: row for row in recipe.instructions.all()}
+    )
+
+    removed = [row.pk for step, row in existing.items() if step not in wanted]
+    changed = []
+    for step, row in existing.items():
+        if step in wanted and row.text != wanted[step]:
+            row.text = wanted[step]
+            changed.append(row)
+    new = [
+        RecipeInstruction(recipe=recipe, step_number=step, text=text)
+        for step, text in wanted.items()
+        if step not in existing
+    ]
+
+    if removed:
+        _raw_delete(RecipeInstruction.objects.filter(pk__in=removed))
+    if changed:
+        RecipeInstruction.objects.bulk_update(changed, ["text"])
+    if new:
+        RecipeInstruction.objects.bulk_create(new)
+    return bool(removed or changed or new)
+
+
+def write_meal_ingredients(meal, items, created=False):
+    return _write_ingredients(MealIngredient, "meal", meal, items, created)
+
+
+# ==============================
+# MEAL NUTRITION
+# ==============================
+def _meal_nutrient_total(field):
+    """
+    Total of one nutrient for the outer meal: its direct ingredients plus
+    the stored totals of its recipes, each as a correlated subquery.
+    """
+    from_ingredients = Subquery(
+        MealIngredient.objects.filter(
+            meal=OuterRef("pk"), food_item__nutrition__isnull=False
+        )
+        .annotate(ratio=_ingredient_ratio())
+        .values("meal")
+        .annotate(total=Sum(F(f"food_item__nutrition__{field}") * F("ratio")))
+        .values("total"),
+        output_field=FloatField(),
+    )
+    from_recipes = Subquery(
+        RecipeNutrition.objects.filter(recipe__meal=OuterRef("pk"))
+        .values("recipe__meal")
+        .annotate(total=Sum(field))
+        .values("total"),
+        output_field=FloatField(),
+    )
+    return Coalesce(from_ingredients, 0.0) + Coalesce(from_recipes, 0.0)
+
+
+def meal_nutrition_annotations(fields=NUTRIENT_FIELDS):
+    """Returns { "total_<nutrient>": expression } for Meal.annotate()."""
+    return {f"total_{field}": _meal_nutrient_total(field) for field in fields}
+
+
+# ==============================
+# BARCODE LOOKUP
+# ==============================
+BARCODE_CACHE_TTL = 60 * 60 * 24  # 24 hours
+BARCODE_MISS_TTL = 60 * 10  # unknown codes, until the next import catches up
+BARCODE_MISS = "__missing__"
+MAX_BARCODE_BATCH = 100
+
+
+def _barcode_cache_key(code):
+    return f"foods:barcode:{code}"
+
+
+def normalize_barcode(code):
+    return (code or "").strip()[:32]
+
+
+def lookup_barcodes(codes):
+    """
+    Read-through cached lookup of catalog foods by off_code.
+
+    Returns { code: serialized food or None }. Cache hits (including cached
+    misses) cost no query; all remaining codes are fetched in one query.
+    """
+    codes = list(dict.fromkeys(normalize_barcode(c) for c in codes if c))
+    keys = {code: _barcode_cache_key(code) for code in codes}
+
+    cached = cache.get_many(list(keys.values()))
+    results = {}
+    missing = []
+    for code, key in keys.items():
+        if key not in cached:
+            missing.append(code)
+        else:
+            results[code] = None if cached[key] == BARCODE_MISS else cached[key]
+
+    if missing:
+        foods = (
+            FoodItem.objects.filter(off_code__in=missing, user__isnull=True)
+            .select_related("nutrition")
+            .prefetch_related("serving_size")
+        )
+        found = {food.off_code: dict(FoodItemSerializer(food).data) for food in foods}
+
+        cache.set_many(
+            {keys[code]: data for code, data in found.items()}, BARCODE_CACHE_TTL
+        )
+        cache.set_many(
+            {keys[code]: BARCODE_MISS for code in missing if code not in found},
+            BARCODE_MISS_TTL,
+        )
+        for code in missing:
+            results[code] = found.get(code)
+
+    return results
+
+
+def invalidate_barcode(code):
+    if code:
+        cache.delete(_barcode_cache_key(code))
+
+
+def invalidate_barcodes(codes):
+    cache.delete_many([_barcode_cache_key(code) for code in codes if code])
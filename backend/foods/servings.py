@@ -0,0 +1,110 @@
+import re
+from functools import lru_cache
+
+
+# ==============================
+# UNITS
+# ==============================
+# Spelling -> (metric unit, factor). Only units with a fixed metric size.
+METRIC_UNITS = {
+    "g": ("g", 1.0),
+    "gr": ("g", 1.0),
+    "grs": ("g", 1.0),
+    "gram": ("g", 1.0),
+    "grams": ("g", 1.0),
+    "gramm": ("g", 1.0),
+    "kg": ("g", 1000.0),
+    "mg": ("g", 0.001),
+    "oz": ("g", 28.3495),
+    "lb": ("g", 453.592),
+    "ml": ("ml", 1.0),
+    "cl": ("ml", 10.0),
+    "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0),
+    "liter": ("ml", 1000.0),
+    "litre": ("ml", 1000.0),
+    "fl oz": ("ml", 29.5735),
+    "جم": ("g", 1.0),
+    "جرام": ("g", 1.0),
+    "غ": ("g", 1.0),
+    "غرام": ("g", 1.0),
+    "مل": ("ml", 1.0),
+}
+
+NUMBER = r"\d+(?:[.,]\d+)?"
+# "30 g", "1 cup (240 ml)", "2 pieces (45g)", "45g", "1/2 cup"
+SERVING_RE = re.compile(
+    rf"""^\s*
+    (?:(?P<qty>{NUMBER}(?:\s*/\s*\d+)?)\s*)?
+    (?P<unit>[^\d()\[\]]*?)\s*
+    (?:[(\[]\s*(?P<metric>{NUMBER})\s*(?P<metric_unit>[^\d()\[\]]+?)\s*[)\]])?
+    \s*\.?$""",
+    re.VERBOSE,
+)
+
+
+def _number(text):
+    if not text:
+        return None
+    text = text.replace(",", ".").replace(" ", "")
+    if "/" in text:
+        num, den = text.split("/", 1)
+        return float(num) / float(den) if float(den) else None
+    return float(text)
+
+
+def metric_equivalent(quantity, unit):
+    """(quantity, unit) -> (metric quantity, "g" | "ml"), or (None, "")."""
+    metric = METRIC_UNITS.get((unit or "").strip().lower().rstrip("."))
+    if metric is None or not quantity or quantity <= 0:
+        return None, ""
+    base, factor = metric
+    return quantity * factor, base
+
+
+# ==============================
+# PARSING
+# ==============================
+@lru_cache(maxsize=4096)
+def parse_serving(text, serving_quantity=None):
+    """
+    OpenFoodFacts serving_size / serving_quantity -> (description, quantity,
+    unit, metric quantity, metric unit), or None when nothing usable is there.
+
+    Parsed strings are memoized: a dump repeats "100 g", "30 g", "1 cup
+    (240 ml)" hundreds of thousands of times.
+    """
+    text = (text or "").strip()
+    if not text and not serving_quantity:
+        return None
+
+    quantity, unit, metric, metric_unit = None, "", None, ""
+    match = SERVING_RE.match(text)
+    if match:
+        quantity = _number(match["qty"])
+        unit = match["unit"].strip().lower()
+        metric, metric_unit = metric_equivalent(
+            _number(match["metric"]), match["metric_unit"]
+        )
+        if metric is None:
+            metric, metric_unit = metric_equivalent(quantity, unit)
+
+    # OFF's own normalized figure (grams, or ml for liquids)
+    if metric is None and serving_quantity and serving_quantity > 0:
+        metric = serving_quantity
+        metric_unit = "ml" if re.search(r"ml|cl|\bl\b", text.lower()) else "g"
+
+    if quantity is None and unit:
+        quantity = 1.0  # "serving", "1 bar" without the number
+    if quantity is None or quantity <= 0:
+        if metric is None:
+            return None
+        quantity, unit = metric, metric_unit
+
+    return (
+        (text or f"{metric:g} {metric_unit}")[:255],
+        quantity,
+        unit[:50],
+        metric,
+        metric_unit,
+    )
@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .autocomplete import bump_version as bump_autocomplete_version
+from .conversions import bump_version as bump_conversions_version
+from .response_cache import bump_catalog_version, bump_recipes_version
+from .models import (
+    FoodItem,
+    FoodUnitConversion,
+    Meal,
+    MealIngredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeInstruction,
+    ServingSize,
+    NutritionProfile,
+)
+from .services import (
+    invalidate_barcode,
+    recipe_ids_using_food,
+    refresh_ingredient_grams,
+    schedule_recipe_nutrition_rebuild,
+)
+
+
+def _catalog_off_code(food_id):
+    """Returns (off_code,) for a shared catalog food, None otherwise."""
+    return (
+        FoodItem.objects.filter(pk=food_id, user__isnull=True)
+        .values_list("off_code")
+        .first()
+    )
+
+
+def _recipe_content_changed(recipe_id):
+    Recipe.objects.filter(pk=recipe_id).update(updated_at=timezone.now())
+    if Recipe.objects.filter(pk=recipe_id, is_public=True).exists():
+        bump_recipes_version()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    # Also covers a recipe that just stopped being public
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    _recipe_content_changed(instance.recipe_id)
+    schedule_recipe_nutrition_rebuild([instance.recipe_id])
+
+
+@receiver(post_save, sender=RecipeInstruction)
+@receiver(post_delete, sender=RecipeInstruction)
+def recipe_instruction_changed(sender, instance, **kwargs):
+    _recipe_content_changed(instance.recipe_id)
+
+
+@receiver(post_save, sender=MealIngredient)
+@receiver(post_delete, sender=MealIngredient)
+def meal_ingredient_changed(sender, instance, **kwargs):
+    Meal.objects.filter(pk=instance.meal_id).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Meal.recipes.through)
+def meal_recipes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        meals = Meal.objects.filter(pk=instance.pk)
+    elif pk_set:
+        meals = Meal.objects.filter(pk__in=pk_set)  # from recipe.meal_set
+    else:
+        return
+    meals.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ServingSize)
+@receiver(post_delete, sender=ServingSize)
+def serving_size_changed(sender, instance, **kwargs):
+    FoodItem.objects.filter(pk=instance.food_id).touch()
+    # Other workers must not recompile from the rows committed before this
+    transaction.on_commit(bump_conversions_version)
+    refresh_ingredient_grams([instance.food_id])
+    schedule_recipe_nutrition_rebuild(list(recipe_ids_using_food(instance.food_id)))
+
+    catalog = _catalog_off_code(instance.food_id)
+    if catalog is not None:
+        bump_catalog_version()
+        invalidate_barcode(catalog[0])
+
+
+@receiver(post_save, sender=FoodUnitConversion)
+@receiver(post_delete, sender=FoodUnitConversion)
+def unit_conversion_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_conversions_version)
+    refresh_ingredient_grams([instance.food_id])
+    schedule_recipe_nutrition_rebuild(list(recipe_ids_using_food(instance.food_id)))
+
+
+@receiver(post_save, sender=NutritionProfile)
+@receiver(post_delete, sender=NutritionProfile)
+def nutrition_profile_changed(sender, instance, **kwargs):
+    FoodItem.objects.filter(pk=instance.food_item_id).touch()
+    FoodItem.objects.filter(pk=instance.food_item_id).refresh_price_per_gram_protein()
+    schedule_recipe_nutrition_rebuild(
+        list(recipe_ids_using_food(instance.food_item_id))
+    )
+
+    catalog = _catalog_off_code(instance.food_item_id)
+    if catalog is not None:
+        bump_autocomplete_version()
+        bump_catalog_version()
+        invalidate_barcode(catalog[0])
+
+
+@receiver(post_save, sender=FoodItem)
+def food_item_saved(sender, instance, created, **kwargs):
+    FoodItem.objects.filter(pk=instance.pk).refresh_price_per_gram_protein()
+    invalidate_barcode(instance.off_code)
+    if instance.user_id is None:
+        bump_catalog_version()
+        # New shared rows are picked up incrementally by the autocomplete index
+        if not created:
+            bump_autocomplete_version()
+    elif Recipe.objects.filter(
+        is_public=True, recipeingredient__food_item_id=instance.pk
+    ).exists():
+        bump_recipes_version()
+
+
+@receiver(post_delete, sender=FoodItem)
+def food_item_deleted(sender, instance, **kwargs):
+    invalidate_barcode(instance.off_code)
+    if instance.user_id is None:
+        bump_autocomplete_version()
+        bump_catalog_version()
@@ -0,0 +1,273 @@
+import io
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NUTRIENT_FIELDS, Recipe, RecipeIngredient, RecipeNutrition
+
+
+# ==============================
+# CONFIG
+# ==============================
+VERSION_CACHE_KEY = "foods:similarity:version"
+SNAPSHOT_CACHE_KEY = "foods:similarity:snapshot:{version}"
+PENDING_CACHE_KEY = "foods:similarity:pending"
+PENDING_TTL = 10 * 60
+
+# Weights of the two similarities in the score, summing to 1
+NUTRIENT_WEIGHT = 0.6
+INGREDIENT_WEIGHT = 0.4
+
+DEFAULT_K = 10
+MAX_K = 50
+
+# Rows changed this long before a refresh started are read again by the
+# next one, for transactions that committed after their updated_at
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+# ==============================
+# INDEX
+# ==============================
+def _load(recipe_ids=None):
+    """
+    (ids, totals, ingredient owners, ingredient foods) of public recipes
+    with stored nutrition, all of them or only the given ones.
+    """
+    nutrition = RecipeNutrition.objects.filter(recipe__is_public=True)
+    if recipe_ids is not None:
+        nutrition = nutrition.filter(recipe_id__in=list(recipe_ids))
+    rows = list(
+        nutrition.order_by("recipe_id").values_list("recipe_id", *NUTRIENT_FIELDS)
+    )
+    table = np.asarray(rows, dtype=np.float64).reshape(
+        len(rows), len(NUTRIENT_FIELDS) + 1
+    )
+    ids = table[:, 0].astype(np.int64)
+
+    links = np.asarray(
+        list(
+            RecipeIngredient.objects.filter(recipe_id__in=ids.tolist())
+            .values_list("recipe_id", "food_item_id")
+            .distinct()
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return ids, table[:, 1:], links[:, 0], links[:, 1]
+
+
+class SimilarityIndex:
+    """
+    Public recipes as compact arrays: recipe ids (sorted, the id map), their
+    nutrient totals scaled by the catalog means and normalized to unit rows
+    (float32), and their distinct ingredient foods as (owner, food) pairs.
+
+    similar() scores every recipe against one in a single vectorized pass:
+    the cosine of the nutrient profiles (proportions, not portion size)
+    plus the Jaccard overlap of their ingredient sets.
+    """
+
+    def __init__(
+        self, recipe_ids, totals, owners, foods, scale=None, built_at=None
+    ):
+        order = np.argsort(recipe_ids)
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int64)[order]
+        self.totals = np.asarray(totals, dtype=np.float32).reshape(
+            len(order), len(NUTRIENT_FIELDS)
+        )[order]
+        if scale is None:
+            scale = self.totals.mean(axis=0) if len(order) else np.ones(1)
+        scale = np.broadcast_to(scale, len(NUTRIENT_FIELDS))
+        self.scale = np.where(scale > 0, scale, 1).astype(np.float32)
+        self.profiles = self._profiles(self.totals)
+
+        self.owners = np.asarray(owners, dtype=np.int64)
+        self.foods = np.asarray(foods, dtype=np.int64)
+        self.rows = np.searchsorted(self.recipe_ids, self.owners)
+        self.counts = np.bincount(self.rows, minlength=len(self.recipe_ids))
+        self.built_at = built_at
+
+    def _profiles(self, totals):
+        scaled = totals / self.scale
+        norms = np.linalg.norm(scaled, axis=1, keepdims=True)
+        return scaled / np.where(norms > 0, norms, 1)
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    @classmethod
+    def build(cls, built_at=None):
+        return cls(*_load(), built_at=built_at)
+
+    def updated(self, changed_ids, public_ids, built_at=None):
+        """
+        New index with the changed recipes reloaded and the ones no longer
+        public (deleted or made private) dropped. Scales are kept, so the
+        untouched rows stay valid without being recomputed.
+        """
+        changed = np.asarray(sorted(changed_ids), dtype=np.int64)
+        public = np.asarray(sorted(public_ids), dtype=np.int64)
+        keep = np.isin(self.recipe_ids, public) & ~np.isin(self.recipe_ids, changed)
+        keep_links = keep[self.rows]
+
+        ids, totals, owners, foods = _load(changed.tolist())
+        return SimilarityIndex(
+            np.concatenate([self.recipe_ids[keep], ids]),
+            np.concatenate([self.totals[keep], totals.astype(np.float32)]),
+            np.concatenate([self.owners[keep_links], owners]),
+            np.concatenate([self.foods[keep_links], foods]),
+            scale=self.scale,
+            built_at=built_at,
+        )
+
+    def query_vector(self, recipe_id):
+        """(unit profile, ingredient foods) of a recipe, indexed or not."""
+        row = np.searchsorted(self.recipe_ids, recipe_id)
+        if row < len(self.recipe_ids) and self.recipe_ids[row] == recipe_id:
+            return self.profiles[row], self.foods[self.rows == row]
+
+        # Private or not indexed yet: two small queries for this recipe only
+        totals = RecipeNutrition.objects.filter(recipe_id=recipe_id).values_list(
+            *NUTRIENT_FIELDS
+        )
+        totals = np.asarray(
+            list(totals) or [[0.0] * len(NUTRIENT_FIELDS)], dtype=np.float32
+        )
+        foods = RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            "food_item_id", flat=True
+        )
+        foods = np.unique(np.asarray(list(foods), dtype=np.int64))
+        return self._profiles(totals)[0], foods
+
+    def similar(self, recipe_id, k=DEFAULT_K):
+        """[(recipe id, score)] of the k most similar indexed recipes, best first."""
+        if not len(self):
+            return []
+        profile, foods = self.query_vector(recipe_id)
+
+        nutrient = self.profiles @ profile
+        shared = np.bincount(
+            self.rows[np.isin(self.foods, foods)], minlength=len(self)
+        )
+        union = self.counts + len(foods) - shared
+        overlap = np.divide(
+            shared, union, out=np.zeros(len(self), dtype=np.float64), where=union > 0
+        )
+        scores = NUTRIENT_WEIGHT * nutrient + INGREDIENT_WEIGHT * overlap
+        # Nothing in common is no recommendation
+        scores[(scores <= 0) | (self.recipe_ids == recipe_id)] = -np.inf
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.recipe_ids[i]), float(scores[i])) for i in top]
+
+    # Snapshots are shared between processes through the cache
+    def dumps(self):
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            recipe_ids=self.recipe_ids,
+            totals=self.totals,
+            owners=self.owners,
+            foods=self.foods,
+            scale=self.scale,
+            built_at=self.built_at.timestamp() if self.built_at else np.nan,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def loads(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        built_at = float(arrays["built_at"])
+        return cls(
+            arrays["recipe_ids"],
+            arrays["totals"],
+            arrays["owners"],
+            arrays["foods"],
+            scale=arrays["scale"],
+            built_at=(
+                None
+                if np.isnan(built_at)
+                else datetime.fromtimestamp(built_at, tz=dt_timezone.utc)
+            ),
+        )
+
+
+class _Holder:
+    """This process' copy of the current snapshot."""
+
+    def __init__(self):
+        self.version = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = cache.get(VERSION_CACHE_KEY)
+        if version is None:
+            return None  # never built, or the cache was flushed
+        if version == self.version:
+            return self.index
+        data = cache.get(SNAPSHOT_CACHE_KEY.format(version=version))
+        if data is None:
+            return self.index  # replaced meanwhile, keep the one we have
+        index = SimilarityIndex.loads(data)
+        with self.lock:
+            self.index, self.version = index, version
+        return index
+
+
+_holder = _Holder()
+
+
+def get_similarity_index():
+    """The latest built index, or None before the first build."""
+    return _holder.get()
+
+
+# ==============================
+# BUILDS (Celery, see foods.tasks)
+# ==============================
+def refresh_similarity_index(full=False):
+    """
+    Bring the shared index up to date: a full build the first time (or
+    when full), otherwise only the recipes whose row or stored nutrition
+    changed since the last build are reloaded. Returns the index.
+    """
+    started = timezone.now()
+    version = cache.get(VERSION_CACHE_KEY)
+    data = None
+    if not full and version is not None:
+        data = cache.get(SNAPSHOT_CACHE_KEY.format(version=version))
+
+    if data is None:
+        index = SimilarityIndex.build(built_at=started)
+    else:
+        current = SimilarityIndex.loads(data)
+        since = current.built_at - WATERMARK_OVERLAP
+        changed = set(
+            Recipe.objects.filter(
+                Q(updated_at__gte=since) | Q(nutrition__updated_at__gte=since)
+            ).values_list("pk", flat=True)
+        )
+        public = set(
+            Recipe.objects.filter(is_public=True).values_list("pk", flat=True)
+        )
+        if not changed and set(current.recipe_ids.tolist()) <= public:
+            return current
+        index = current.updated(changed, public, built_at=started)
+
+    new_version = uuid.uuid4().hex
+    cache.set(SNAPSHOT_CACHE_KEY.format(version=new_version), index.dumps(), None)
+    cache.set(VERSION_CACHE_KEY, new_version, None)
+    if version is not None:
+        cache.delete(SNAPSHOT_CACHE_KEY.format(version=version))
+    cache.delete(PENDING_CACHE_KEY)
+    return index
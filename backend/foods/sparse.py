@@ -0,0 +1,138 @@
+from rest_framework import serializers
+
+
+# ==============================
+# FIELDSETS
+# ==============================
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _split(value):
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+class SparseFieldset:
+    """
+    ?fields= and ?expand= of one request.
+
+    fields lists dotted paths ("name,nutrition.calories,ingredients.quantity");
+    a bare nested name keeps that whole object. Once either parameter is
+    present, the relations serializers mark as expandable render as their
+    primary key unless their path is listed in expand
+    ("ingredients.food_item"). Without either parameter nothing changes.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.tree = None
+        if fields:
+            self.tree = {}
+            for path in _split(fields):
+                node = self.tree
+                for name in path.split("."):
+                    node = node.setdefault(name, {})
+        self.expand = set(_split(expand))
+        self.active = fields is not None or expand is not None
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        return cls(params.get(FIELDS_PARAM), params.get(EXPAND_PARAM))
+
+    def fields_at(self, path):
+        """Field names wanted at path (a list of names), or None for all."""
+        node = self.tree
+        for name in path:
+            if not node:  # no ?fields=, or a bare name above this path
+                return None
+            node = node.get(name)
+            if node is None:
+                return set()
+        return set(node) if node else None
+
+    def wants(self, path):
+        """Is the field at dotted path rendered at all?"""
+        path = path.split(".")
+        for i, name in enumerate(path):
+            wanted = self.fields_at(path[:i])
+            if wanted is not None and name not in wanted:
+                return False
+        return True
+
+    def expanded(self, path):
+        """
+        Is the expandable relation at dotted path rendered in full? It is
+        when expanded, or when ?fields= picks fields inside it.
+        """
+        if not self.wants(path):
+            return False
+        return (
+            not self.active
+            or path in self.expand
+            or self.fields_at(path.split(".")) is not None
+        )
+
+
+# ==============================
+# SERIALIZERS
+# ==============================
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin applying the request's SparseFieldset (passed in
+    the context as "sparse") at whatever depth the serializer is nested.
+
+    Meta.expandable_fields names nested serializers that collapse to
+    primary keys unless expanded.
+    """
+
+    def _sparse_path(self):
+        names, node = [], self
+        while node.parent is not None:
+            if node.field_name:  # ListSerializer children are bound as ""
+                names.append(node.field_name)
+            node = node.parent
+        return names[::-1]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse = self.context.get("sparse")
+        if sparse is None or not sparse.active:
+            return fields
+
+        path = self._sparse_path()
+        wanted = sparse.fields_at(path)
+        if wanted is not None:
+            fields = {name: field for name, field in fields.items() if name in wanted}
+
+        for name in getattr(self.Meta, "expandable_fields", ()):
+            field = fields.get(name)
+            if field is None or sparse.expanded(".".join([*path, name])):
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            fields[name] = serializers.PrimaryKeyRelatedField(
+                read_only=True, many=many, source=field.source
+            )
+        return fields
+
+
+# ==============================
+# VIEWS
+# ==============================
+class SparseFieldsViewMixin:
+    """
+    Puts the request's SparseFieldset in the serializer context and on the
+    view (self.sparse), so get_queryset() can skip the joins and prefetches
+    of fields nobody asked for.
+    """
+
+    @property
+    def sparse(self):
+        if not hasattr(self, "_sparse"):
+            self._sparse = SparseFieldset.from_request(self.request)
+        return self._sparse
+
+    def wants(self, *paths):
+        return any(self.sparse.wants(path) for path in paths)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), "sparse": self.sparse}
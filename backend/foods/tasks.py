@@ -0,0 +1,47 @@
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+
+from .diet_optimizer import (
+    PENDING_CACHE_KEY,
+    DietProblem,
+    DietOptimizerError,
+    solve_cached,
+)
+from .similarity import refresh_similarity_index
+
+
+User = get_user_model()
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(ConnectionError,),
+    retry_kwargs={"max_retries": 3, "countdown": 30},
+)
+def optimize_budget_diet(self, user_id, budget, digest):
+    """
+    Solve a large catalog problem in the background. The result is cached
+    under the input digest, so repeating the request picks it up.
+    """
+    try:
+        user = User.objects.get(id=user_id)
+        problem = DietProblem.for_user(user, budget)
+        solve_cached(problem)
+    except (ObjectDoesNotExist, DietOptimizerError):
+        return
+    finally:
+        cache.delete(PENDING_CACHE_KEY.format(digest=digest))
+
+
+@shared_task(
+    autoretry_for=(ConnectionError,),
+    retry_kwargs={"max_retries": 3, "countdown": 30},
+)
+def refresh_recipe_similarity(full=False):
+    """
+    Incremental refresh of the shared recipe similarity index, scheduled by
+    celery beat (CELERY_BEAT_SCHEDULE); a nightly full build rescales it.
+    """
+    refresh_similarity_index(full=full)
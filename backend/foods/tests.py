@@ -1,9 +1,66 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.urls import reverse
+from unittest import mock
 from django.contrib.auth import get_user_model
-from .models import FoodItem, Recipe, Meal, RecipeIngredient, MealIngredient
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from backend.renderers import FastJSONRenderer
+from .models import (
+    INDEXED_NUTRIENT_FIELDS,
+    NUTRIENT_FIELDS,
+    FoodItem,
+    FoodUnitConversion,
+    NutritionProfile,
+    OffImportCheckpoint,
+    ServingSize,
+    Recipe,
+    RecipeNutrition,
+    Meal,
+    RecipeIngredient,
+    RecipeInstruction,
+    MealIngredient,
+)
+from profiles.models import MealLog, UserProfile, UserHealthData
+from profiles.views import UserMealLogListView
+from .autocomplete import AutocompleteIndex
+from .conversions import VERSION_CACHE_KEY as CONVERSIONS_VERSION_KEY
+from .conversions import normalize_unit, to_grams
+from .dedupe import find_clusters, merge_clusters
+from .diet_optimizer import load_candidates
+from .export import export_foods, export_queryset
+from .filters import NutrientRangeFilter
+from .management.commands.import_off_egypt import Command as ImportOffEgyptCommand
+from .normalization import build_search_key
+from .nutrient_matrix import recipe_totals, meal_totals
+from .servings import metric_equivalent, parse_serving
+from .similarity import (
+    _load as similarity_load,
+    SimilarityIndex,
+    get_similarity_index,
+    refresh_similarity_index,
+)
+from .sparse import SparseFieldset
+from .views import FoodItemListView, RecipeListView
+from .services import compute_recipe_nutrition, rebuild_recipe_nutrition
 
 User = get_user_model()
 
@@ -91,3 +148,1820 @@ class MealTests(APITestCase):
         response = self.client.post(url, payload, format="json")
         self.assertEqual(response.status_code, 201)
         self.assertEqual(Meal.objects.filter(user=self.user).count(), 2)
+
+
+class RecipeNutritionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="nutrition@example.com", password="pass1234"
+        )
+        self.food = FoodItem.objects.create(name="Oats", price=3)
+        NutritionProfile.objects.create(
+            food_item=self.food, calories=380, protein=13, carbohydrates=67, fats=7
+        )
+        ServingSize.objects.create(
+            food=self.food, description="Per 100 g", quantity=100, unit="g"
+        )
+        self.recipe = Recipe.objects.create(name="Porridge", user=self.user)
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_totals_rebuilt_on_ingredient_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = RecipeIngredient.objects.create(
+                recipe=self.recipe, food_item=self.food, quantity=50, unit="g"
+            )
+
+        nutrition = RecipeNutrition.objects.get(recipe=self.recipe)
+        self.assertAlmostEqual(nutrition.calories, 190)
+        self.assertAlmostEqual(nutrition.protein, 6.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.delete()
+
+        nutrition.refresh_from_db()
+        self.assertEqual(nutrition.calories, 0)
+
+    def test_totals_rebuilt_on_nutrition_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, food_item=self.food, quantity=200, unit="g"
+            )
+            self.food.nutrition.fats = 10
+            self.food.nutrition.save()
+
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.recipe).fats, 20)
+
+    def test_recipe_detail_reads_stored_totals(self):
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.food, quantity=100, unit="g"
+        )
+        rebuild_recipe_nutrition([self.recipe.id])
+
+        url = reverse("recipe-detail", args=[self.recipe.slug])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["calories"], 380)
+        self.assertEqual(response.data["nutrition"]["carbohydrates"], 67)
+
+
+class MealNutritionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="meals@example.com", password="pass1234"
+        )
+        self.rice = FoodItem.objects.create(name="Rice", price=4)
+        NutritionProfile.objects.create(
+            food_item=self.rice, calories=130, protein=2.7, carbohydrates=28, fats=0.3
+        )
+        ServingSize.objects.create(
+            food=self.rice, description="Per 100 g", quantity=100, unit="g"
+        )
+        self.recipe = Recipe.objects.create(name="Rice Bowl", user=self.user)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.rice, quantity=200, unit="g"
+        )
+        rebuild_recipe_nutrition([self.recipe.id])
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def _create_meal(self, name):
+        meal = Meal.objects.create(user=self.user, name=name, meal_type="lunch")
+        meal.recipes.set([self.recipe])
+        MealIngredient.objects.create(
+            meal=meal, food_item=self.rice, quantity=50, unit="g"
+        )
+        return meal
+
+    def test_with_nutrition_annotates_totals(self):
+        meal = self._create_meal("Lunch")
+
+        annotated = Meal.objects.with_nutrition().get(pk=meal.pk)
+        self.assertAlmostEqual(annotated.total_calories, 325)
+        self.assertAlmostEqual(annotated.total_carbohydrates, 70)
+
+    def test_meal_list_query_count_is_constant(self):
+        self._create_meal("Lunch 1")
+        url = reverse("meal-list")
+
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(url)
+
+        for i in range(2, 6):
+            self._create_meal(f"Lunch {i}")
+
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertEqual(response.data["results"][0]["calories"], 325)
+        self.assertEqual(len(many), len(single))
+
+
+class NutrientMatrixTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="matrix@example.com", password="pass1234"
+        )
+        self.lentils = FoodItem.objects.create(name="Lentils", price=5)
+        NutritionProfile.objects.create(
+            food_item=self.lentils, calories=116, protein=9, carbohydrates=20, iron=3.3
+        )
+        ServingSize.objects.create(
+            food=self.lentils, description="Per 100 g", quantity=100, unit="g"
+        )
+        self.lemon = FoodItem.objects.create(name="Lemon", price=1)
+        NutritionProfile.objects.create(food_item=self.lemon, vitamin_c=53)
+
+        self.recipe = Recipe.objects.create(name="Koshari", user=self.user)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.lentils, quantity=150, unit="g"
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.lemon, quantity=0.5, unit="piece"
+        )
+
+    def test_recipe_totals_match_sql(self):
+        totals = recipe_totals([self.recipe.id])[self.recipe.id]
+        expected = compute_recipe_nutrition([self.recipe.id])[self.recipe.id]
+
+        for field in NUTRIENT_FIELDS:
+            self.assertAlmostEqual(totals[field], expected[field], places=3)
+        self.assertAlmostEqual(totals["vitamin_c"], 26.5, places=3)
+
+    def test_meal_totals_include_recipes(self):
+        meal = Meal.objects.create(user=self.user, name="Dinner", meal_type="dinner")
+        meal.recipes.set([self.recipe])
+        MealIngredient.objects.create(
+            meal=meal, food_item=self.lentils, quantity=50, unit="g"
+        )
+        rebuild_recipe_nutrition([self.recipe.id])
+
+        totals = meal_totals([meal.id])[meal.id]
+        annotated = Meal.objects.with_nutrition().get(pk=meal.pk)
+
+        self.assertAlmostEqual(totals["calories"], 232, places=3)
+        self.assertAlmostEqual(totals["iron"], annotated.total_iron, places=3)
+
+
+class FoodSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="search@example.com", password="pass1234"
+        )
+        self.other = User.objects.create_user(
+            email="other@example.com", password="pass1234"
+        )
+        FoodItem.objects.create(name="Banana chips", price=1)
+        FoodItem.objects.create(name="Banana", price=2)
+        FoodItem.objects.create(name="Chicken breast", price=3)
+        FoodItem.objects.create(name="Banana bread", user=self.other, price=4)
+        cache.clear()
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def _search(self, term):
+        response = self.client.get(reverse("food-list"), {"search": term})
+        self.assertEqual(response.status_code, 200)
+        return [item["name"] for item in response.data["results"]]
+
+    def test_search_ranks_exact_match_first(self):
+        names = self._search("banana")
+        self.assertEqual(names[0], "Banana")
+        self.assertCountEqual(names, ["Banana", "Banana chips"])
+
+    def test_search_is_typo_tolerant(self):
+        self.assertIn("Chicken breast", self._search("chickn"))
+
+    def test_search_hides_other_users_foods(self):
+        self.assertNotIn("Banana bread", self._search("bread"))
+
+    def test_search_paginates_by_cursor(self):
+        response = self.client.get(
+            reverse("food-list"), {"search": "banana", "page_size": 1}
+        )
+        self.assertEqual(len(response.data["results"]), 1)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Banana chips"]
+        )
+
+
+class SearchKeyTests(SimpleTestCase):
+    def test_arabic_and_latin_spellings_share_a_key(self):
+        keys = {build_search_key(name) for name in ["فول", "فُولٌ", "Foul", "ful"]}
+        self.assertEqual(keys, {"fl"})
+
+    def test_arabic_letter_variants_are_unified(self):
+        self.assertEqual(build_search_key("أرز"), build_search_key("إرز"))
+        self.assertEqual(build_search_key("طعمية"), build_search_key("Taameya"))
+
+    def test_numbers_are_split_from_units(self):
+        self.assertEqual(build_search_key("Pepsi 330ml"), "bs 330 ml")
+
+
+class ArabicFoodSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="arabic@example.com", password="pass1234"
+        )
+        self.foul = FoodItem.objects.create(name="Foul Medames", price=1)
+        FoodItem.objects.create(name="فول مدمس بالزيت", price=2)
+        FoodItem.objects.create(name="Falafel", price=3)
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_search_key_is_stored_on_save(self):
+        self.foul.refresh_from_db()
+        self.assertEqual(self.foul.search_key, "fl mdms")
+
+    def test_search_matches_across_scripts(self):
+        for term in ["فول", "foul", "ful"]:
+            response = self.client.get(reverse("food-list"), {"search": term})
+            names = {item["name"] for item in response.data["results"]}
+            self.assertEqual(names, {"Foul Medames", "فول مدمس بالزيت"}, term)
+
+
+class FoodAutocompleteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="autocomplete@example.com", password="pass1234"
+        )
+        self.other = User.objects.create_user(
+            email="someone@example.com", password="pass1234"
+        )
+        self.tahini = FoodItem.objects.create(name="Tahini", price=1)
+        NutritionProfile.objects.create(food_item=self.tahini, calories=595)
+        FoodItem.objects.create(name="Halawa with Tahini", price=2)
+        FoodItem.objects.create(name="Tamr", price=3)
+        FoodItem.objects.create(name="Tahini cookies", user=self.other, price=4)
+        FoodItem.objects.create(name="Tahini sauce", user=self.user, price=5)
+
+        cache.clear()
+        # Synchronous rebuilds: a thread would not see the test's transaction
+        patcher = mock.patch(
+            "foods.autocomplete._index", AutocompleteIndex(background=False)
+        )
+        self.index = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def _names(self, q):
+        response = self.client.get(reverse("food-autocomplete"), {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [item["name"] for item in response.data["results"]]
+
+    def test_prefix_matches_any_word_and_respects_visibility(self):
+        self.assertEqual(
+            self._names("tah"), ["Tahini sauce", "Tahini", "Halawa with Tahini"]
+        )
+
+    def test_returns_kcal(self):
+        response = self.client.get(reverse("food-autocomplete"), {"q": "tahini"})
+        shared = [r for r in response.data["results"] if r["id"] == self.tahini.id]
+        self.assertEqual(shared[0]["kcal"], 595)
+
+    def test_new_rows_are_added_incrementally(self):
+        self._names("ta")
+        FoodItem.objects.create(name="Tabbouleh", price=6)
+
+        self.index.refresh(force=True)
+        self.assertIn("Tabbouleh", self._names("tab"))
+
+    def test_renamed_rows_trigger_rebuild(self):
+        self._names("ta")
+        self.tahini.name = "Sesame paste"
+        self.tahini.save()
+
+        self.index.refresh(force=True)
+        self.assertIn("Sesame paste", self._names("sesame"))
+        self.assertNotIn("Tahini", self._names("tahini"))
+
+    def test_own_foods_match_any_word(self):
+        FoodItem.objects.create(name="Skim milk", price=7)
+        FoodItem.objects.create(name="Oat milk", user=self.user, price=8)
+        self.assertEqual(self._names("milk"), ["Oat milk", "Skim milk"])
+
+    def test_rebuild_runs_in_the_background(self):
+        index = AutocompleteIndex()
+        index.refresh(force=True)
+        self.tahini.name = "Sesame paste"
+        self.tahini.save()
+
+        with mock.patch("foods.autocomplete.threading.Thread") as thread:
+            index.refresh(force=True)
+        # The old index keeps serving until the new one is swapped in
+        self.assertEqual([r["name"] for r in index.search("tahini")][0], "Tahini")
+
+        target, args = thread.call_args.kwargs["target"], thread.call_args.kwargs["args"]
+        with mock.patch("foods.autocomplete.connection"):
+            target(*args)
+        self.assertEqual(index.search("sesame")[0]["name"], "Sesame paste")
+        self.assertNotIn("Tahini", [r["name"] for r in index.search("tahini")])
+
+    def test_new_rows_are_merged_into_a_new_list(self):
+        self._names("ta")
+        entries = self.index.entries
+        count = len(entries)
+        FoodItem.objects.bulk_create(
+            FoodItem(name=f"Tamarind {i:03}", price=1) for i in range(150)
+        )
+        self.index.refresh(force=True)
+        # Readers of the old list never see it change
+        self.assertEqual(len(entries), count)
+        self.assertEqual(self.index.entries, sorted(self.index.entries))
+        self.assertEqual(self._names("tamarind 00")[0], "Tamarind 000")
+
+    @mock.patch("foods.autocomplete.SNAPSHOT_CHUNK_ROWS", 2)
+    def test_snapshot_is_shared_in_chunks(self):
+        self._names("ta")
+        fresh = AutocompleteIndex()
+        with self.assertNumQueries(0):
+            fresh.refresh(force=True)
+        self.assertEqual(fresh.entries, self.index.entries)
+
+
+class FoodBarcodeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="scanner@example.com", password="pass1234"
+        )
+        self.food = FoodItem.objects.create(
+            name="Juhayna Milk", off_code="6223000000011", price=1
+        )
+        NutritionProfile.objects.create(food_item=self.food, calories=62, protein=3)
+        cache.clear()
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_lookup_is_read_through_cached(self):
+        url = reverse("food-barcode", args=["6223000000011"])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["nutrition"]["calories"], 62)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(
+            [q for q in queries if "foods_fooditem" in q["sql"]], queries.captured_queries
+        )
+
+    def test_unknown_code_is_negatively_cached(self):
+        url = reverse("food-barcode", args=["0000"])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse([q for q in queries if "foods_fooditem" in q["sql"]])
+
+    def test_cache_is_invalidated_on_change(self):
+        url = reverse("food-barcode", args=["6223000000011"])
+        self.client.get(url)
+
+        self.food.nutrition.calories = 70
+        self.food.nutrition.save()
+
+        self.assertEqual(self.client.get(url).data["nutrition"]["calories"], 70)
+
+    def test_batch_lookup(self):
+        response = self.client.get(
+            reverse("food-barcode-batch"), {"codes": "6223000000011,0000"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"]["6223000000011"]["name"], "Juhayna Milk")
+        self.assertIsNone(response.data["results"]["0000"])
+
+
+class ProteinValueRankingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="saver@example.com", password="pass1234"
+        )
+        self.other = User.objects.create_user(
+            email="other@example.com", password="pass1234"
+        )
+
+        def food(name, price, protein, protein_type="other", **kwargs):
+            item = FoodItem.objects.create(
+                name=name, price=price, price_quantity=1000, **kwargs
+            )
+            NutritionProfile.objects.create(
+                food_item=item, protein=protein, protein_type=protein_type
+            )
+            return item
+
+        # EGP per gram of protein: lentils 0.2, chicken 0.5, beef 1.6
+        self.lentils = food("Lentils", 50, 25, "plant")
+        self.chicken = food("Chicken Breast", 155, 31, "animal")
+        self.beef = food("Beef", 416, 26, "animal")
+        self.water = food("Water", 5, 0)
+        self.private = food("Other's Tuna", 10, 25, "animal", user=self.other)
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_value_is_stored_in_sql(self):
+        self.lentils.refresh_from_db()
+        self.assertAlmostEqual(self.lentils.price_per_gram_protein, 0.2)
+        self.water.refresh_from_db()
+        self.assertIsNone(self.water.price_per_gram_protein)
+
+    def test_value_follows_nutrition_and_price_changes(self):
+        self.beef.nutrition.protein = 52
+        self.beef.nutrition.save()
+        self.beef.refresh_from_db()
+        self.assertAlmostEqual(self.beef.price_per_gram_protein, 0.8)
+
+        self.beef.price_unit = FoodItem.PriceUnit.PIECE
+        self.beef.save()
+        self.beef.refresh_from_db()
+        self.assertIsNone(self.beef.price_per_gram_protein)
+
+    def test_ranking_orders_cheapest_protein_first(self):
+        response = self.client.get(reverse("food-ranking-protein-value"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["name"] for row in response.data["results"]],
+            ["Lentils", "Chicken Breast", "Beef"],
+        )
+        self.assertAlmostEqual(
+            response.data["results"][0]["price_per_gram_protein"], 0.2
+        )
+
+    def test_ranking_filters_by_protein_type_and_paginates(self):
+        url = reverse("food-ranking-protein-value")
+        response = self.client.get(url, {"protein_type": "animal", "page_size": 1})
+        self.assertEqual(
+            [row["name"] for row in response.data["results"]], ["Chicken Breast"]
+        )
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([row["name"] for row in response.data["results"]], ["Beef"])
+
+
+class BudgetDietOptimizerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="budget@example.com", password="pass1234"
+        )
+        # Profile and health data rows are created by accounts.signals
+        UserProfile.objects.filter(user=self.user).update(preferred_currency="EGP")
+        UserHealthData.objects.filter(user=self.user).update(
+            target_macros={"calories": 2000, "protein_g": 100, "fats_g": 60}
+        )
+
+        def food(name, price, **nutrition):
+            item = FoodItem.objects.create(name=name, price=price, price_quantity=1000)
+            NutritionProfile.objects.create(food_item=item, **nutrition)
+
+        # Prices per kg
+        food("Lentils", 50, calories=350, protein=25, carbohydrates=60, fats=1)
+        food("Rice", 40, calories=360, protein=7, carbohydrates=80, fats=1)
+        food("Peanuts", 120, calories=570, protein=26, carbohydrates=16, fats=49)
+        food("Beef", 450, calories=250, protein=26, fats=15)
+        cache.clear()
+
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+
+    def test_cheapest_plan_meets_targets(self):
+        response = self.client.post(
+            reverse("food-budget-optimizer"), {"budget": 100}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "optimal")
+        self.assertEqual(response.data["currency"], "EGP")
+        self.assertLessEqual(response.data["cost"], 100)
+
+        totals = response.data["totals"]
+        self.assertGreaterEqual(totals["protein"], 90 - 0.1)
+        self.assertAlmostEqual(totals["calories"], 2000, delta=200.1)
+        self.assertNotIn("Beef", [item["name"] for item in response.data["items"]])
+
+    def test_candidates_cover_every_target(self):
+        sugar = FoodItem.objects.create(name="Sugar", price=30, price_quantity=1000)
+        NutritionProfile.objects.create(
+            food_item=sugar, calories=400, carbohydrates=100
+        )
+        eggs = FoodItem.objects.create(
+            name="Eggs", price=5, price_quantity=1, price_unit="piece"
+        )
+        NutritionProfile.objects.create(food_item=eggs, calories=155, protein=13)
+        FoodUnitConversion.objects.create(food=eggs, unit="piece", grams=60)
+        loaf = FoodItem.objects.create(
+            name="Loaf", price=10, price_quantity=1, price_unit="piece"
+        )
+        NutritionProfile.objects.create(food_item=loaf, calories=250, protein=8)
+
+        candidates = {
+            row[1]: row
+            for row in load_candidates(
+                self.user, {"protein": 100, "carbohydrates": 250}, limit=4
+            )
+        }
+        # Two per target: no protein in sugar, no known weight for a loaf
+        self.assertEqual(set(candidates), {"Lentils", "Peanuts", "Sugar", "Rice"})
+
+        candidates = load_candidates(self.user, {"protein": 100})
+        self.assertIn((eggs.pk, "Eggs", 5.0, 60.0), [row[:4] for row in candidates])
+        self.assertNotIn("Loaf", [row[1] for row in candidates])
+
+    def test_budget_too_small_is_infeasible(self):
+        response = self.client.post(
+            reverse("food-budget-optimizer"), {"budget": 5}, format="json"
+        )
+        self.assertEqual(response.data["status"], "infeasible")
+        self.assertEqual(response.data["items"], [])
+
+    def test_result_is_cached_by_input(self):
+        url = reverse("food-budget-optimizer")
+        self.client.post(url, {"budget": 100}, format="json")
+        with mock.patch("foods.diet_optimizer.linprog") as solver:
+            self.client.post(url, {"budget": 100}, format="json")
+        solver.assert_not_called()
+
+    def test_large_catalog_goes_to_celery(self):
+        with mock.patch("foods.diet_optimizer.MAX_SYNC_CANDIDATES", 2), mock.patch(
+            "foods.views.optimize_budget_diet.delay"
+        ) as delay:
+            response = self.client.post(
+                reverse("food-budget-optimizer"), {"budget": 100}, format="json"
+            )
+        self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with(self.user.id, 100.0, response.data["key"])
+
+    def test_requires_targets(self):
+        self.user.health_data.target_macros = {}
+        self.user.health_data.save()
+        response = self.client.post(
+            reverse("food-budget-optimizer"), {"budget": 100}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportOffEgyptTests(APITestCase):
+    COLUMNS = [
+        "code",
+        "product_name",
+        "countries_tags",
+        "countries_en",
+        "energy-kcal_100g",
+        "proteins_100g",
+        "carbohydrates_100g",
+        "fat_100g",
+        "serving_size",
+        "serving_quantity",
+    ]
+    ROWS = [
+        ["6221000000010", "Foul Medames", "en:egypt", "Egypt", "110", "7", "13", "3",
+         "1 can (400 g)", "400"],
+        ["3017620422003", "Nutella", "en:france", "France", "539", "6.3", "57", "31",
+         "15 g", "15"],
+        ["6281000000020", "Labneh\\Tab", "en:saudi-arabia", "", "160", "6", "4", "13",
+         "100 g", "100"],
+        ["6221000000010", "Duplicate Foul", "en:egypt", "Egypt", "1", "1", "1", "1",
+         "", ""],
+        ["6221000000030", "", "en:egypt", "Egypt", "50", "1", "1", "1", "", ""],
+        ["6221000000040", "Baladi Bread", "", "Egypt", "", "", "", "", "1 loaf", "90"],
+    ]
+
+    def _dump(self, rows=None, gz=True):
+        lines = ["\t".join(self.COLUMNS)] + [
+            "\t".join(row) for row in (rows or self.ROWS)
+        ]
+        data = ("\n".join(lines) + "\n").encode()
+        suffix = ".tsv.gz" if gz else ".tsv"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            f.write(gzip.compress(data) if gz else data)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def _import(self, path, **opts):
+        call_command("import_off_egypt", path=path, stdout=io.StringIO(), **opts)
+
+    def test_imports_mena_rows_from_gzip(self):
+        self._import(self._dump(), workers=1, create_serving=True)
+
+        self.assertEqual(
+            sorted(FoodItem.objects.values_list("name", flat=True)),
+            ["Baladi Bread", "Foul Medames", "Labneh\\Tab"],
+        )
+        foul = FoodItem.objects.get(off_code="6221000000010")
+        self.assertEqual(foul.search_key, build_search_key("Foul Medames"))
+        self.assertEqual(foul.nutrition.protein, 7)
+
+        fields = ("description", "quantity", "unit", "metric_quantity", "metric_unit")
+        servings = {
+            f.name: list(f.serving_size.order_by("pk").values_list(*fields))
+            for f in FoodItem.objects.all()
+        }
+        self.assertEqual(
+            servings["Foul Medames"],
+            [
+                ("Per 100 g", 100, "g", 100, "g"),
+                ("1 can (400 g)", 1, "can", 400, "g"),
+            ],
+        )
+        self.assertEqual(
+            servings["Baladi Bread"],
+            [("Per 100 g", 100, "g", 100, "g"), ("1 loaf", 1, "loaf", 90, "g")],
+        )
+        # "100 g" is the basis row already
+        self.assertEqual(len(servings["Labneh\\Tab"]), 1)
+
+    def test_process_pool_and_small_chunks(self):
+        self._import(self._dump(gz=False), workers=2, chunk_size=16, batch=1)
+        self.assertEqual(FoodItem.objects.count(), 3)
+        self.assertEqual(NutritionProfile.objects.count(), 3)
+
+    def test_require_nutrition_and_limit(self):
+        self._import(self._dump(), workers=1, require_nutrition=True)
+        self.assertFalse(FoodItem.objects.filter(name="Baladi Bread").exists())
+
+        FoodItem.objects.all().delete()
+        self._import(self._dump(), workers=1, limit=2)
+        self.assertEqual(
+            list(FoodItem.objects.values_list("name", flat=True)), ["Foul Medames"]
+        )
+
+    def test_rerun_keeps_existing_rows(self):
+        path = self._dump()
+        self._import(path, workers=1, create_serving=True)
+        with CaptureQueriesContext(connection) as queries:
+            self._import(path, workers=1, create_serving=True)
+        self.assertEqual(FoodItem.objects.count(), 3)
+        self.assertEqual(ServingSize.objects.count(), 5)
+        # Nothing changed, so nothing is rewritten
+        self.assertFalse(
+            [q for q in queries if '"price_per_gram_protein" =' in q["sql"]]
+        )
+
+    def test_delta_updates_only_changed_products(self):
+        self._import(self._dump(), workers=1)
+        foul = FoodItem.objects.get(off_code="6221000000010")
+        labneh_hash = FoodItem.objects.get(off_code="6281000000020").off_hash
+        self.assertTrue(labneh_hash)
+
+        rows = [list(row) for row in self.ROWS]
+        rows[0][5] = "8"  # corrected protein for Foul Medames
+        path = self._dump(rows)
+
+        self._import(path, workers=1)
+        foul.nutrition.refresh_from_db()
+        self.assertEqual(foul.nutrition.protein, 7)
+
+        FoodItem.objects.filter(pk=foul.pk).update(price=20, price_quantity=1000)
+        self._import(path, workers=1, delta=True)
+        foul.refresh_from_db()
+        self.assertEqual(foul.nutrition.protein, 8)
+        self.assertAlmostEqual(foul.price_per_gram_protein, 20 / 80)
+        self.assertEqual(
+            FoodItem.objects.get(off_code="6281000000020").off_hash, labneh_hash
+        )
+        self.assertEqual(FoodItem.objects.count(), 3)
+
+    def test_interrupted_import_resumes_at_checkpoint(self):
+        path = self._dump(gz=False)
+        flush = ImportOffEgyptCommand._flush
+        calls = []
+
+        def interrupted_flush(self, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return flush(self, *args, **kwargs)
+
+        with mock.patch.object(ImportOffEgyptCommand, "_flush", interrupted_flush):
+            with self.assertRaises(RuntimeError):
+                self._import(path, workers=1, chunk_size=16, batch=1)
+
+        self.assertEqual(FoodItem.objects.count(), 1)
+        checkpoint = OffImportCheckpoint.objects.get()
+        self.assertEqual(checkpoint.processed, 1)
+
+        out = io.StringIO()
+        call_command(
+            "import_off_egypt", path=path, workers=1, chunk_size=16, stdout=out
+        )
+        self.assertIn(f"Resuming at byte {checkpoint.offset}", out.getvalue())
+        self.assertEqual(FoodItem.objects.count(), 3)
+        self.assertFalse(OffImportCheckpoint.objects.exists())
+
+
+class ServingParserTests(SimpleTestCase):
+    def test_parses_common_serving_strings(self):
+        cases = {
+            ("30 g", None): ("30 g", 30, "g", 30, "g"),
+            ("1 cup (240 ml)", None): ("1 cup (240 ml)", 1, "cup", 240, "ml"),
+            ("2 pieces (45g)", None): ("2 pieces (45g)", 2, "pieces", 45, "g"),
+            ("1/2 cup", 120): ("1/2 cup", 0.5, "cup", 120, "g"),
+            ("1,5 l", None): ("1,5 l", 1.5, "l", 1500, "ml"),
+            ("", 25): ("25 g", 25, "g", 25, "g"),
+            ("1 bar", None): ("1 bar", 1, "bar", None, ""),
+        }
+        for (text, quantity), expected in cases.items():
+            self.assertEqual(parse_serving(text, quantity), expected, text)
+
+    def test_unusable_values(self):
+        self.assertIsNone(parse_serving("", None))
+        self.assertIsNone(parse_serving("0 g", None))
+
+    def test_metric_equivalent(self):
+        self.assertEqual(metric_equivalent(2, "kg"), (2000, "g"))
+        self.assertEqual(metric_equivalent(1, "slice"), (None, ""))
+
+
+class UnitConversionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="units@example.com", password="pass1234"
+        )
+        self.milk = FoodItem.objects.create(name="Milk", price=30)
+        NutritionProfile.objects.create(food_item=self.milk, calories=60, protein=3.2)
+        FoodUnitConversion.objects.create(food=self.milk, unit="ml", grams=1.03)
+
+        self.egg = FoodItem.objects.create(name="Egg", price=5)
+        NutritionProfile.objects.create(food_item=self.egg, calories=155, protein=13)
+        ServingSize.objects.create(
+            food=self.egg, description="1 egg (50 g)", quantity=1, unit="egg",
+            metric_quantity=50, metric_unit="g",
+        )
+        self.recipe = Recipe.objects.create(name="Omelette", user=self.user)
+
+    def test_normalize_unit(self):
+        cases = {
+            "Grams": "g",
+            "gr.": "g",
+            "KG": "kg",
+            "Cups": "cup",
+            "tablespoon": "tbsp",
+            "pcs": "piece",
+            "Slices": "slice",
+            "مل": "ml",
+        }
+        for unit, expected in cases.items():
+            self.assertEqual(normalize_unit(unit), expected, unit)
+
+    def test_to_grams_batch(self):
+        grams = to_grams(
+            [
+                (self.milk.id, 1, "cup"),  # household volume x density
+                (self.milk.id, 0.5, "l"),
+                (self.egg.id, 2, "eggs"),  # the food's own serving unit
+                (self.egg.id, 1, "serving"),
+                (self.egg.id, 0.25, "kg"),
+                (self.egg.id, 1, "handful"),  # unknown: one 100 g basis
+            ]
+        )
+        expected = [247.2, 515, 100, 50, 250, 100]
+        for value, want in zip(grams, expected):
+            self.assertAlmostEqual(value, want, places=3)
+
+    def test_table_is_cached_per_process(self):
+        to_grams([(self.milk.id, 1, "cup")])
+        with CaptureQueriesContext(connection) as queries:
+            to_grams([(self.milk.id, 2, "cup"), (self.milk.id, 1, "tbsp")])
+        self.assertEqual(len(queries), 0)
+
+    def test_table_is_bumped_on_commit_only(self):
+        to_grams([(self.egg.id, 1, "piece")])  # compiled without a piece weight
+        version = cache.get(CONVERSIONS_VERSION_KEY, 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            FoodUnitConversion.objects.create(food=self.egg, unit="piece", grams=60)
+        self.assertEqual(cache.get(CONVERSIONS_VERSION_KEY, 0), version)
+        # Not yet committed: the shared table keeps the committed rows
+        self.assertEqual(to_grams([(self.egg.id, 1, "piece")]), [100])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(to_grams([(self.egg.id, 1, "piece")]), [60])
+
+    def test_recipe_totals_use_converted_grams(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = RecipeIngredient.objects.create(
+                recipe=self.recipe, food_item=self.egg, quantity=2, unit="piece"
+            )
+        self.assertEqual(ingredient.grams, 200)  # no piece weight yet
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FoodUnitConversion.objects.create(food=self.egg, unit="piece", grams=60)
+
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.grams, 120)
+        self.assertAlmostEqual(
+            RecipeNutrition.objects.get(recipe=self.recipe).calories, 186
+        )
+        self.assertAlmostEqual(
+            recipe_totals([self.recipe.id])[self.recipe.id]["calories"], 186
+        )
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="etag@example.com", password="pass1234"
+        )
+        self.food = FoodItem.objects.create(name="Dates", price=40)
+        NutritionProfile.objects.create(food_item=self.food, calories=280, protein=2)
+        self.recipe = Recipe.objects.create(
+            name="Date Balls", user=self.user, is_public=True
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.food, quantity=200, unit="g"
+        )
+
+    def test_food_detail_not_modified_without_serializing(self):
+        url = reverse("food-detail", args=[self.food.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("s-maxage", response["Cache-Control"])
+        etag = response["ETag"]
+
+        # Only the version lookup runs: no food, nutrition or serving queries
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_private_food_is_not_shared_cacheable(self):
+        food = FoodItem.objects.create(name="My dates", user=self.user, price=40)
+        url = reverse("food-detail", args=[food.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotIn("s-maxage", response["Cache-Control"])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_nested_changes_move_the_food_version(self):
+        url = reverse("food-detail", args=[self.food.id])
+        etag = self.client.get(url)["ETag"]
+
+        ServingSize.objects.create(
+            food=self.food, description="1 date (8 g)", quantity=1, unit="date"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["serving_size"]), 1)
+
+    def test_recipe_detail_revalidates_on_food_changes(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("recipe-detail", args=[self.recipe.slug])
+        response = self.client.get(url)
+        self.assertIn("private", response["Cache-Control"])
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.nutrition.calories = 300
+            self.food.nutrition.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["calories"], 600)
+
+    def test_missing_row_is_still_a_404(self):
+        response = self.client.get(reverse("food-detail", args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="cache@example.com", password="pass1234"
+        )
+        self.other = User.objects.create_user(
+            email="cache-other@example.com", password="pass1234"
+        )
+        self.rice = FoodItem.objects.create(name="Rice", price=1)
+        self.beans = FoodItem.objects.create(name="Fava beans", price=2)
+        self.recipe = Recipe.objects.create(
+            name="Ful medames", user=self.other, is_public=True
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.beans, quantity=200, unit="g"
+        )
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def _names(self, response):
+        return [row["name"] for row in response.data["results"]]
+
+    def test_shared_page_is_served_from_cache(self):
+        url = reverse("food-list")
+        self.assertEqual(self._names(self.client.get(url)), ["Fava beans", "Rice"])
+
+        # Only the private-rows check, no page query and no serialization
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(self._names(response), ["Fava beans", "Rice"])
+
+    def test_writes_bump_the_namespace(self):
+        url = reverse("food-list")
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rice.name = "Basmati rice"
+            self.rice.save()
+
+        self.assertEqual(
+            self._names(self.client.get(url)), ["Fava beans", "Basmati rice"]
+        )
+
+    def test_private_rows_are_merged_but_never_cached(self):
+        url = reverse("food-list")
+        mine = FoodItem.objects.create(name="My granola", user=self.user, price=3)
+        cache.clear()  # the creation bumped the namespace
+
+        self.assertEqual(
+            self._names(self.client.get(url)), ["My granola", "Fava beans", "Rice"]
+        )
+
+        # No bump: the private row is serialized fresh, the shared ones cached
+        FoodItem.objects.filter(pk=mine.pk).update(name="Oat granola")
+        self.assertEqual(
+            self._names(self.client.get(url)), ["Oat granola", "Fava beans", "Rice"]
+        )
+
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self._names(self.client.get(url)), ["Fava beans", "Rice"])
+
+    def test_public_recipes_include_catalog_version(self):
+        url = reverse("recipe-list")
+        Recipe.objects.create(name="My koshari", user=self.user)
+        cache.clear()
+
+        response = self.client.get(url)
+        self.assertEqual(self._names(response), ["My koshari", "Ful medames"])
+
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(url)
+        self.assertEqual(self._names(response), ["Ful medames"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beans.name = "Dried fava beans"
+            self.beans.save()
+
+        response = self.client.get(url)
+        ingredient = response.data["results"][0]["ingredients"][0]
+        self.assertEqual(ingredient["food_item"]["name"], "Dried fava beans")
+
+
+class FoodBulkCreateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="bulk@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("food-bulk-create")
+
+    def _item(self, i, **extra):
+        return {
+            "name": f"Receipt item {i}",
+            "price": f"{10 + i}.00",
+            "price_quantity": 100,
+            "price_unit": "g",
+            "nutrition": {"calories": 100 + i, "protein": 10},
+            "serving_size": [
+                {"description": "1 cup (240 ml)", "quantity": 1, "unit": "cup"},
+                {"description": "30 g", "quantity": 30, "unit": "g"},
+            ],
+            **extra,
+        }
+
+    def test_creates_the_whole_batch(self):
+        response = self.client.post(
+            self.url, [self._item(i) for i in range(3)], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[2]["name"], "Receipt item 2")
+        self.assertEqual(response.data[0]["nutrition"]["calories"], 100)
+        self.assertEqual(response.data[0]["price_per_gram_protein"], 1.0)
+
+        foods = FoodItem.objects.filter(user=self.user)
+        self.assertEqual(foods.count(), 3)
+        self.assertEqual(
+            foods.get(name="Receipt item 1").search_key,
+            build_search_key("Receipt item 1"),
+        )
+        self.assertEqual(ServingSize.objects.filter(food__in=foods).count(), 6)
+        self.assertEqual(
+            ServingSize.objects.get(food=foods.first(), unit="g").metric_quantity, 30
+        )
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, [self._item(i) for i in range(2)], format="json")
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(
+                self.url, [self._item(i) for i in range(10, 60)], format="json"
+            )
+        self.assertEqual(len(small), len(large))
+
+    def test_errors_are_reported_per_item(self):
+        FoodItem.objects.create(name="Old", price="11.00", user=self.user)
+        items = [
+            self._item(0),
+            self._item(1),  # price already used
+            self._item(2, price_unit="bag"),
+            self._item(3, price="10.00"),  # same price as item 0
+        ]
+
+        response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("price", response.data[1])
+        self.assertIn("price_unit", response.data[2])
+        self.assertEqual(FoodItem.objects.filter(user=self.user).count(), 1)
+
+        response = self.client.post(self.url, [items[0], items[3]], format="json")
+        self.assertEqual(response.data[0], {})
+        self.assertIn("price", response.data[1])
+
+
+class BulkChildWriteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="writer@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.foods = [
+            FoodItem.objects.create(name=f"Spice {i}", price=i + 1) for i in range(4)
+        ]
+
+    def _payload(self, steps=30, quantity=10):
+        return {
+            "name": "Molokhia",
+            "description": "",
+            "is_public": False,
+            "ingredients": [
+                {"food_item_id": food.id, "quantity": quantity, "unit": "g"}
+                for food in self.foods
+            ],
+            "instructions": [{"text": f"Step {i}"} for i in range(steps)],
+        }
+
+    def test_create_numbers_steps_in_memory(self):
+        response = self.client.post(
+            reverse("recipe-create"), self._payload(steps=3), format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        recipe = Recipe.objects.get(name="Molokhia")
+        self.assertEqual(
+            list(recipe.instructions.values_list("step_number", "text")),
+            [(1, "Step 0"), (2, "Step 1"), (3, "Step 2")],
+        )
+        self.assertEqual(
+            sorted(recipe.recipeingredient_set.values_list("grams", flat=True)),
+            [10, 10, 10, 10],
+        )
+
+    def _edit_queries(self, steps):
+        Recipe.objects.filter(name="Molokhia").delete()
+        self.client.post(
+            reverse("recipe-create"), self._payload(steps=steps), format="json"
+        )
+        payload = self._payload(steps=steps + 1)
+        for instruction in payload["instructions"]:
+            instruction["text"] += " (edited)"
+
+        url = reverse("recipe-update", args=["molokhia"])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_update_queries_do_not_grow_with_the_steps(self):
+        self.assertEqual(self._edit_queries(3), self._edit_queries(30))
+
+    def test_update_is_a_diff(self):
+        self.client.post(reverse("recipe-create"), self._payload(), format="json")
+        recipe = Recipe.objects.get(name="Molokhia")
+        kept = dict(recipe.recipeingredient_set.values_list("food_item_id", "id"))
+        step_ids = dict(recipe.instructions.values_list("step_number", "id"))
+
+        payload = self._payload(steps=28)
+        payload["ingredients"][0]["quantity"] = 25
+        payload["ingredients"].pop()
+        payload["instructions"][5]["text"] = "Stir well"
+        response = self.client.put(
+            reverse("recipe-update", args=[recipe.slug]), payload, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        rows = recipe.recipeingredient_set.order_by("id")
+        self.assertEqual(
+            [(row.id, row.quantity, row.grams) for row in rows],
+            [(kept[food.id], q, q) for food, q in zip(self.foods, (25, 10, 10))],
+        )
+        self.assertEqual(recipe.instructions.count(), 28)
+        step = recipe.instructions.get(step_number=6)
+        self.assertEqual((step.id, step.text), (step_ids[6], "Stir well"))
+
+    def test_duplicate_step_numbers_are_rejected(self):
+        payload = self._payload(steps=0)
+        payload["instructions"] = [
+            {"step_number": 2, "text": "a"},
+            {"step_number": 2, "text": "b"},
+        ]
+        response = self.client.post(reverse("recipe-create"), payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("instructions", response.data)
+
+    def test_meal_ingredients_are_diffed(self):
+        meal = Meal.objects.create(user=self.user, name="Lunch", meal_type="lunch")
+        MealIngredient.objects.create(
+            meal=meal, food_item=self.foods[0], quantity=1, unit="cup"
+        )
+        MealIngredient.objects.create(
+            meal=meal, food_item=self.foods[1], quantity=50, unit="g"
+        )
+        first = meal.mealingredient_set.get(food_item=self.foods[0])
+
+        response = self.client.put(
+            reverse("meal-update", args=[meal.slug]),
+            {
+                "name": "Lunch",
+                "meal_type": "lunch",
+                "ingredients": [
+                    {"food_item_id": self.foods[0].id, "quantity": 2, "unit": "cup"},
+                    {"food_item_id": self.foods[2].id, "quantity": 5, "unit": "kg"},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row.food_item_id: row for row in meal.mealingredient_set.all()}
+        self.assertEqual(set(rows), {self.foods[0].id, self.foods[2].id})
+        self.assertEqual(rows[self.foods[0].id].pk, first.pk)
+        self.assertEqual(rows[self.foods[0].id].grams, 480)
+        self.assertEqual(rows[self.foods[2].id].grams, 5000)
+
+
+class SparseFieldsetTests(SimpleTestCase):
+    def test_paths(self):
+        sparse = SparseFieldset("name,nutrition.calories,ingredients", "recipes")
+        self.assertTrue(sparse.wants("name"))
+        self.assertFalse(sparse.wants("serving_size"))
+        self.assertTrue(sparse.wants("nutrition.calories"))
+        self.assertFalse(sparse.wants("nutrition.protein"))
+        self.assertTrue(sparse.wants("ingredients.food_item.name"))
+        self.assertEqual(sparse.fields_at(["nutrition"]), {"calories"})
+        self.assertIsNone(sparse.fields_at(["ingredients"]))
+        # expandable relations collapse unless expanded
+        self.assertFalse(sparse.expanded("ingredients.food_item"))
+        self.assertFalse(sparse.expanded("recipes"))  # not in ?fields=
+
+    def test_inactive_without_parameters(self):
+        sparse = SparseFieldset()
+        self.assertFalse(sparse.active)
+        self.assertTrue(sparse.wants("ingredients.food_item.nutrition"))
+        self.assertTrue(sparse.expanded("ingredients.food_item"))
+
+
+class SparseFieldsViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="sparse@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.food = FoodItem.objects.create(name="Lentils", price=2)
+        NutritionProfile.objects.create(food_item=self.food, calories=350, protein=25)
+        ServingSize.objects.create(
+            food=self.food, description="1 cup", quantity=1, unit="cup"
+        )
+        self.recipe = Recipe.objects.create(name="Koshari", user=self.user)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=self.food, quantity=100, unit="g"
+        )
+        rebuild_recipe_nutrition([self.recipe.id])
+        self.meal = Meal.objects.create(user=self.user, name="Dinner", meal_type="dinner")
+        self.meal.recipes.set([self.recipe])
+        cache.clear()
+
+    def test_food_list_fields(self):
+        url = reverse("food-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,name,nutrition.calories"})
+        self.assertEqual(
+            response.data["results"][0],
+            {"id": self.food.id, "name": "Lentils", "nutrition": {"calories": 350}},
+        )
+        # No serving_size prefetch
+        self.assertFalse(any("servingsize" in q["sql"] for q in queries))
+
+    def test_recipe_list_names_and_kcal(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("recipe-list"), {"fields": "name,calories"}
+            )
+        self.assertEqual(
+            response.data["results"], [{"name": "Koshari", "calories": 350}]
+        )
+        self.assertFalse(any("recipeingredient" in q["sql"] for q in queries))
+        self.assertFalse(any("recipeinstruction" in q["sql"] for q in queries))
+
+    def test_recipe_detail_expand(self):
+        url = reverse("recipe-detail", args=[self.recipe.slug])
+        response = self.client.get(url, {"fields": "ingredients"})
+        self.assertEqual(response.data["ingredients"][0]["food_item"], self.food.id)
+
+        response = self.client.get(
+            url,
+            {"fields": "ingredients.quantity,ingredients.food_item.name"},
+        )
+        self.assertEqual(
+            response.data["ingredients"],
+            [{"quantity": 100, "food_item": {"name": "Lentils"}}],
+        )
+
+        response = self.client.get(url, {"expand": "ingredients.food_item"})
+        food = response.data["ingredients"][0]["food_item"]
+        self.assertEqual(food["nutrition"]["calories"], 350)
+
+    def test_meal_list_compact_recipes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("meal-list"), {"fields": "name,recipes"})
+        self.assertEqual(
+            response.data["results"], [{"name": "Dinner", "recipes": [self.recipe.id]}]
+        )
+        # No nutrition subqueries and no nested recipe prefetches
+        self.assertFalse(any("recipenutrition" in q["sql"] for q in queries))
+
+        response = self.client.get(
+            reverse("meal-list"), {"fields": "name,recipes.name", "expand": "recipes"}
+        )
+        self.assertEqual(response.data["results"][0]["recipes"], [{"name": "Koshari"}])
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_same_bytes_as_json_renderer(self):
+        data = {
+            "price": Decimal("2.50"),
+            "name": gettext_lazy("Lentils"),
+            "at": datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            "text": "\u0639\u062f\u0633 \u2028",
+            "values": [1, 2.5, None, True],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back_to_json_renderer(self):
+        data = {"a": [1, 2]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+
+class ValuesFastPathTests(APITestCase):
+    """The .values() fast path renders the same bytes as the serializers."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="fast@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        lentils = FoodItem.objects.create(name="Lentils", price=Decimal("2.50"))
+        NutritionProfile.objects.create(food_item=lentils, calories=350, protein=25)
+        ServingSize.objects.create(
+            food=lentils, description="1 cup", quantity=1, unit="cup"
+        )
+        ServingSize.objects.create(food=lentils, description="", quantity=50, unit="g")
+        rice = FoodItem.objects.create(name="Rice", price=3)  # no nutrition
+
+        self.recipe = Recipe.objects.create(
+            name="Koshari", user=self.user, is_public=True
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=lentils, quantity=100, unit="g"
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, food_item=rice, quantity=1, unit="cup"
+        )
+        RecipeInstruction.objects.create(recipe=self.recipe, step_number=2, text="Fry")
+        RecipeInstruction.objects.create(recipe=self.recipe, step_number=1, text="Boil")
+        rebuild_recipe_nutrition([self.recipe.id])
+        Recipe.objects.create(name="Ful", user=self.user, is_public=True)  # no totals
+
+        meal = Meal.objects.create(user=self.user, name="Dinner", meal_type="dinner")
+        meal.recipes.set([self.recipe])
+        MealIngredient.objects.create(
+            meal=meal, food_item=lentils, quantity=2, unit="tbsp"
+        )
+        empty = Meal.objects.create(user=self.user, name="Snack", meal_type="snack")
+        for m in (meal, empty, meal):
+            MealLog.objects.create(user=self.user, meal=m)
+
+    def assertSameResponse(self, view, url, params=None):
+        cache.clear()
+        with mock.patch.object(
+            view, "build_rows", autospec=True, side_effect=view.build_rows
+        ) as build_rows:
+            fast = self.client.get(url, params)
+        build_rows.assert_called_once()
+        cache.clear()
+        with mock.patch.object(view, "values_path", False):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_food_list(self):
+        response = self.assertSameResponse(FoodItemListView, reverse("food-list"))
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertSameResponse(
+            FoodItemListView, reverse("food-list"), {"search": "lent"}
+        )
+
+    def test_food_list_queries(self):
+        cache.clear()
+        with self.assertNumQueries(3):  # user's own foods, page, servings
+            self.client.get(reverse("food-list"))
+
+    def test_recipe_list(self):
+        response = self.assertSameResponse(RecipeListView, reverse("recipe-list"))
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_meal_log_list(self):
+        response = self.assertSameResponse(
+            UserMealLogListView, reverse("meal-log-list")
+        )
+        self.assertEqual(len(response.data), 3)
+
+    def test_sparse_fieldsets_use_serializers(self):
+        cache.clear()
+        response = self.client.get(reverse("food-list"), {"fields": "name"})
+        self.assertEqual(response.data["results"][0], {"name": "Rice"})
+
+
+class NutrientRangeFilterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="ranges@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        for name, calories, protein in [
+            ("Chicken breast", 165, 31),
+            ("Lentils", 352, 25),
+            ("Cucumber", 15, 0.7),
+        ]:
+            food = FoodItem.objects.create(name=name, price=calories)
+            NutritionProfile.objects.create(
+                food_item=food, calories=calories, protein=protein
+            )
+        FoodItem.objects.create(name="Water", price=1)  # no profile
+        cache.clear()
+
+    def test_food_ranges(self):
+        response = self.client.get(
+            reverse("food-list"), {"protein_min": 20, "calories_max": 200}
+        )
+        self.assertEqual(
+            [food["name"] for food in response.data["results"]], ["Chicken breast"]
+        )
+
+        response = self.client.get(reverse("food-list"), {"calories_max": "200"})
+        self.assertEqual(
+            {food["name"] for food in response.data["results"]},
+            {"Chicken breast", "Cucumber"},
+        )
+
+    def test_recipe_totals(self):
+        chicken, lentils = FoodItem.objects.filter(
+            name__in=["Chicken breast", "Lentils"]
+        ).order_by("name")
+        for name, food in [("Grilled chicken", chicken), ("Lentil soup", lentils)]:
+            recipe = Recipe.objects.create(name=name, user=self.user)
+            RecipeIngredient.objects.create(
+                recipe=recipe, food_item=food, quantity=200, unit="g"
+            )
+            rebuild_recipe_nutrition([recipe.id])
+        Recipe.objects.create(name="Unbuilt", user=self.user)
+
+        response = self.client.get(
+            reverse("recipe-list"), {"protein_min": 55, "calories_max": 400}
+        )
+        self.assertEqual(
+            [recipe["name"] for recipe in response.data["results"]],
+            ["Grilled chicken"],
+        )
+
+    def test_invalid_bounds(self):
+        response = self.client.get(
+            reverse("food-list"), {"protein_min": "lots", "fats_max": "nan"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {"protein_min", "fats_max"})
+
+
+class NutrientRangeIndexTests(APITestCase):
+    """EXPLAIN of every indexed range: fails once one stops using its index."""
+
+    ROWS = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        foods = FoodItem.objects.bulk_create(
+            FoodItem(name=f"Food {i}", price=i) for i in range(cls.ROWS)
+        )
+        user = User.objects.create_user(email="plans@example.com", password="x")
+        recipes = Recipe.objects.bulk_create(
+            Recipe(name=f"Recipe {i}", slug=f"recipe-{i}", user=user)
+            for i in range(cls.ROWS)
+        )
+        values = {field: (lambda i: float(i % 997)) for field in NUTRIENT_FIELDS}
+        NutritionProfile.objects.bulk_create(
+            NutritionProfile(food_item=food, **{f: v(i) for f, v in values.items()})
+            for i, food in enumerate(foods)
+        )
+        RecipeNutrition.objects.bulk_create(
+            RecipeNutrition(recipe=recipe, **{f: v(i) for f, v in values.items()})
+            for i, recipe in enumerate(recipes)
+        )
+        with connection.cursor() as cursor:
+            # Parents too: stale row estimates left by earlier tests flip plans
+            cursor.execute(
+                "ANALYZE foods_fooditem, foods_nutritionprofile,"
+                " foods_recipe, foods_recipenutrition"
+            )
+
+    def explain(self, model, params):
+        """The planner's own choice: ~0.5% of rows match every range below."""
+        request = Request(APIRequestFactory().get("/", params))
+        queryset = NutrientRangeFilter().filter_queryset(
+            request, model.objects.all(), None
+        )
+        return queryset.order_by("-id")[:31].explain()
+
+    def test_food_ranges_use_indexes(self):
+        for field in INDEXED_NUTRIENT_FIELDS:
+            for bound, value in [("min", 990), ("max", 3)]:
+                with self.subTest(field=field, bound=bound):
+                    plan = self.explain(FoodItem, {f"{field}_{bound}": value})
+                    self.assertIn(f"nutrition_{field}", plan)
+                    self.assertNotIn("Seq Scan on foods_nutritionprofile", plan)
+
+    def test_recipe_ranges_use_indexes(self):
+        for field in INDEXED_NUTRIENT_FIELDS:
+            with self.subTest(field=field):
+                plan = self.explain(Recipe, {f"{field}_min": 990})
+                self.assertIn(f"recipe_nutrition_{field}", plan)
+                self.assertNotIn("Seq Scan on foods_recipenutrition", plan)
+
+    def test_combined_ranges(self):
+        plan = self.explain(FoodItem, {"protein_min": 990, "calories_max": 995})
+        self.assertIn("nutrition_protein", plan)
+        # Joining 2000 foods by hash is fine; scanning the profiles is not
+        self.assertNotIn("Seq Scan on foods_nutritionprofile", plan)
+
+    def test_unindexed_range_is_filtered_with_a_macro(self):
+        plan = self.explain(FoodItem, {"protein_min": 990, "iron_max": 995})
+        self.assertIn("nutrition_protein", plan)
+        self.assertNotIn("nutrition_iron", plan)
+
+
+class RecipeSimilarityTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="similar@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.foods = {}
+        for name, calories, protein, carbohydrates, fats in [
+            ("Chicken", 165, 31, 0, 3.6),
+            ("Rice", 130, 2.7, 28, 0.3),
+            ("Lentils", 116, 9, 20, 0.4),
+            ("Butter", 717, 0.9, 0.1, 81),
+        ]:
+            food = FoodItem.objects.create(name=name, price=calories)
+            NutritionProfile.objects.create(
+                food_item=food,
+                calories=calories,
+                protein=protein,
+                carbohydrates=carbohydrates,
+                fats=fats,
+            )
+            self.foods[name] = food
+        self.recipes = {}
+        for name, ingredients, is_public in [
+            ("Chicken and rice", {"Chicken": 150, "Rice": 200}, True),
+            ("Chicken and lentils", {"Chicken": 150, "Lentils": 200}, True),
+            ("Lentil rice", {"Rice": 150, "Lentils": 150}, True),
+            ("Butter rice", {"Rice": 100, "Butter": 50}, True),
+            ("Secret chicken rice", {"Chicken": 100, "Rice": 100}, False),
+        ]:
+            self.recipes[name] = self.create_recipe(name, ingredients, is_public)
+        cache.clear()
+
+    def create_recipe(self, name, ingredients, is_public=True):
+        recipe = Recipe.objects.create(name=name, user=self.user, is_public=is_public)
+        for food, grams in ingredients.items():
+            RecipeIngredient.objects.create(
+                recipe=recipe, food_item=self.foods[food], quantity=grams, unit="g"
+            )
+        rebuild_recipe_nutrition([recipe.id])
+        return recipe
+
+    def similar(self, name, **params):
+        url = reverse("recipe-similar", args=[self.recipes[name].slug])
+        return self.client.get(url, params)
+
+    def test_nearest_public_recipes(self):
+        refresh_similarity_index(full=True)
+        response = self.similar("Chicken and rice")
+        names = [recipe["name"] for recipe in response.data["results"]]
+        self.assertEqual(names[0], "Chicken and lentils")
+        self.assertNotIn("Chicken and rice", names)
+        self.assertNotIn("Secret chicken rice", names)
+        scores = [recipe["similarity"] for recipe in response.data["results"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        # Full RecipeSerializer payloads
+        self.assertIn("ingredients", response.data["results"][0])
+
+        response = self.similar("Chicken and rice", k=1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_private_recipe_of_owner(self):
+        refresh_similarity_index(full=True)
+        response = self.similar("Secret chicken rice")
+        self.assertEqual(response.data["results"][0]["name"], "Chicken and rice")
+
+        other = User.objects.create_user(email="other@example.com", password="x")
+        self.client.force_authenticate(user=other)
+        response = self.similar("Secret chicken rice")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requests_never_scan_recipes(self):
+        refresh_similarity_index(full=True)
+        self.similar("Chicken and rice")  # loads the snapshot
+        # Lookup, then the matches: recipes, ingredients, foods,
+        # servings, instructions
+        with self.assertNumQueries(6):
+            self.similar("Chicken and rice")
+
+    def test_pending_until_first_build(self):
+        with mock.patch("foods.views.refresh_recipe_similarity.delay") as delay:
+            response = self.similar("Chicken and rice")
+            self.similar("Chicken and rice")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        delay.assert_called_once_with()
+
+    def test_incremental_refresh(self):
+        # Everything changed long before the last build
+        long_ago = timezone.now() - timedelta(days=1)
+        Recipe.objects.update(updated_at=long_ago)
+        RecipeNutrition.objects.update(updated_at=long_ago)
+        refresh_similarity_index(full=True)
+
+        with mock.patch("foods.similarity._load", wraps=similarity_load) as load:
+            refresh_similarity_index()
+            load.assert_not_called()  # nothing to do
+
+            new = self.create_recipe("Chicken lentil rice", {"Chicken": 100})
+            butter_rice = self.recipes["Butter rice"]
+            butter_rice.is_public = False
+            butter_rice.save()
+            index = refresh_similarity_index()
+
+        # Only the changed recipes were read back
+        load.assert_called_once_with(sorted([new.id, butter_rice.id]))
+        self.assertIn(new.id, index.recipe_ids.tolist())
+        self.assertNotIn(butter_rice.id, index.recipe_ids.tolist())
+        self.assertEqual(
+            get_similarity_index().recipe_ids.tolist(), index.recipe_ids.tolist()
+        )
+
+    def test_snapshot_round_trip(self):
+        index = refresh_similarity_index(full=True)
+        copy = SimilarityIndex.loads(index.dumps())
+        recipe_id = self.recipes["Chicken and rice"].id
+        self.assertEqual(copy.similar(recipe_id), index.similar(recipe_id))
+        self.assertEqual(copy.built_at, index.built_at)
+
+
+class FoodDedupeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="dedupe@example.com", password="pass1234"
+        )
+        self.milk = self.create_food("Juhayna Full Cream Milk", (61, 3.1, 4.7, 3.3))
+        self.milk_copy = self.create_food(
+            "Juhayna full-cream milk 1L", (62, 3.1, 4.8, 3.3), off_code="6221"
+        )
+        self.skimmed = self.create_food("Juhayna Skimmed Milk", (35, 3.4, 5, 0.1))
+        self.foul = self.create_food("Foul Medames", (110, 7.6, 18, 0.5))
+        self.foul_ar = self.create_food("فول مدمس", (111, 7.5, 18.2, 0.5))
+        self.private_foul = self.create_food(
+            "Foul medames", (110, 7.6, 18, 0.5), user=self.user
+        )
+        cache.clear()
+
+    def create_food(self, name, macros, **fields):
+        food = FoodItem.objects.create(
+            name=name, price=fields.pop("price", len(name)), **fields
+        )
+        calories, protein, carbohydrates, fats = macros
+        NutritionProfile.objects.create(
+            food_item=food,
+            calories=calories,
+            protein=protein,
+            carbohydrates=carbohydrates,
+            fats=fats,
+        )
+        return food
+
+    def test_clusters_similar_names_with_matching_macros(self):
+        self.assertEqual(
+            find_clusters(),
+            [
+                sorted([self.milk.pk, self.milk_copy.pk]),
+                sorted([self.foul.pk, self.foul_ar.pk]),
+            ],
+        )
+
+    def test_private_copies_cluster_per_owner(self):
+        own_copy = self.create_food(
+            "Foul medames (can)", (110, 7.6, 18, 0.5), user=self.user, price=9
+        )
+        other = User.objects.create_user(email="other@example.com", password="x")
+        self.create_food("Foul medames", (110, 7.6, 18, 0.5), user=other)
+
+        clusters = find_clusters(FoodItem.objects.filter(user__isnull=False))
+        self.assertEqual(clusters, [sorted([self.private_foul.pk, own_copy.pk])])
+
+    def test_lsh_buckets_on_large_blocks(self):
+        for i in range(20):
+            self.create_food(f"Juhayna yogurt flavor {i}", (60 + 10 * i, 3, 5, 3))
+        with mock.patch("foods.dedupe.SMALL_BLOCK", 2):
+            clusters = find_clusters(FoodItem.objects.filter(user__isnull=True))
+        self.assertIn(sorted([self.milk.pk, self.milk_copy.pk]), clusters)
+
+    def test_merge_repoints_ingredients_and_deletes_duplicates(self):
+        recipe = Recipe.objects.create(name="Milk foul", user=self.user)
+        RecipeIngredient.objects.create(
+            recipe=recipe, food_item=self.milk, quantity=100, unit="g"
+        )
+        meal = Meal.objects.create(
+            user=self.user, name="Breakfast", meal_type="breakfast"
+        )
+        MealIngredient.objects.create(
+            meal=meal, food_item=self.foul_ar, quantity=200, unit="g"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = merge_clusters(find_clusters())
+        self.assertEqual(stats, {"clusters": 2, "merged": 2, "ingredients": 2})
+
+        # The copy with a barcode is kept, then the oldest
+        self.assertFalse(FoodItem.objects.filter(pk=self.milk.pk).exists())
+        self.assertFalse(FoodItem.objects.filter(pk=self.foul_ar.pk).exists())
+        self.assertFalse(NutritionProfile.objects.filter(pk=self.milk.pk).exists())
+        self.assertEqual(
+            RecipeIngredient.objects.get(recipe=recipe).food_item_id, self.milk_copy.pk
+        )
+        self.assertEqual(
+            MealIngredient.objects.get(meal=meal).food_item_id, self.foul.pk
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.nutrition.calories, 62)
+
+    def test_dry_run_changes_nothing(self):
+        out = io.StringIO()
+        call_command("dedupe_foods", "--dry-run", stdout=out)
+        self.assertIn("Groups=2 Duplicates=2", out.getvalue())
+        self.assertIn("Juhayna full-cream milk 1L", out.getvalue())
+        self.assertEqual(FoodItem.objects.count(), 6)
+
+        call_command("dedupe_foods", "--catalog-only", stdout=io.StringIO())
+        self.assertEqual(FoodItem.objects.count(), 4)
+        self.assertTrue(FoodItem.objects.filter(pk=self.private_foul.pk).exists())
+
+    def test_admin_action_merges_selected_only(self):
+        admin = User.objects.create_superuser(email="admin@example.com", password="x")
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse("admin:foods_fooditem_changelist"),
+            {
+                "action": "merge_near_duplicates",
+                "_selected_action": [self.foul.pk, self.foul_ar.pk, self.milk.pk],
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(FoodItem.objects.filter(pk=self.foul_ar.pk).exists())
+        self.assertTrue(FoodItem.objects.filter(pk=self.milk.pk).exists())
+        self.assertTrue(FoodItem.objects.filter(pk=self.milk_copy.pk).exists())
+
+
+class FoodExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="export@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+        other = User.objects.create_user(email="other@example.com", password="x")
+        for name, user in [
+            ("Rice", None),
+            ("Lentils", None),
+            ("Oats", None),
+            ("My bread", self.user),
+            ("Their bread", other),
+        ]:
+            food = FoodItem.objects.create(name=name, user=user, price=len(name))
+            NutritionProfile.objects.create(
+                food_item=food, calories=100, protein=5, carbohydrates=20, fats=1
+            )
+            ServingSize.objects.create(
+                food=food, description="1 cup", quantity=1, unit="cup"
+            )
+        FoodItem.objects.create(name="Water", price=0)  # no profile
+        cache.clear()
+
+    def export(self, **params):
+        response = self.client.get(reverse("food-export"), params)
+        body = b"".join(response.streaming_content).decode()
+        return response, body
+
+    def test_ndjson_streams_visible_foods(self):
+        response, body = self.export()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn("X-Export-Watermark", response)
+
+        foods = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(
+            [food["name"] for food in foods],
+            ["Rice", "Lentils", "Oats", "My bread", "Water"],
+        )
+        # Same payload as the API's FoodItemSerializer
+        detail = self.client.get(reverse("food-detail", args=[foods[0]["id"]]))
+        self.assertEqual(foods[0], json.loads(detail.content))
+        self.assertIsNone(foods[-1]["nutrition"])
+
+    def test_csv_flattens_nutrition(self):
+        response, body = self.export(format="csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["name"], "Rice")
+        self.assertEqual(float(rows[0]["nutrition_calories"]), 100)
+        self.assertEqual(json.loads(rows[0]["serving_size"])[0]["unit"], "cup")
+        self.assertEqual(rows[-1]["nutrition_calories"], "")
+
+    def test_since_for_incremental_pulls(self):
+        FoodItem.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        FoodItem.objects.filter(name="Oats").touch()
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        _, body = self.export(since=since)
+        names = [json.loads(line)["name"] for line in body.splitlines()]
+        self.assertEqual(names, ["Oats"])
+
+        response = self.client.get(reverse("food-export"), {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("since", json.loads(response.content))
+
+    def test_constant_memory_chunks(self):
+        queryset = export_queryset(self.user)
+        # One cursor fetch plus one servings query per chunk
+        with self.assertNumQueries(4):
+            blocks = list(export_foods(queryset, chunk_size=2))
+        self.assertEqual(len(blocks), 3)
+        self.assertEqual(b"".join(blocks), b"".join(export_foods(queryset)))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("export_foods", stdout=out, stderr=io.StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 4)  # catalog only
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "foods.csv")
+            call_command(
+                "export_foods",
+                "--format=csv",
+                "--user=export@example.com",
+                f"--output={path}",
+                stderr=io.StringIO(),
+            )
+            with open(path, newline="") as export:
+                self.assertEqual(len(list(csv.DictReader(export))), 5)
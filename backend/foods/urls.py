@@ -1,10 +1,18 @@
 from django.urls import path
 from .views import (
     FoodItemListView,
+    FoodAutocompleteView,
+    FoodProteinValueRankingView,
+    BudgetDietOptimizerView,
+    FoodBarcodeView,
+    FoodBarcodeBatchView,
+    FoodExportView,
     FoodItemDetailView,
     FoodItemCreateView,
+    FoodItemBulkCreateView,
     RecipeListView,
     RecipeDetailView,
+    RecipeSimilarView,
     RecipeCreateView,
     RecipeUpdateView,
     RecipeSelectableView,
@@ -17,8 +25,25 @@ from .views import (
 urlpatterns = [
     # Food items
     path("", FoodItemListView.as_view(), name="food-list"),
+    path(
+        "autocomplete/", FoodAutocompleteView.as_view(), name="food-autocomplete"
+    ),
+    path(
+        "ranking/protein-value/",
+        FoodProteinValueRankingView.as_view(),
+        name="food-ranking-protein-value",
+    ),
+    path(
+        "optimize/budget/",
+        BudgetDietOptimizerView.as_view(),
+        name="food-budget-optimizer",
+    ),
+    path("barcode/", FoodBarcodeBatchView.as_view(), name="food-barcode-batch"),
+    path("barcode/<str:code>/", FoodBarcodeView.as_view(), name="food-barcode"),
+    path("export/", FoodExportView.as_view(), name="food-export"),
     path("<int:pk>/", FoodItemDetailView.as_view(), name="food-detail"),
     path("create/", FoodItemCreateView.as_view(), name="food-create"),
+    path("bulk/", FoodItemBulkCreateView.as_view(), name="food-bulk-create"),
     # Recipes
     path("recipes/", RecipeListView.as_view(), name="recipe-list"),
     path("recipes/create/", RecipeCreateView.as_view(), name="recipe-create"),
@@ -29,6 +54,11 @@ urlpatterns = [
     ),
     path("recipes/<str:slug>/", RecipeDetailView.as_view(), name="recipe-detail"),
     path("recipes/<str:slug>/edit/", RecipeUpdateView.as_view(), name="recipe-update"),
+    path(
+        "recipes/<str:slug>/similar/",
+        RecipeSimilarView.as_view(),
+        name="recipe-similar",
+    ),
     # Meals
     path("meals/", MealListView.as_view(), name="meal-list"),
     path("meals/create/", MealCreateView.as_view(), name="meal-create"),
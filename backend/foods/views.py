@@ -1,11 +1,47 @@
-from rest_framework import generics, permissions
-from django.db.models import Q
+from rest_framework import generics, permissions, status
+from django.core.cache import cache
+from django.db.models import Max, Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.filters import SearchFilter
 from rest_framework.pagination import CursorPagination
-
+from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.views import APIView
+
+from backend.conditional import ConditionalRetrieveMixin
+from backend.fast_lists import ValuesListMixin
+from backend.renderers import FAST_RENDERER_CLASSES, CSVRenderer, NDJSONRenderer
+from .autocomplete import autocomplete
+from .diet_optimizer import (
+    PENDING_TTL,
+    DietOptimizerError,
+    DietProblem,
+    solve_cached,
+)
+from .fast_lists import build_foods, build_recipes, food_columns, recipe_columns
+from .export import export_foods, export_queryset, parse_since
+from .filters import FoodSearchFilter, NutrientRangeFilter
+from .response_cache import (
+    CATALOG_VERSION_KEY,
+    RECIPES_VERSION_KEY,
+    SharedListCacheMixin,
+)
+from .similarity import (
+    DEFAULT_K,
+    MAX_K,
+    PENDING_CACHE_KEY as SIMILARITY_PENDING_CACHE_KEY,
+    PENDING_TTL as SIMILARITY_PENDING_TTL,
+    get_similarity_index,
+)
+from .sparse import SparseFieldsViewMixin
+from .services import MAX_BARCODE_BATCH, lookup_barcodes, normalize_barcode
 from .models import FoodItem, Recipe, Meal
+from .tasks import optimize_budget_diet, refresh_recipe_similarity
 from .serializers import (
     FoodItemSerializer,
+    FoodItemBulkSerializer,
     RecipeSerializer,
     RecipeCreateUpdateSerializer,
     MealSerializer,
@@ -13,6 +49,9 @@ from .serializers import (
 )
 
 
+MAX_BULK_FOODS = 500
+
+
 # FoodItems Endpoints
 class FoodItemCursorPagination(CursorPagination):
     page_size = 30
@@ -21,27 +60,289 @@ class FoodItemCursorPagination(CursorPagination):
     max_page_size = 100
 
 
-class FoodItemListView(generics.ListAPIView):
+class FoodSearchCursorPagination(FoodItemCursorPagination):
+    """Orders by relevance while a search is active, by newest otherwise."""
+
+    def get_ordering(self, request, queryset, view):
+        if "search_rank" in queryset.query.annotations:
+            return ("-search_rank", "-id")
+        return super().get_ordering(request, queryset, view)
+
+
+# Sparse fieldsets: only join / prefetch what ?fields= and ?expand= render
+RECIPE_NUTRITION_FIELDS = ("nutrition", "calories", "protein_g", "carbs_g", "fats_g")
+
+
+def food_relations(sparse, path="", lookup=""):
+    """(select_related, prefetch_related) lookups of FoodItemSerializer at path."""
+    select, prefetch = [], []
+    if sparse.wants(f"{path}nutrition"):
+        select.append(f"{lookup}nutrition")
+    if sparse.wants(f"{path}serving_size"):
+        prefetch.append(f"{lookup}serving_size")
+    return select, prefetch
+
+
+def recipe_relations(sparse, path=""):
+    """(select_related, prefetch_related) lookups of RecipeSerializer at path."""
+    select, prefetch = [], []
+    if any(sparse.wants(f"{path}{field}") for field in RECIPE_NUTRITION_FIELDS):
+        select.append("nutrition")
+    if sparse.wants(f"{path}instructions"):
+        prefetch.append("instructions")
+    if sparse.wants(f"{path}ingredients"):
+        prefetch.append("recipeingredient_set")
+        if sparse.expanded(f"{path}ingredients.food_item"):
+            food_select, food_prefetch = food_relations(
+                sparse, f"{path}ingredients.food_item.", "recipeingredient_set__food_item__"
+            )
+            prefetch += ["recipeingredient_set__food_item", *food_select, *food_prefetch]
+    return select, prefetch
+
+
+def meal_queryset(sparse):
+    """Sparse counterpart of Meal.objects.with_nutrition().with_details()."""
+    meals = Meal.objects.all()
+    if any(sparse.wants(field) for field in RECIPE_NUTRITION_FIELDS):
+        meals = meals.with_nutrition()
+    if sparse.wants("ingredients"):
+        meals = meals.prefetch_related("mealingredient_set")
+        if sparse.expanded("ingredients.food_item"):
+            select, prefetch = food_relations(
+                sparse, "ingredients.food_item.", "mealingredient_set__food_item__"
+            )
+            meals = meals.prefetch_related(
+                "mealingredient_set__food_item", *select, *prefetch
+            )
+    if sparse.wants("recipes"):
+        if sparse.expanded("recipes"):
+            select, prefetch = recipe_relations(sparse, "recipes.")
+            recipes = (
+                Recipe.objects.select_related(*select)
+                .prefetch_related(*prefetch)
+                .order_by("pk")
+            )
+            meals = meals.prefetch_related(Prefetch("recipes", queryset=recipes))
+        else:
+            meals = meals.prefetch_related("recipes")
+    return meals
+
+
+def food_queryset(sparse):
+    select, prefetch = food_relations(sparse)
+    return FoodItem.objects.select_related(*select).prefetch_related(*prefetch)
+
+
+def recipe_queryset(sparse):
+    select, prefetch = recipe_relations(sparse)
+    return Recipe.objects.select_related(*select).prefetch_related(*prefetch)
+
+
+class FoodItemListView(
+    SparseFieldsViewMixin,
+    SharedListCacheMixin,
+    ValuesListMixin,
+    generics.ListAPIView,
+):
     serializer_class = FoodItemSerializer
-    pagination_class = FoodItemCursorPagination
+    pagination_class = FoodSearchCursorPagination
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+    filter_backends = [FoodSearchFilter, NutrientRangeFilter]
+    cache_versions = (CATALOG_VERSION_KEY,)
+
+    @property
+    def values_columns(self):
+        return food_columns()
+
+    def use_values_path(self):
+        return super().use_values_path() and not self.sparse.active
+
+    def build_rows(self, rows):
+        return build_foods(rows)
+
+    def is_shared(self, obj):
+        return obj.user_id is None
+
+    def has_private_rows(self):
+        return FoodItem.objects.filter(user=self.request.user).exists()
+
+    def get_queryset(self):
+        return food_queryset(self.sparse).filter(
+            Q(user=self.request.user) | Q(user__isnull=True)
+        )
+
+
+class ProteinValueCursorPagination(FoodItemCursorPagination):
+    # Keyset over the food_protein_value index
+    ordering = ("price_per_gram_protein", "id")
+
+
+class FoodProteinValueRankingView(SparseFieldsViewMixin, generics.ListAPIView):
+    """Visible foods ordered by cost per gram of protein, cheapest first."""
+
+    serializer_class = FoodItemSerializer
+    pagination_class = ProteinValueCursorPagination
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [SearchFilter]
-    search_fields = ["name", "nutrition__protein_type"]
 
     def get_queryset(self):
-        return (
-            FoodItem.objects.prefetch_related("serving_size")
-            .select_related("nutrition")
+        queryset = (
+            food_queryset(self.sparse)
             .filter(Q(user=self.request.user) | Q(user__isnull=True))
+            .filter(price_per_gram_protein__isnull=False)
         )
+        protein_type = self.request.query_params.get("protein_type")
+        if protein_type:
+            queryset = queryset.filter(nutrition__protein_type=protein_type)
+        return queryset
 
 
-class FoodItemDetailView(generics.RetrieveAPIView):
-    queryset = FoodItem.objects.prefetch_related("serving_size").select_related(
-        "nutrition"
-    )
+class BudgetDietOptimizerView(APIView):
+    """
+    Cheapest foods (grams per day) meeting the user's target_macros within
+    a daily budget in their preferred currency. Large candidate sets are
+    solved by a Celery worker: the view answers 202 and the same request
+    returns the result once it is cached.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "diet_optimizer"
+
+    def post(self, request):
+        try:
+            budget = float(request.data.get("budget"))
+        except (TypeError, ValueError):
+            budget = 0
+        if budget <= 0:
+            return Response(
+                {"budget": "Provide a positive daily budget."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            problem = DietProblem.for_user(request.user, budget)
+        except DietOptimizerError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if problem.is_large and cache.get(problem.cache_key) is None:
+            if cache.add(problem.pending_cache_key, True, PENDING_TTL):
+                optimize_budget_diet.delay(request.user.id, budget, problem.digest)
+            return Response(
+                {"status": "pending", "key": problem.digest},
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        return Response(solve_cached(problem))
+
+
+class FoodAutocompleteView(APIView):
+    """Top prefix matches (id, name, kcal) for the food picker."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "autocomplete"
+
+    def get(self, request):
+        prefix = request.query_params.get("q", "")
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+
+        if not prefix.strip():
+            return Response({"results": []})
+        return Response({"results": autocomplete(request.user, prefix, limit)})
+
+
+class FoodBarcodeView(APIView):
+    """Catalog food (with nutrition) by OpenFoodFacts barcode."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "barcode"
+
+    def get(self, request, code):
+        code = normalize_barcode(code)
+        food = lookup_barcodes([code]).get(code)
+        if food is None:
+            return Response(
+                {"detail": "No food found for this barcode."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(food)
+
+
+class FoodBarcodeBatchView(APIView):
+    """Several barcodes in one request: ?codes=622...,622..."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "barcode"
+
+    def get(self, request):
+        codes = [
+            code
+            for code in request.query_params.get("codes", "").split(",")
+            if code.strip()
+        ]
+        if not codes:
+            return Response(
+                {"codes": "Provide one or more comma-separated barcodes."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(codes) > MAX_BARCODE_BATCH:
+            return Response(
+                {"codes": f"At most {MAX_BARCODE_BATCH} barcodes per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"results": lookup_barcodes(codes)})
+
+
+class FoodExportView(APIView):
+    """
+    The catalog and the user's own foods, with nutrition and serving sizes,
+    streamed as NDJSON (default) or CSV (?format=csv / Accept: text/csv)
+    instead of paged. ?since= limits it to foods updated from then on; pass
+    the X-Export-Watermark of the previous export for an incremental pull.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "export"
+
+    def get(self, request):
+        since = parse_since(request.query_params.get("since"))
+        # Taken before reading, so rows changed meanwhile come again next time
+        watermark = timezone.now()
+        renderer = request.accepted_renderer
+        format = renderer.format
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f"; charset={renderer.charset}"
+
+        response = StreamingHttpResponse(
+            export_foods(export_queryset(request.user, since), format),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="foods.{format}"'
+        response["X-Export-Watermark"] = watermark.isoformat()
+        return response
+
+
+class FoodItemDetailView(
+    SparseFieldsViewMixin, ConditionalRetrieveMixin, generics.RetrieveAPIView
+):
     serializer_class = FoodItemSerializer
     permission_classes = [permissions.AllowAny]
+    # Nutrition and serving changes bump FoodItem.updated_at
+    version_fields = ("updated_at",)
+    # Users' private foods never go to shared caches
+    shared_filter = Q(user__isnull=True)
+
+    def get_queryset(self):
+        return food_queryset(self.sparse)
 
 
 class FoodItemCreateView(generics.CreateAPIView):
@@ -52,29 +353,124 @@ class FoodItemCreateView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
+class FoodItemBulkCreateView(generics.CreateAPIView):
+    """
+    POST a list of food items (at most MAX_BULK_FOODS). Either all of them
+    are created, or a 400 lists the errors of each item in input order.
+    """
+
+    serializer_class = FoodItemBulkSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "food_bulk"
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(many=True, max_length=MAX_BULK_FOODS)
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
 # Recipe Endpoints
-class RecipeListView(generics.ListAPIView):
+class RecipeListView(
+    SparseFieldsViewMixin,
+    SharedListCacheMixin,
+    ValuesListMixin,
+    generics.ListAPIView,
+):
     serializer_class = RecipeSerializer
     pagination_class = FoodItemCursorPagination
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [SearchFilter]
+    renderer_classes = FAST_RENDERER_CLASSES
+    filter_backends = [SearchFilter, NutrientRangeFilter]
     search_fields = ["name"]
+    # Ingredients embed catalog foods
+    cache_versions = (CATALOG_VERSION_KEY, RECIPES_VERSION_KEY)
+
+    @property
+    def values_columns(self):
+        return recipe_columns()
+
+    def use_values_path(self):
+        return super().use_values_path() and not self.sparse.active
+
+    def build_rows(self, rows):
+        return build_recipes(rows)
+
+    def is_shared(self, obj):
+        return obj.is_public
+
+    def has_private_rows(self):
+        return Recipe.objects.filter(user=self.request.user, is_public=False).exists()
 
     def get_queryset(self):
-        return Recipe.objects.prefetch_related(
-            "recipeingredient_set__food_item"
-        ).filter(Q(user=self.request.user) | Q(is_public=True))
+        return recipe_queryset(self.sparse).filter(
+            Q(user=self.request.user) | Q(is_public=True)
+        )
 
 
-class RecipeDetailView(generics.RetrieveAPIView):
+class RecipeDetailView(
+    SparseFieldsViewMixin, ConditionalRetrieveMixin, generics.RetrieveAPIView
+):
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = "slug"
+    version_fields = (
+        "updated_at",
+        "nutrition__updated_at",
+        Max("recipeingredient__food_item__updated_at"),
+    )
 
     def get_queryset(self):
-        return Recipe.objects.prefetch_related(
-            "recipeingredient_set__food_item"
-        ).filter(Q(user=self.request.user) | Q(is_public=True))
+        return recipe_queryset(self.sparse).filter(
+            Q(user=self.request.user) | Q(is_public=True)
+        )
+
+
+class RecipeSimilarView(APIView):
+    """
+    "More like this": the k public recipes closest to a visible recipe by
+    nutrient profile and ingredient overlap, read from the precomputed
+    SimilarityIndex (see foods.similarity). Before its first build the view
+    answers 202 and queues one.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get(self, request, slug):
+        recipe = get_object_or_404(
+            Recipe.objects.filter(Q(user=request.user) | Q(is_public=True)).only("id"),
+            slug=slug,
+        )
+        try:
+            k = int(request.query_params.get("k", DEFAULT_K))
+        except ValueError:
+            k = DEFAULT_K
+        k = max(1, min(k, MAX_K))
+
+        index = get_similarity_index()
+        if index is None:
+            if cache.add(SIMILARITY_PENDING_CACHE_KEY, True, SIMILARITY_PENDING_TTL):
+                refresh_recipe_similarity.delay()
+            return Response({"status": "pending"}, status=status.HTTP_202_ACCEPTED)
+
+        matches = index.similar(recipe.id, k)
+        # Made private since the last refresh: skipped
+        rows = Recipe.objects.filter(
+            pk__in=[pk for pk, _ in matches], is_public=True
+        ).values(*recipe_columns())
+        recipes = {row["id"]: row for row in build_recipes(list(rows))}
+        return Response(
+            {
+                "results": [
+                    {**recipes[pk], "similarity": round(score, 4)}
+                    for pk, score in matches
+                    if pk in recipes
+                ]
+            }
+        )
 
 
 class RecipeCreateView(generics.CreateAPIView):
@@ -91,17 +487,17 @@ class RecipeUpdateView(generics.RetrieveUpdateDestroyAPIView):
         return Recipe.objects.filter(Q(user=self.request.user) | Q(is_public=True))
 
 
-class RecipeSelectableView(generics.ListAPIView):
+class RecipeSelectableView(SparseFieldsViewMixin, generics.ListAPIView):
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return Recipe.objects.filter(Q(is_public=True) | Q(user=user))
+        return recipe_queryset(self.sparse).filter(Q(is_public=True) | Q(user=user))
 
 
 # Meal Endpoints
-class MealListView(generics.ListAPIView):
+class MealListView(SparseFieldsViewMixin, generics.ListAPIView):
     serializer_class = MealSerializer
     pagination_class = FoodItemCursorPagination
     permission_classes = [permissions.IsAuthenticated]
@@ -109,22 +505,16 @@ class MealListView(generics.ListAPIView):
     search_fields = ["name", "meal_type"]
 
     def get_queryset(self):
-        return Meal.objects.filter(user=self.request.user).prefetch_related(
-            "recipes",
-            "mealingredient_set__food_item",
-        )
+        return meal_queryset(self.sparse).filter(user=self.request.user)
 
 
-class MealDetailView(generics.RetrieveAPIView):
+class MealDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
     serializer_class = MealSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = "slug"
 
     def get_queryset(self):
-        return Meal.objects.filter(user=self.request.user).prefetch_related(
-            "recipes",
-            "mealingredient_set__food_item",
-        )
+        return meal_queryset(self.sparse).filter(user=self.request.user)
 
 
 class MealCreateView(generics.CreateAPIView):
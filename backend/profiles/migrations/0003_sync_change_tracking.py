@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-18 02:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0021_sync_change_tracking'),
+        ('profiles', '0002_alter_meallog_consumed_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meallog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['user', 'updated_at'], name='meallog_user_updated'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-18 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0021_sync_change_tracking'),
+        ('profiles', '0003_sync_change_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['user', 'consumed_at'], name='meallog_user_consumed'),
+        ),
+    ]
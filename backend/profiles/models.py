@@ -99,9 +99,16 @@ class MealLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="meal_logs")
     meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name="logs")
     consumed_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-consumed_at"]
+        indexes = [
+            # Delta syncs, see sync.services
+            models.Index(fields=["user", "updated_at"], name="meallog_user_updated"),
+            # Date ranges of one user's logs (log lists, shopping lists)
+            models.Index(fields=["user", "consumed_at"], name="meallog_user_consumed"),
+        ]
 
     def __str__(self):
         return f"MealLog: {self.user.email} - {self.meal.id} at {self.consumed_at}"
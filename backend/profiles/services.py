@@ -0,0 +1,96 @@
+from collections import Counter
+
+from django.db.models import Count, Sum
+
+from foods.conversions import to_grams
+from foods.models import FoodItem, MealIngredient, RecipeIngredient
+
+
+# ==============================
+# CONFIG
+# ==============================
+DEFAULT_DAYS = 7  # shopping list range when none is given
+MAX_DAYS = 62
+
+
+# ==============================
+# SHOPPING LIST
+# ==============================
+def _grams_by_food(queryset):
+    """
+    (grams, rows) per food of the given ingredient rows, in one GROUP BY.
+    Rows are counted once per log they are reached through.
+    """
+    totals = (
+        queryset.order_by()
+        .values("food_item_id")
+        .annotate(total=Sum("grams"), rows=Count("pk"))
+        .values_list("food_item_id", "total", "rows")
+    )
+    grams, rows = Counter(), Counter()
+    for food_id, total, count in totals:
+        grams[food_id] += total or 0.0
+        rows[food_id] += count
+    return grams, rows
+
+
+def shopping_list(user, start, end):
+    """
+    Foods needed for the meals the user logged or planned in [start, end):
+    the direct ingredients of every logged meal plus the ingredients of its
+    recipes, once per log, summed per food in grams (ml for foods priced by
+    volume) with the cost estimated from price / price_quantity.
+
+    Three queries whatever the size of the plan: one GROUP BY per ingredient
+    table over the MealLog joins, then the foods. Units go through the
+    shared conversion table (foods.conversions), as the ingredients' grams.
+    """
+    logs = {"user": user, "consumed_at__gte": start, "consumed_at__lt": end}
+    grams, rows = _grams_by_food(
+        MealIngredient.objects.filter(
+            **{f"meal__logs__{key}": value for key, value in logs.items()}
+        )
+    )
+    recipe_grams, recipe_rows = _grams_by_food(
+        RecipeIngredient.objects.filter(
+            **{f"recipe__meal__logs__{key}": value for key, value in logs.items()}
+        )
+    )
+    grams.update(recipe_grams)
+    rows.update(recipe_rows)
+
+    foods = list(
+        FoodItem.objects.filter(pk__in=list(grams))
+        .order_by("name", "pk")
+        .values_list("pk", "name", "price", "price_quantity", "price_unit")
+    )
+    priced_grams = to_grams((pk, quantity, unit) for pk, _, _, quantity, unit in foods)
+    ml_grams = to_grams((pk, 1, "ml") for pk, *_ in foods)
+
+    items, total_cost, unpriced = [], 0.0, 0
+    for (pk, name, price, _, price_unit), priced, density in zip(
+        foods, priced_grams, ml_grams
+    ):
+        liquid = price_unit == FoodItem.PriceUnit.ML
+        cost = None
+        if price > 0 and priced > 0:
+            cost = float(price) * grams[pk] / priced
+            total_cost += cost
+        else:
+            unpriced += 1
+        items.append(
+            {
+                "food_item": pk,
+                "name": name,
+                "amount": round(grams[pk] / density if liquid else grams[pk], 1),
+                "unit": "ml" if liquid else "g",
+                "grams": round(grams[pk], 1),
+                "ingredients": rows[pk],
+                "estimated_cost": None if cost is None else round(cost, 2),
+            }
+        )
+    return {
+        "items": items,
+        "estimated_cost": round(total_cost, 2),
+        "unpriced": unpriced,
+    }
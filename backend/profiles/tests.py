@@ -1,3 +1,127 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from foods.models import (
+    FoodItem,
+    FoodUnitConversion,
+    Meal,
+    MealIngredient,
+    Recipe,
+    RecipeIngredient,
+)
+from .models import MealLog
+from .services import shopping_list
+
+User = get_user_model()
+
+
+class ShoppingListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="shopper@example.com", password="pass1234"
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.rice = FoodItem.objects.create(
+            name="Rice", price=Decimal("30"), price_quantity=1000
+        )
+        self.milk = FoodItem.objects.create(
+            name="Milk", price=Decimal("40"), price_quantity=1000, price_unit="ml"
+        )
+        FoodUnitConversion.objects.create(food=self.milk, unit="ml", grams=1.03)
+        self.eggs = FoodItem.objects.create(
+            name="Eggs", price=Decimal("5"), price_quantity=1, price_unit="piece"
+        )
+        FoodUnitConversion.objects.create(food=self.eggs, unit="piece", grams=60)
+        self.salt = FoodItem.objects.create(name="Salt", price=Decimal("0"))
+
+        self.pudding = Recipe.objects.create(name="Rice pudding", user=self.user)
+        for food, quantity, unit in [
+            (self.rice, 100, "g"),
+            (self.milk, 1, "cup"),
+        ]:
+            RecipeIngredient.objects.create(
+                recipe=self.pudding, food_item=food, quantity=quantity, unit=unit
+            )
+        self.breakfast = self.create_meal("Breakfast", [self.pudding])
+        for food, quantity, unit in [(self.eggs, 2, "piece"), (self.salt, 1, "g")]:
+            MealIngredient.objects.create(
+                meal=self.breakfast, food_item=food, quantity=quantity, unit=unit
+            )
+
+        self.day = timezone.make_aware(datetime(2026, 3, 2, 8))
+        for offset in (0, 1, 10):  # the last one is outside the week
+            self.log(self.breakfast, self.day + timedelta(days=offset))
+        other = User.objects.create_user(email="other@example.com", password="x")
+        MealLog.objects.create(user=other, meal=self.breakfast, consumed_at=self.day)
+
+    def create_meal(self, name, recipes=()):
+        meal = Meal.objects.create(user=self.user, name=name, meal_type="breakfast")
+        meal.recipes.set(recipes)
+        return meal
+
+    def log(self, meal, when):
+        return MealLog.objects.create(user=self.user, meal=meal, consumed_at=when)
+
+    def get(self, **params):
+        return self.client.get(reverse("shopping-list"), params)
+
+    def test_aggregates_meal_and_recipe_ingredients_per_food(self):
+        response = self.get(start="2026-03-02", end="2026-03-08")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        items = {item["name"]: item for item in response.data["items"]}
+
+        self.assertEqual(items["Rice"]["grams"], 200)
+        self.assertEqual(items["Rice"]["estimated_cost"], 6.0)
+        # Bought by volume: a cup is 240 ml, whatever the milk weighs
+        self.assertEqual((items["Milk"]["amount"], items["Milk"]["unit"]), (480, "ml"))
+        self.assertEqual(items["Milk"]["grams"], 494.4)
+        self.assertEqual(items["Milk"]["estimated_cost"], 19.2)
+        self.assertEqual(items["Eggs"]["grams"], 240)
+        self.assertEqual(items["Eggs"]["estimated_cost"], 20.0)
+        self.assertEqual(items["Eggs"]["ingredients"], 2)  # once per log
+        self.assertIsNone(items["Salt"]["estimated_cost"])
+
+        self.assertEqual(response.data["estimated_cost"], 45.2)
+        self.assertEqual(response.data["unpriced"], 1)
+
+    def test_fixed_number_of_queries(self):
+        start = self.day - timedelta(hours=8)
+        end = start + timedelta(days=7)
+        shopping_list(self.user, start, end)  # conversion table compiled
+
+        for i in range(5):
+            recipe = Recipe.objects.create(name=f"Bowl {i}", user=self.user)
+            RecipeIngredient.objects.create(
+                recipe=recipe, food_item=self.rice, quantity=50, unit="g"
+            )
+            self.log(self.create_meal(f"Meal {i}", [recipe, self.pudding]), self.day)
+
+        with self.assertNumQueries(3):
+            data = shopping_list(self.user, start, end)
+        rice = next(item for item in data["items"] if item["name"] == "Rice")
+        self.assertEqual(rice["grams"], 200 + 5 * (50 + 100))
+
+    def test_date_validation(self):
+        for params in [
+            {"start": "March"},
+            {"start": "2026-03-08", "end": "2026-03-01"},
+            {"start": "2026-01-01", "end": "2026-12-31"},
+        ]:
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.get()  # the next seven days: nothing planned
+        self.assertEqual(response.data["items"], [])
+        self.assertEqual(
+            response.data["end"] - response.data["start"], timedelta(days=6)
+        )
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserProfileViewSet, UserHealthDataViewSet,UserMealLogCreateView,UserMealLogDetailView,UserMealLogListView
+from .views import UserProfileViewSet, UserHealthDataViewSet,UserMealLogCreateView,UserMealLogDetailView,UserMealLogListView,UserShoppingListView
 
 router = DefaultRouter()
 router.register("profile", UserProfileViewSet, basename="profile")
@@ -13,4 +13,5 @@ urlpatterns = [
     path("logs/", UserMealLogListView.as_view(), name="meal-log-list"),
     path("logs/create/", UserMealLogCreateView.as_view(), name="meal-log-create"),
     path("logs/<int:pk>/", UserMealLogDetailView.as_view(), name="meal-log-detail"),
+    path("shopping-list/", UserShoppingListView.as_view(), name="shopping-list"),
 ]
@@ -1,5 +1,15 @@
+from functools import cache
+
 from rest_framework import viewsets, permissions, generics
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.db.models import Prefetch
+from backend.fast_lists import ValuesListMixin, ValuesRow
+from backend.renderers import FAST_RENDERER_CLASSES
+from foods.fast_lists import meals_by_id
+from foods.models import Meal
 from .models import MealLog, UserProfile, UserHealthData
+from .services import DEFAULT_DAYS, MAX_DAYS, shopping_list
 from .serializers import (
     MealLogSerializer,
     UserProfileSerializer,
@@ -10,6 +20,18 @@ from datetime import datetime, timedelta
 from rest_framework.exceptions import ValidationError
 
 
+def _meal_with_nutrition():
+    return Prefetch(
+        "meal",
+        queryset=Meal.objects.select_related("user").with_nutrition().with_details(),
+    )
+
+
+@cache
+def _meal_log_row():
+    return ValuesRow(MealLogSerializer(), nested=("meal",))
+
+
 class UserProfileViewSet(viewsets.ModelViewSet):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -40,18 +62,25 @@ class UserMealLogCreateView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class UserMealLogListView(generics.ListAPIView):
+class UserMealLogListView(ValuesListMixin, generics.ListAPIView):
     serializer_class = MealLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    @property
+    def values_columns(self):
+        return [*_meal_log_row().columns, "meal_id"]
+
+    def build_rows(self, rows):
+        # A log repeats the same few meals: each one is built once
+        meals = meals_by_id({row["meal_id"] for row in rows})
+        build = _meal_log_row()
+        return [build(row, meal=meals[row["meal_id"]]) for row in rows]
 
     def get_queryset(self):
         queryset = (
             MealLog.objects.filter(user=self.request.user)
-            .select_related("meal__user")
-            .prefetch_related(
-                "meal__mealingredient_set__food_item__nutrition",
-                "meal__recipes__recipeingredient_set__food_item__nutrition",
-            )
+            .prefetch_related(_meal_with_nutrition())
             .order_by("-consumed_at")
         )
         interval = self.request.query_params.get("interval", None)
@@ -107,9 +136,43 @@ class UserMealLogDetailView(generics.RetrieveDestroyAPIView):
     def get_queryset(self):
         return (
             MealLog.objects.filter(user=self.request.user)
-            .select_related("meal__user")
-            .prefetch_related(
-                "meal__mealingredient_set__food_item__nutrition",
-                "meal__recipes__recipeingredient_set__food_item__nutrition",
-            )
+            .prefetch_related(_meal_with_nutrition())
+        )
+
+
+class UserShoppingListView(APIView):
+    """
+    Deduplicated shopping list for the meals logged or planned between
+    ?start= and ?end= (YYYY-MM-DD, both included; the next DEFAULT_DAYS
+    days by default), with an estimated cost per food and in total.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get(self, request):
+        today = timezone.localdate()
+        days = {}
+        for param, default in (
+            ("start", today),
+            ("end", today + timedelta(days=DEFAULT_DAYS - 1)),
+        ):
+            value = request.query_params.get(param)
+            try:
+                days[param] = datetime.fromisoformat(value).date() if value else default
+            except ValueError:
+                raise ValidationError({param: "Invalid date format. Use YYYY-MM-DD"})
+        start, end = days["start"], days["end"]
+        if end < start:
+            raise ValidationError({"end": "Must not be before start."})
+        if (end - start).days >= MAX_DAYS:
+            raise ValidationError({"end": f"At most {MAX_DAYS} days at once."})
+
+        data = shopping_list(
+            request.user,
+            timezone.make_aware(datetime.combine(start, datetime.min.time())),
+            timezone.make_aware(
+                datetime.combine(end + timedelta(days=1), datetime.min.time())
+            ),
         )
+        return Response({"start": start, "end": end, **data})
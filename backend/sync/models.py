@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+User = get_user_model()
+
+
+class TombstoneQuerySet(models.QuerySet):
+    def record(self, kind, rows):
+        """Tombstones for deleted (object_id, user_id) rows, in one INSERT."""
+        return self.bulk_create(
+            Tombstone(kind=kind, object_id=object_id, user_id=user_id)
+            for object_id, user_id in rows
+        )
+
+
+class Tombstone(models.Model):
+    """
+    A deleted row of a synced model, reported by delta syncs until it is
+    purged (after sync.services.TOMBSTONE_TTL).
+    """
+
+    class Kind(models.TextChoices):
+        FOOD = "foods", "Food"
+        RECIPE = "recipes", "Recipe"
+        MEAL = "meals", "Meal"
+        MEAL_LOG = "meal_logs", "Meal log"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    # Owner of the deleted row, None for catalog foods. No constraint: a
+    # deleted user's rows get their tombstones while the user is deleted.
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    objects = TombstoneQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "deleted_at"], name="tombstone_user_deleted"),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted at {self.deleted_at}"
@@ -0,0 +1,250 @@
+from datetime import datetime, timedelta
+from functools import cache
+
+from django.core import signing
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from backend.fast_lists import ValuesRow
+from foods.fast_lists import (
+    build_foods,
+    build_recipes,
+    food_columns,
+    meals_by_id,
+    recipe_columns,
+)
+from foods.models import FoodItem, Meal, MealIngredient, Recipe, RecipeIngredient
+from profiles.models import MealLog
+from profiles.serializers import MealLogSerializer
+from .models import Tombstone
+
+
+# ==============================
+# CONFIG
+# ==============================
+# Tombstones are purged after this (sync.tasks); older tokens start over
+TOMBSTONE_TTL = timedelta(days=30)
+
+# Rows changed this long before a sync pass ended are sent again by the
+# next one, for transactions that committed after their updated_at
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+DEFAULT_BATCH = 500  # rows per kind and response
+MAX_BATCH = 2000
+
+TOKEN_SALT = "sync.token"
+
+KINDS = [kind for kind, _ in Tombstone.Kind.choices]
+
+
+# ==============================
+# TOKENS
+# ==============================
+# A token is a signed, compressed position: the window [since, until) of
+# the pass in progress and, per stream, the (changed_at, id) of the last
+# row sent. A finished pass hands out a token for the next window only.
+def dump_token(since, until=None, after=None):
+    return signing.dumps(
+        {
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat() if until else None,
+            "after": after or {},
+        },
+        salt=TOKEN_SALT,
+        compress=True,
+    )
+
+
+def load_token(token):
+    """(since, until, after) of a token, (None, None, {}) for a first sync."""
+    if not token:
+        return None, None, {}
+    try:
+        state = signing.loads(token, salt=TOKEN_SALT)
+        since, until = (
+            datetime.fromisoformat(state[key]) if state[key] else None
+            for key in ("since", "until")
+        )
+        after = {
+            stream: (datetime.fromisoformat(changed_at), pk)
+            for stream, (changed_at, pk) in state["after"].items()
+        }
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValidationError({"token": "Invalid sync token."})
+    return since, until, after
+
+
+# ==============================
+# STREAMS
+# ==============================
+@cache
+def _meal_log_row():
+    return ValuesRow(MealLogSerializer(), nested=("meal",))
+
+
+def _streams(user):
+    """
+    Per kind, the user's rows annotated with changed_at, the time their
+    payload last changed: own recipes, meals and meal logs, the public
+    recipes their meals use, and every food any of those use.
+    """
+    meal_recipes = Meal.recipes.through.objects.filter(meal__user=user)
+    recipes = Recipe.objects.filter(
+        Q(user=user) | Q(pk__in=meal_recipes.values("recipe_id"))
+    )
+    recipe_foods = RecipeIngredient.objects.filter(recipe__in=recipes)
+    meal_foods = MealIngredient.objects.filter(meal__user=user)
+    foods = FoodItem.objects.filter(
+        Q(user=user)
+        | Q(pk__in=recipe_foods.values("food_item_id"))
+        | Q(pk__in=meal_foods.values("food_item_id"))
+    )
+    return {
+        "foods": foods.annotate(changed_at=F("updated_at")),
+        # Stored totals are rebuilt without touching the recipe row
+        "recipes": recipes.annotate(
+            changed_at=Greatest("updated_at", "nutrition__updated_at")
+        ),
+        "meals": Meal.objects.filter(user=user).annotate(changed_at=F("updated_at")),
+        "meal_logs": MealLog.objects.filter(user=user).annotate(
+            changed_at=F("updated_at")
+        ),
+        # Catalog foods are shared: their deletions go to everyone
+        "deleted": Tombstone.objects.filter(
+            Q(user=user) | Q(user__isnull=True, kind=Tombstone.Kind.FOOD)
+        ).annotate(changed_at=F("deleted_at")),
+    }
+
+
+def _page(queryset, since, until, after, limit):
+    """Up to limit + 1 (changed_at, pk) of the window, keyset after `after`."""
+    queryset = queryset.filter(changed_at__lt=until)
+    if since is not None:
+        queryset = queryset.filter(changed_at__gte=since)
+    if after is not None:
+        changed_at, pk = after
+        queryset = queryset.filter(
+            Q(changed_at__gt=changed_at) | Q(changed_at=changed_at, pk__gt=pk)
+        )
+    return list(
+        queryset.order_by("changed_at", "pk").values_list("changed_at", "pk")[
+            : limit + 1
+        ]
+    )
+
+
+# ==============================
+# PAYLOADS
+# ==============================
+# Rows reference each other by id (compact builders): every food and
+# recipe is sent once, however many recipes and meals use it.
+def _foods(ids):
+    rows = FoodItem.objects.filter(pk__in=ids).order_by("pk").values(*food_columns())
+    return build_foods(list(rows))
+
+
+def _recipes(ids):
+    rows = Recipe.objects.filter(pk__in=ids).order_by("pk").values(*recipe_columns())
+    return build_recipes(list(rows), compact=True)
+
+
+def _meals(ids):
+    meals = meals_by_id(ids, compact=True)
+    return [meals[pk] for pk in ids if pk in meals]
+
+
+def _meal_logs(ids):
+    build = _meal_log_row()
+    rows = (
+        MealLog.objects.filter(pk__in=ids)
+        .order_by("pk")
+        .values("meal_id", *build.columns)
+    )
+    return [build(row, meal=row["meal_id"]) for row in rows]
+
+
+def _with_references(data):
+    """
+    Add the recipes and foods the page's rows use but did not change, so
+    the client never holds an id it cannot resolve.
+    """
+    sent = {recipe["id"] for recipe in data["recipes"]}
+    missing = {pk for meal in data["meals"] for pk in meal["recipes"]} - sent
+    data["recipes"] += _recipes(missing)
+
+    sent = {food["id"] for food in data["foods"]}
+    used = {
+        ingredient["food_item"]
+        for row in (*data["recipes"], *data["meals"])
+        for ingredient in row["ingredients"]
+    }
+    data["foods"] += _foods(used - sent)
+
+
+BUILDERS = {
+    "foods": _foods,
+    "recipes": _recipes,
+    "meals": _meals,
+    "meal_logs": _meal_logs,
+}
+
+
+def delta_sync(user, token=None, limit=DEFAULT_BATCH):
+    """
+    Rows created or changed, and ids deleted, since the token, at most
+    limit per kind. has_more means the client should call again with the
+    new token right away; reset that the token was too old (or missing) and
+    everything is sent, so the local copy should be replaced.
+    """
+    since, until, after = load_token(token)
+    now = timezone.now()
+    if since is not None and since < now - TOMBSTONE_TTL:
+        since, until, after = None, None, {}
+    reset = since is None and not after  # first page of a full pass
+    until = until or now
+
+    data = {kind: [] for kind in KINDS}
+    deleted = {kind: [] for kind in KINDS}
+    has_more = False
+    for stream, queryset in _streams(user).items():
+        if stream == "deleted" and since is None:
+            continue  # a full sync has nothing to delete
+        rows = _page(queryset, since, until, after.get(stream), limit)
+        if len(rows) > limit:
+            rows, has_more = rows[:limit], True
+        if not rows:
+            continue
+        after[stream] = rows[-1]
+        ids = [pk for _, pk in rows]
+
+        if stream == "deleted":
+            for kind, object_id in (
+                Tombstone.objects.filter(pk__in=ids)
+                .order_by("deleted_at", "pk")
+                .values_list("kind", "object_id")
+            ):
+                deleted[kind].append(object_id)
+        else:
+            data[stream] = BUILDERS[stream](ids)
+    _with_references(data)
+
+    if has_more:
+        next_token = dump_token(
+            since,
+            until,
+            {
+                stream: [changed_at.isoformat(), pk]
+                for stream, (changed_at, pk) in after.items()
+            },
+        )
+    else:
+        next_token = dump_token(until - WATERMARK_OVERLAP)
+    return {
+        "token": next_token,
+        "has_more": has_more,
+        "reset": reset,
+        **data,
+        "deleted": deleted,
+    }
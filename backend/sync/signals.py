@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from foods.models import FoodItem, Meal, Recipe
+from profiles.models import MealLog
+from .models import Tombstone
+
+KINDS = {
+    FoodItem: Tombstone.Kind.FOOD,
+    Recipe: Tombstone.Kind.RECIPE,
+    Meal: Tombstone.Kind.MEAL,
+    MealLog: Tombstone.Kind.MEAL_LOG,
+}
+
+
+@receiver(post_delete, sender=FoodItem)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Meal)
+@receiver(post_delete, sender=MealLog)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        kind=KINDS[sender], object_id=instance.pk, user_id=instance.user_id
+    )
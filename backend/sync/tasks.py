@@ -0,0 +1,14 @@
+from celery import shared_task
+from django.utils import timezone
+
+from .models import Tombstone
+from .services import TOMBSTONE_TTL
+
+
+@shared_task
+def purge_tombstones():
+    """Drop tombstones no sync token can still ask for (see sync.services)."""
+    deleted, _ = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - TOMBSTONE_TTL
+    ).delete()
+    return deleted
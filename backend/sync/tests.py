@@ -0,0 +1,177 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from foods.models import (
+    FoodItem,
+    Meal,
+    MealIngredient,
+    NutritionProfile,
+    Recipe,
+    RecipeIngredient,
+    RecipeNutrition,
+)
+from foods.services import rebuild_recipe_nutrition
+from profiles.models import MealLog
+from .models import Tombstone
+from .services import TOMBSTONE_TTL, dump_token
+from .tasks import purge_tombstones
+
+User = get_user_model()
+
+
+class DeltaSyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="sync@example.com", password="pass1234"
+        )
+        self.other = User.objects.create_user(email="other@example.com", password="x")
+        self.client.force_authenticate(user=self.user)
+
+        self.rice = self.create_food("Rice")
+        self.lentils = self.create_food("Lentils")
+        self.oil = self.create_food("My oil", user=self.user)
+        self.unused = self.create_food("Unused")
+        self.theirs = self.create_food("Their oil", user=self.other)
+
+        self.recipe = Recipe.objects.create(name="Koshary", user=self.user)
+        for food in (self.rice, self.lentils):
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, food_item=food, quantity=100, unit="g"
+            )
+        rebuild_recipe_nutrition([self.recipe.pk])
+        Recipe.objects.create(name="Their secret", user=self.other)
+
+        self.meal = Meal.objects.create(user=self.user, name="Lunch", meal_type="lunch")
+        self.meal.recipes.set([self.recipe])
+        MealIngredient.objects.create(
+            meal=self.meal, food_item=self.oil, quantity=10, unit="g"
+        )
+        self.log = MealLog.objects.create(user=self.user, meal=self.meal)
+        cache.clear()
+
+    def create_food(self, name, user=None):
+        food = FoodItem.objects.create(name=name, user=user, price=len(name))
+        NutritionProfile.objects.create(
+            food_item=food, calories=100, protein=5, carbohydrates=20, fats=1
+        )
+        return food
+
+    def sync(self, token=None, **params):
+        if token:
+            params["token"] = token
+        response = self.client.get(reverse("sync"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def age_everything(self):
+        """As if the first sync happened a day after the last change."""
+        past = timezone.now() - timedelta(days=1)
+        for model in (FoodItem, Recipe, RecipeNutrition, Meal, MealLog):
+            model.objects.update(updated_at=past)
+        return dump_token(past + timedelta(hours=1))
+
+    def ids(self, rows):
+        return sorted(row["id"] for row in rows)
+
+    def test_full_sync_covers_what_the_user_uses(self):
+        data = self.sync()
+        self.assertTrue(data["reset"])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(
+            self.ids(data["foods"]),
+            sorted([self.rice.pk, self.lentils.pk, self.oil.pk]),
+        )
+        self.assertEqual(self.ids(data["recipes"]), [self.recipe.pk])
+        self.assertEqual(self.ids(data["meals"]), [self.meal.pk])
+        self.assertEqual(self.ids(data["meal_logs"]), [self.log.pk])
+
+        # Compact: rows reference each other by id
+        recipe = data["recipes"][0]
+        self.assertEqual(
+            sorted(i["food_item"] for i in recipe["ingredients"]),
+            sorted([self.rice.pk, self.lentils.pk]),
+        )
+        self.assertEqual(recipe["calories"], 200)
+        self.assertEqual(data["meals"][0]["recipes"], [self.recipe.pk])
+        self.assertEqual(data["meal_logs"][0]["meal"], self.meal.pk)
+
+    def test_delta_returns_only_changes_and_deletions(self):
+        token = self.age_everything()
+        data = self.sync(token)
+        self.assertFalse(data["reset"])
+        for kind in ("foods", "recipes", "meals", "meal_logs"):
+            self.assertEqual(data[kind], [], kind)
+
+        self.recipe.description = "Egyptian classic"
+        self.recipe.save()
+        log_id = self.log.pk
+        self.log.delete()
+        new_log = MealLog.objects.create(user=self.user, meal=self.meal)
+        unused_id = self.unused.pk
+        self.unused.delete()  # catalog deletions reach everyone
+        self.theirs.delete()
+
+        data = self.sync(data["token"])
+        self.assertEqual(self.ids(data["recipes"]), [self.recipe.pk])
+        # Unchanged foods of a changed recipe come along
+        self.assertEqual(
+            self.ids(data["foods"]), sorted([self.rice.pk, self.lentils.pk])
+        )
+        self.assertEqual(data["meals"], [])
+        self.assertEqual(self.ids(data["meal_logs"]), [new_log.pk])
+        self.assertEqual(data["deleted"]["meal_logs"], [log_id])
+        self.assertEqual(data["deleted"]["foods"], [unused_id])
+
+    def test_meal_child_changes_bump_the_meal(self):
+        token = self.age_everything()
+        MealIngredient.objects.create(
+            meal=self.meal, food_item=self.unused, quantity=1, unit="g"
+        )
+        data = self.sync(token)
+        self.assertEqual(self.ids(data["meals"]), [self.meal.pk])
+        self.assertIn(self.unused.pk, self.ids(data["foods"]))
+
+        token = self.age_everything()
+        self.meal.recipes.clear()
+        self.assertEqual(self.ids(self.sync(token)["meals"]), [self.meal.pk])
+
+    def test_batches_resume_from_the_token(self):
+        for i in range(4):
+            MealLog.objects.create(user=self.user, meal=self.meal)
+        logs, token, pages = [], None, 0
+        while True:
+            data = self.sync(token, limit=2)
+            self.assertEqual(data["reset"], token is None)
+            logs += [log["id"] for log in data["meal_logs"]]
+            token, pages = data["token"], pages + 1
+            if not data["has_more"]:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            sorted(logs), sorted(MealLog.objects.values_list("pk", flat=True))
+        )
+
+    def test_invalid_and_expired_tokens(self):
+        response = self.client.get(reverse("sync"), {"token": "forged"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        expired = dump_token(timezone.now() - TOMBSTONE_TTL - timedelta(days=1))
+        data = self.sync(expired)
+        self.assertTrue(data["reset"])
+        self.assertEqual(self.ids(data["meal_logs"]), [self.log.pk])
+
+    def test_purge_old_tombstones(self):
+        self.log.delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - TOMBSTONE_TTL * 2)
+        self.meal.delete()
+        self.assertEqual(purge_tombstones(), 1)
+        self.assertEqual(
+            list(Tombstone.objects.values_list("kind", flat=True)),
+            [Tombstone.Kind.MEAL],
+        )
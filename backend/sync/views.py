@@ -0,0 +1,33 @@
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.views import APIView
+
+from backend.renderers import FAST_RENDERER_CLASSES
+from .services import DEFAULT_BATCH, MAX_BATCH, delta_sync
+
+
+class SyncView(APIView):
+    """
+    Delta sync for offline clients: ?token= from the previous response (none
+    the first time) returns the foods, recipes, meals and meal logs created
+    or changed since, and the ids deleted since, in one compact payload.
+    Call again with the new token while has_more is true; drop the local
+    copy first when reset is true.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "sync"
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_BATCH))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        limit = max(1, min(limit, MAX_BATCH))
+        return Response(
+            delta_sync(request.user, request.query_params.get("token"), limit)
+        )